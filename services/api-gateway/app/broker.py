@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import os
+from typing import Callable, Optional
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+WS_BROKER_CHANNEL = os.getenv("WS_BROKER_CHANNEL", "shroomlab:ws")
+
+# Frames are "<scope>\x1f<target>\x1f<key>\x1f<message>"; the message is already
+# encoded once by the publisher and is forwarded to sockets as-is.
+_SEPARATOR = "\x1f"
+
+# deliver(scope, target, key, message)
+DeliverCallback = Callable[[str, Optional[str], Optional[str], str], None]
+
+
+def encode_frame(scope: str, target: Optional[str], key: Optional[str], message: str) -> str:
+    return _SEPARATOR.join((scope, target or "", key or "", message))
+
+
+def decode_frame(frame: str):
+    scope, target, key, message = frame.split(_SEPARATOR, 3)
+    return scope, target or None, key or None, message
+
+
+class RedisBroker:
+    """Relays WebSocket broadcasts between gateway workers over one Redis channel
+
+    Every worker publishes its broadcasts and subscribes once; messages,
+    including a worker's own, are delivered to local connections only when
+    they come back from Redis, so each client receives them exactly once.
+    """
+
+    def __init__(self, redis_url: str = REDIS_URL, channel: str = WS_BROKER_CHANNEL):
+        self.redis_url = redis_url
+        self.channel = channel
+        self.published = 0
+        self.received = 0
+        self._client: Optional[redis.Redis] = None
+        self._task: Optional[asyncio.Task] = None
+        self._subscribed = asyncio.Event()
+
+    async def start(self, deliver: DeliverCallback):
+        self._client = redis.from_url(self.redis_url, decode_responses=True)
+        self._task = asyncio.create_task(self._listen(deliver), name="ws-broker-subscriber")
+        # Do not report ready before the subscription exists, or early broadcasts are lost
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket broker not yet subscribed to {self.channel}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def publish(self, scope: str, target: Optional[str], key: Optional[str], message: str):
+        await self._client.publish(self.channel, encode_frame(scope, target, key, message))
+        self.published += 1
+
+    async def _listen(self, deliver: DeliverCallback):
+        while True:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                self._subscribed.set()
+                logger.info(f"WebSocket broker subscribed to {self.channel}")
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    self.received += 1
+                    try:
+                        deliver(*decode_frame(message["data"]))
+                    except ValueError:
+                        logger.warning("Ignoring malformed WebSocket broker frame")
+            except redis.RedisError as e:
+                self._subscribed.clear()
+                logger.warning(f"WebSocket broker lost Redis connection: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from itertools import chain
+from typing import Dict, Optional, Set
+
+import redis.asyncio as redis
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+CACHE_KEY_PREFIX = "cache:"
+FARM_VERSION_PREFIX = "version:farm:"
+
+_redis: Optional[redis.Redis] = None
+# Keep references to fire-and-forget invalidations so they are not garbage collected
+_pending: Set[asyncio.Task] = set()
+
+# Cache namespaces to drop when rows of these tables are committed
+INVALIDATE_ON_WRITE: Dict[str, Set[str]] = {
+    "overview": {"farms", "sensors", "alerts", "growing_cycles"},
+}
+
+# Tables whose rows bump the version of the farm they belong to, by farm id attribute
+FARM_VERSIONED_TABLES: Dict[str, str] = {
+    "farms": "id",
+    "sensors": "farm_id",
+}
+
+def get_redis() -> redis.Redis:
+    global _redis
+    if _redis is None:
+        _redis = redis.from_url(REDIS_URL, decode_responses=True)
+    return _redis
+
+async def warm_redis():
+    """Open the Redis connection before the first request needs it"""
+    try:
+        await get_redis().ping()
+    except redis.RedisError as e:
+        logger.warning(f"Redis not reachable at startup: {e}")
+
+async def close_redis():
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
+
+# Each namespace is one Redis hash so it can be invalidated with a single DEL;
+# fields carry their own expiry because hash fields cannot expire individually.
+
+async def cache_get(namespace: str, field: str) -> Optional[dict]:
+    try:
+        raw = await get_redis().hget(CACHE_KEY_PREFIX + namespace, field)
+    except redis.RedisError as e:
+        logger.warning(f"Cache read failed for {namespace}: {e}")
+        return None
+    if raw is None:
+        return None
+    entry = json.loads(raw)
+    if entry["expires_at"] < time.time():
+        return None
+    return entry["value"]
+
+async def cache_set(namespace: str, field: str, value: dict, ttl: float):
+    entry = json.dumps({"expires_at": time.time() + ttl, "value": value}, default=str)
+    key = CACHE_KEY_PREFIX + namespace
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            pipe.hset(key, field, entry)
+            pipe.expire(key, max(int(ttl), 1) * 2)
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Cache write failed for {namespace}: {e}")
+
+async def cache_invalidate(*namespaces: str):
+    try:
+        await get_redis().delete(*(CACHE_KEY_PREFIX + namespace for namespace in namespaces))
+    except redis.RedisError as e:
+        logger.warning(f"Cache invalidation failed for {namespaces}: {e}")
+
+# Farm versions start from a clock reading rather than 0, so a flushed Redis
+# cannot hand out a version (and ETag) that was already used for other content.
+
+async def farm_version(farm_id: int) -> Optional[int]:
+    """Current version of a farm's metadata, or None if Redis is unavailable"""
+    key = f"{FARM_VERSION_PREFIX}{farm_id}"
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            pipe.set(key, time.time_ns(), nx=True)
+            pipe.get(key)
+            _, version = await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not read version of farm {farm_id}: {e}")
+        return None
+    return int(version)
+
+async def bump_farm_versions(farm_ids: Set[int]):
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for farm_id in farm_ids:
+                key = f"{FARM_VERSION_PREFIX}{farm_id}"
+                pipe.set(key, time.time_ns(), nx=True)
+                pipe.incr(key)
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not bump versions of farms {sorted(farm_ids)}: {e}")
+
+def _schedule(coroutine):
+    try:
+        task = asyncio.get_running_loop().create_task(coroutine)
+    except RuntimeError:
+        # Committed outside the event loop (scripts, migrations); nothing cached to drop
+        coroutine.close()
+        return
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_tables(session, flush_context):
+    tables = session.info.setdefault("changed_tables", set())
+    farms = session.info.setdefault("changed_farms", set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        tables.add(obj.__tablename__)
+        attribute = FARM_VERSIONED_TABLES.get(obj.__tablename__)
+        if attribute is not None:
+            # Include the previous farm when a row moves between farms
+            history = inspect(obj).attrs[attribute].history
+            farms.update(farm_id for farm_id in chain(history.unchanged, history.added, history.deleted)
+                         if farm_id is not None)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    farms = session.info.pop("changed_farms", None)
+    if farms:
+        _schedule(bump_farm_versions(farms))
+    tables = session.info.pop("changed_tables", None)
+    if not tables:
+        return
+    namespaces = [namespace for namespace, watched in INVALIDATE_ON_WRITE.items() if tables & watched]
+    if namespaces:
+        _schedule(cache_invalidate(*namespaces))
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_tables(session):
+    session.info.pop("changed_tables", None)
+    session.info.pop("changed_farms", None)
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable
+
+import redis.asyncio as redis
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.cache import farm_version, get_redis
+
+logger = logging.getLogger(__name__)
+
+# Rendered farm metadata responses, keyed by farm version so writes never need to delete them
+FARM_RESPONSE_TTL = int(os.getenv("FARM_RESPONSE_TTL", "300"))  # seconds
+
+# build(response) returns the content and may set headers on the given response
+Builder = Callable[[Response], Awaitable[Any]]
+
+def _etag(farm_id: int, version: int, variant: str) -> str:
+    digest = hashlib.sha1(f"{farm_id}:{version}:{variant}".encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+async def farm_response(request: Request, farm_id: int, variant: str, build: Builder) -> Response:
+    """Answer a farm metadata request from its version: 304, a cached body, or a fresh render
+
+    `variant` must capture everything besides the farm version that changes
+    the body, such as the endpoint and its query string. Access checks have
+    to happen before this is called.
+    """
+    version = await farm_version(farm_id)
+    if version is None:
+        # No versions without Redis; render without validators
+        scratch = Response()
+        content = await build(scratch)
+        return Response(json.dumps(jsonable_encoder(content)), media_type="application/json",
+                        headers=_extra_headers(scratch))
+
+    etag = _etag(farm_id, version, variant)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    key = f"response:farm:{farm_id}:{etag.strip(chr(34))}"
+    client = get_redis()
+    try:
+        cached = await client.get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Farm response cache read failed: {e}")
+        cached = None
+    if cached is not None:
+        entry = json.loads(cached)
+    else:
+        scratch = Response()
+        content = await build(scratch)
+        entry = {"body": json.dumps(jsonable_encoder(content)), "headers": _extra_headers(scratch)}
+        try:
+            await client.set(key, json.dumps(entry), ex=FARM_RESPONSE_TTL)
+        except redis.RedisError as e:
+            logger.warning(f"Farm response cache write failed: {e}")
+    return Response(entry["body"], media_type="application/json", headers={**entry["headers"], **headers})
+
+def _extra_headers(response: Response) -> dict:
+    # Only the headers a builder set itself, e.g. X-Next-Cursor
+    return {name: value for name, value in response.headers.items() if name.startswith("x-")}
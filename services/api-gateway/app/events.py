@@ -0,0 +1,39 @@
+import asyncio
+import json
+import logging
+import os
+
+import redis.asyncio as redis
+
+from app.websocket import WebSocketManager
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+ALERT_CHANNEL = os.getenv("ALERT_CHANNEL", "shroomlab:alerts")
+
+async def relay_alerts(ws_manager: WebSocketManager):
+    """Forward alerts published by the IoT service to this worker's WebSocket clients
+
+    Every gateway worker runs its own relay, so alerts are delivered locally
+    rather than re-broadcast through the WebSocket broker.
+    """
+    while True:
+        client = redis.from_url(REDIS_URL, decode_responses=True)
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(ALERT_CHANNEL)
+            logger.info(f"Relaying alerts from Redis channel {ALERT_CHANNEL}")
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                try:
+                    ws_manager.deliver_alert_locally(json.loads(message["data"]))
+                except ValueError:
+                    logger.warning(f"Ignoring malformed alert event: {message['data']!r}")
+        except redis.RedisError as e:
+            logger.warning(f"Alert relay lost Redis connection: {e}")
+            await asyncio.sleep(5)
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
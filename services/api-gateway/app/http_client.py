@@ -0,0 +1,170 @@
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from app.metrics import UPSTREAM_CIRCUIT_OPEN, UPSTREAM_REJECTED, UPSTREAM_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Backend services reachable from the gateway
+UPSTREAM_URLS = {
+    "iot": os.getenv("IOT_SERVICE_URL", "http://iot-service:8001"),
+    "business": os.getenv("BUSINESS_SERVICE_URL", "http://business-service:8002"),
+    "analytics": os.getenv("ANALYTICS_SERVICE_URL", "http://analytics-service:8003"),
+}
+
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "5"))  # seconds
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "1"))
+# Connection pool per upstream, so one slow service cannot starve the others
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+
+# Consecutive failures that open a circuit, and how long it stays open before a trial request
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+class UpstreamUnavailable(Exception):
+    """The upstream's circuit is open; the request was not sent"""
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream errors and lets one trial request through after a pause"""
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def release(self):
+        """Give back a trial slot without a verdict, e.g. when the caller was cancelled"""
+        self._trial_running = False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"Circuit for {self.name} closed")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        UPSTREAM_CIRCUIT_OPEN.labels(self.name).set(0)
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+            # A failed trial restarts the pause
+            self.opened_at = time.monotonic()
+            self._trial_running = False
+            UPSTREAM_CIRCUIT_OPEN.labels(self.name).set(1)
+
+class UpstreamClients:
+    """Keep-alive HTTP clients and circuit breakers for the backend services"""
+
+    def __init__(self, urls: Dict[str, str] = UPSTREAM_URLS):
+        self.urls = dict(urls)
+        self.breakers = {name: CircuitBreaker(name) for name in self.urls}
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+
+    async def start(self):
+        for name, url in self.urls.items():
+            self.clients[name] = httpx.AsyncClient(
+                base_url=url,
+                timeout=httpx.Timeout(UPSTREAM_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=UPSTREAM_MAX_CONNECTIONS,
+                    max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE
+                )
+            )
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients.clear()
+
+    async def request(self, upstream: str, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request through the upstream's breaker; 5xx and transport errors count as failures"""
+        breaker = self.breakers[upstream]
+        if not breaker.allow():
+            UPSTREAM_REJECTED.labels(upstream).inc()
+            raise UpstreamUnavailable(f"{upstream} circuit is open")
+        started = time.perf_counter()
+        try:
+            response = await self.clients[upstream].request(method, path, **kwargs)
+        except httpx.TransportError:
+            UPSTREAM_REQUEST_SECONDS.labels(upstream, "error").observe(time.perf_counter() - started)
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled or misused; say nothing about the upstream's health
+            breaker.release()
+            raise
+        failed = response.status_code >= 500
+        UPSTREAM_REQUEST_SECONDS.labels(upstream, "error" if failed else "ok").observe(time.perf_counter() - started)
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    async def open_stream(self, upstream: str, request: httpx.Request) -> httpx.Response:
+        """Send a prepared request and return as soon as the headers arrive
+
+        The body is left unread; the caller streams it and must close the
+        response. Latency and breaker outcome are judged on the headers.
+        """
+        breaker = self.breakers[upstream]
+        if not breaker.allow():
+            UPSTREAM_REJECTED.labels(upstream).inc()
+            raise UpstreamUnavailable(f"{upstream} circuit is open")
+        started = time.perf_counter()
+        try:
+            response = await self.clients[upstream].send(request, stream=True)
+        except httpx.TransportError:
+            UPSTREAM_REQUEST_SECONDS.labels(upstream, "error").observe(time.perf_counter() - started)
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        failed = response.status_code >= 500
+        UPSTREAM_REQUEST_SECONDS.labels(upstream, "error" if failed else "ok").observe(time.perf_counter() - started)
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    async def get(self, upstream: str, path: str, **kwargs) -> httpx.Response:
+        return await self.request(upstream, "GET", path, **kwargs)
+
+    def status(self) -> dict:
+        return {
+            name: {"circuit": breaker.state, "failures": breaker.failures}
+            for name, breaker in self.breakers.items()
+        }
+
+# Shared clients for the worker, opened and closed by the app lifespan
+upstreams = UpstreamClients()
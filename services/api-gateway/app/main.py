@@ -1,19 +1,60 @@
+import time
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
+import asyncio
+import logging
 import uvicorn
 import os
 from dotenv import load_dotenv
+from shroomlab_instrumentation import instrument, track_pool, track_websockets
 
-from app.routers import auth, users, farms, dashboard
-from app.database import engine, Base
-from app.websocket import WebSocketManager
+from app.routers import auth, users, farms, dashboard, proxy
+from app.database import async_engine, engine, warm_pool
+from app.websocket import WS_BROKER, WebSocketManager
+from app.broker import RedisBroker
+from app.events import relay_alerts
+from app.cache import close_redis, warm_redis
+from app.http_client import UPSTREAM_URLS, upstreams
+from app.metrics import STARTUP_SECONDS
+from app.passwords import password_hasher
+from app.profiling import enable_query_profiling
 
 # Load environment variables
 load_dotenv()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+# The schema is managed by migrations (alembic upgrade head), not by the app
+
+# WebSocket manager for real-time communications
+ws_manager = WebSocketManager()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # Share broadcasts with the other gateway workers/replicas
+    if WS_BROKER == "redis":
+        await ws_manager.attach_broker(RedisBroker())
+    await upstreams.start()
+    # Open DB and Redis connections before traffic arrives
+    await asyncio.gather(warm_pool(), warm_redis())
+    # Push threshold alerts raised by the IoT service to WebSocket clients
+    alert_relay = asyncio.create_task(relay_alerts(ws_manager))
+    STARTUP_SECONDS.labels("lifespan").set(time.perf_counter() - started)
+    logger.info(
+        f"Worker ready: import {_import_seconds:.2f}s, startup {time.perf_counter() - started:.2f}s"
+    )
+    yield
+    alert_relay.cancel()
+    await ws_manager.detach_broker()
+    await upstreams.close()
+    await close_redis()
+    await async_engine.dispose()
+    password_hasher.close()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -21,7 +62,8 @@ app = FastAPI(
     description="Central API Hub for Mushroom Farm Management System",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -31,16 +73,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-# WebSocket manager for real-time communications
-ws_manager = WebSocketManager()
+# Request, DB pool and WebSocket metrics, served from /metrics
+instrument(app)
+track_pool("sync", engine)
+track_pool("async", async_engine)
+track_websockets(lambda: len(ws_manager.active_connections))
+# Per-request query counts and N+1 warnings, when QUERY_PROFILING=true
+enable_query_profiling(app, engine, async_engine)
 
 # Include routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/api/v1/users", tags=["Users"])
 app.include_router(farms.router, prefix="/api/v1/farms", tags=["Farms"])
 app.include_router(dashboard.router, prefix="/api/v1/dashboard", tags=["Dashboard"])
+# Streams /api/v1/<service>/... to the backend service's /api/v1/...
+app.include_router(proxy.router, prefix="/api/v1", tags=["Proxy"])
 
 @app.get("/")
 async def root():
@@ -49,9 +99,9 @@ async def root():
         "version": "1.0.0",
         "status": "running",
         "services": {
-            "iot_service": "http://iot-service:8001",
-            "business_service": "http://business-service:8002",
-            "analytics_service": "http://analytics-service:8003"
+            "iot_service": UPSTREAM_URLS["iot"],
+            "business_service": UPSTREAM_URLS["business"],
+            "analytics_service": UPSTREAM_URLS["analytics"]
         }
     }
 
@@ -61,13 +111,20 @@ async def health_check():
 
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
-    await ws_manager.connect(websocket, client_id)
+    connection = await ws_manager.connect(websocket, client_id)
     try:
         while True:
             data = await websocket.receive_text()
             await ws_manager.send_personal_message(f"Echo: {data}", client_id)
     except WebSocketDisconnect:
-        ws_manager.disconnect(client_id)
+        pass
+    finally:
+        # Only removes this socket's connection, not a newer one under the same client id
+        ws_manager.disconnect(client_id, connection)
+
+# Everything above runs once per worker at import
+_import_seconds = time.perf_counter() - _import_started
+STARTUP_SECONDS.labels("import").set(_import_seconds)
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,47 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Password hashing pool
+PASSWORD_HASH_SECONDS = Histogram(
+    "gateway_password_hash_seconds",
+    "Time spent hashing or verifying a password in the worker pool",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5)
+)
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "gateway_password_hash_queue_depth",
+    "Password hash requests waiting for a free worker"
+)
+PASSWORD_HASH_IN_FLIGHT = Gauge(
+    "gateway_password_hash_in_flight",
+    "Password hash requests running or waiting"
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "gateway_password_hash_rejected_total",
+    "Password hash requests refused because the queue was full",
+    ["operation"]
+)
+
+# Calls from the gateway to backend services
+UPSTREAM_REQUEST_SECONDS = Histogram(
+    "gateway_upstream_request_seconds",
+    "Latency of requests to backend services",
+    ["upstream", "outcome"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+UPSTREAM_REJECTED = Counter(
+    "gateway_upstream_rejected_total",
+    "Requests not sent because the upstream circuit was open",
+    ["upstream"]
+)
+UPSTREAM_CIRCUIT_OPEN = Gauge(
+    "gateway_upstream_circuit_open",
+    "Whether the circuit breaker of an upstream is open",
+    ["upstream"]
+)
+
+# Worker startup
+STARTUP_SECONDS = Gauge(
+    "gateway_startup_seconds",
+    "Time this worker spent importing the app and running the startup phase",
+    ["phase"]
+)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -30,6 +30,10 @@ class User(Base):
     
     # Relationships
     farms = relationship("Farm", back_populates="owner")
+    
+    __table_args__ = (
+        Index("idx_role", "role"),
+    )
 
 class Farm(Base):
     __tablename__ = "farms"
@@ -39,7 +43,7 @@ class Farm(Base):
     description = Column(Text)
     location = Column(String(200))
     status = Column(Enum(FarmStatus), default=FarmStatus.ACTIVE)
-    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -52,12 +56,17 @@ class Farm(Base):
     owner = relationship("User", back_populates="farms")
     growing_cycles = relationship("GrowingCycle", back_populates="farm")
     sensors = relationship("Sensor", back_populates="farm")
+    
+    __table_args__ = (
+        Index("idx_owner", "owner_id"),
+        Index("idx_farm_status", "status"),
+    )
 
 class GrowingCycle(Base):
     __tablename__ = "growing_cycles"
     
     id = Column(Integer, primary_key=True, index=True)
-    farm_id = Column(Integer, ForeignKey("farms.id"), nullable=False)
+    farm_id = Column(Integer, ForeignKey("farms.id", ondelete="CASCADE"), nullable=False)
     mushroom_variety = Column(String(100), nullable=False)
     start_date = Column(DateTime(timezone=True), nullable=False)
     expected_harvest_date = Column(DateTime(timezone=True))
@@ -75,12 +84,19 @@ class GrowingCycle(Base):
     # Relationships
     farm = relationship("Farm", back_populates="growing_cycles")
     production_logs = relationship("ProductionLog", back_populates="growing_cycle")
+    
+    __table_args__ = (
+        # Recent cycles per farm are listed newest first
+        Index("idx_farm_start", "farm_id", "start_date"),
+        Index("idx_cycle_status", "status"),
+        Index("idx_variety", "mushroom_variety"),
+    )
 
 class Sensor(Base):
     __tablename__ = "sensors"
     
     id = Column(Integer, primary_key=True, index=True)
-    farm_id = Column(Integer, ForeignKey("farms.id"), nullable=False)
+    farm_id = Column(Integer, ForeignKey("farms.id", ondelete="CASCADE"), nullable=False)
     sensor_type = Column(String(50), nullable=False)  # temperature, humidity, co2, ph, etc.
     name = Column(String(100), nullable=False)
     location = Column(String(200))  # room location within farm
@@ -91,18 +107,26 @@ class Sensor(Base):
     min_threshold = Column(Float)
     max_threshold = Column(Float)
     alert_enabled = Column(Boolean, default=True)
+    # Linear calibration applied on ingest: value * scale + offset
+    calibration_offset = Column(Float, nullable=False, default=0.0, server_default="0")
+    calibration_scale = Column(Float, nullable=False, default=1.0, server_default="1")
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
     farm = relationship("Farm", back_populates="sensors")
+    
+    __table_args__ = (
+        Index("idx_sensor_farm", "farm_id"),
+        Index("idx_sensor_type", "sensor_type"),
+    )
 
 class ProductionLog(Base):
     __tablename__ = "production_logs"
     
     id = Column(Integer, primary_key=True, index=True)
-    growing_cycle_id = Column(Integer, ForeignKey("growing_cycles.id"), nullable=False)
+    growing_cycle_id = Column(Integer, ForeignKey("growing_cycles.id", ondelete="CASCADE"), nullable=False)
     log_type = Column(String(50), nullable=False)  # watering, harvesting, substrate_prep, etc.
     description = Column(Text)
     quantity = Column(Float)  # amount in relevant unit
@@ -113,13 +137,18 @@ class ProductionLog(Base):
     
     # Relationships
     growing_cycle = relationship("GrowingCycle", back_populates="production_logs")
+    
+    __table_args__ = (
+        Index("idx_log_cycle", "growing_cycle_id"),
+        Index("idx_log_type", "log_type"),
+    )
 
 class Alert(Base):
     __tablename__ = "alerts"
     
     id = Column(Integer, primary_key=True, index=True)
-    farm_id = Column(Integer, ForeignKey("farms.id"), nullable=False)
-    sensor_id = Column(Integer, ForeignKey("sensors.id"))
+    farm_id = Column(Integer, ForeignKey("farms.id", ondelete="CASCADE"), nullable=False)
+    sensor_id = Column(Integer, ForeignKey("sensors.id", ondelete="SET NULL"))
     alert_type = Column(String(50), nullable=False)  # threshold, device_offline, system, etc.
     severity = Column(String(20), default="medium")  # low, medium, high, critical
     title = Column(String(200), nullable=False)
@@ -129,4 +158,13 @@ class Alert(Base):
     resolved_by = Column(String(100))
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now()) 
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    __table_args__ = (
+        # Keyset pagination of recent alerts, overall and per farm
+        Index("idx_created", "created_at", "id"),
+        Index("idx_farm_created", "farm_id", "created_at", "id"),
+        Index("idx_alert_sensor", "sensor_id"),
+        Index("idx_severity", "severity"),
+        Index("idx_resolved", "is_resolved"),
+    ) 
\ No newline at end of file
@@ -0,0 +1,62 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, Response
+from sqlalchemy import DateTime, Select, and_, or_
+
+# Header carrying the token for the next page; absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(token: str, columns: Sequence) -> List[Any]:
+    """Turn a continuation token back into typed key values, or fail with 400"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor does not match this listing")
+        return [
+            datetime.fromisoformat(value) if value is not None and isinstance(column.type, DateTime) else value
+            for value, column in zip(values, columns)
+        ]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _after(columns: Sequence, values: Sequence[Any], descending: bool):
+    # (a, b) > (x, y) spelled out as a > x OR (a = x AND b > y), which MySQL can range-scan on an index
+    clauses = []
+    for position, column in enumerate(columns):
+        equal = [columns[i] == values[i] for i in range(position)]
+        beyond = column < values[position] if descending else column > values[position]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+def paginate(query: Select, columns: Sequence, limit: Optional[int], cursor: Optional[str] = None,
+             skip: int = 0, descending: bool = False) -> Select:
+    """Order a query by its keyset columns and start after the cursor, or at the offset without one
+
+    One extra row is fetched so the caller can tell whether another page
+    exists. Without a limit every remaining row is selected, for exports.
+    """
+    order = [column.desc() if descending else column.asc() for column in columns]
+    query = query.order_by(*order)
+    if cursor is not None:
+        query = query.where(_after(columns, decode_cursor(cursor, columns), descending))
+    elif skip:
+        query = query.offset(skip)
+    if limit is None:
+        return query
+    return query.limit(limit + 1)
+
+def page_rows(rows: Sequence, columns: Sequence, limit: int, response: Response) -> Sequence:
+    """Trim the look-ahead row and advertise the next cursor if there is more"""
+    if len(rows) <= limit:
+        return rows
+    rows = rows[:limit]
+    last = rows[-1]
+    response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(last, column.key) for column in columns])
+    return rows
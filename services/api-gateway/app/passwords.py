@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from app.metrics import (
+    PASSWORD_HASH_IN_FLIGHT, PASSWORD_HASH_QUEUE_DEPTH, PASSWORD_HASH_REJECTED, PASSWORD_HASH_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# bcrypt cost; hashes made with another cost are upgraded on the next successful login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt releases the GIL, so threads give real parallelism without extra processes
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Requests allowed to wait for a worker before new ones are refused
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+class HashPoolBusy(Exception):
+    """The password hashing queue is full; the caller should retry later"""
+
+def _timed(operation: str, function, *args):
+    started = time.perf_counter()
+    try:
+        return function(*args)
+    finally:
+        PASSWORD_HASH_SECONDS.labels(operation).observe(time.perf_counter() - started)
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated pool so it never blocks the event loop"""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_limit: int = PASSWORD_HASH_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    async def _submit(self, operation: str, function, *args):
+        if self.pending >= self.workers + self.queue_limit:
+            PASSWORD_HASH_REJECTED.labels(operation).inc()
+            raise HashPoolBusy(f"{self.pending} password hash requests pending")
+        self.pending += 1
+        self._update_gauges()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, _timed, operation, function, *args)
+        finally:
+            self.pending -= 1
+            self._update_gauges()
+
+    def _update_gauges(self):
+        PASSWORD_HASH_IN_FLIGHT.set(self.pending)
+        PASSWORD_HASH_QUEUE_DEPTH.set(max(self.pending - self.workers, 0))
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("hash", pwd_context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password and return a new hash if the stored one uses outdated parameters"""
+        return await self._submit("verify", pwd_context.verify_and_update, password, hashed_password)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+# Shared hasher for the worker
+password_hasher = PasswordHasher()
@@ -0,0 +1,126 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import FrozenSet, Optional, Tuple
+
+import redis.asyncio as redis
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import get_redis
+from app.models import Farm, User, UserRole
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "300"))  # seconds in Redis
+# In-process entries are trusted this long before the shared version is checked again
+PRINCIPAL_LOCAL_TTL = float(os.getenv("PRINCIPAL_LOCAL_TTL", "5"))
+PRINCIPAL_LRU_SIZE = int(os.getenv("PRINCIPAL_LRU_SIZE", "1024"))
+
+VERSION_KEY = "principal:version"
+
+class Principal(BaseModel):
+    """What request handlers need to know about the authenticated user"""
+    id: int
+    username: str
+    email: str
+    full_name: Optional[str] = None
+    role: UserRole
+    is_active: bool
+    created_at: Optional[datetime] = None
+    # Farms this user may access: owned farms, or every farm for admins and managers
+    farm_ids: FrozenSet[int] = frozenset()
+
+    @property
+    def sees_all_farms(self) -> bool:
+        return self.role.value in ["admin", "manager"]
+
+async def load_principal(db: AsyncSession, username: str) -> Optional[Principal]:
+    result = await db.execute(select(User).where(User.username == username))
+    user = result.scalars().first()
+    if user is None:
+        return None
+    farms = select(Farm.id)
+    if user.role.value not in ["admin", "manager"]:
+        farms = farms.where(Farm.owner_id == user.id)
+    farm_ids = (await db.execute(farms)).scalars().all()
+    return Principal(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        full_name=user.full_name,
+        role=user.role,
+        is_active=user.is_active,
+        created_at=user.created_at,
+        farm_ids=frozenset(farm_ids)
+    )
+
+class PrincipalCache:
+    """Principals in a bounded in-process LRU in front of version-stamped Redis keys
+
+    Invalidation bumps the shared version instead of deleting keys, so a
+    request that loaded a principal before a write can never publish it
+    under the new version.
+    """
+
+    def __init__(self, max_size: int = PRINCIPAL_LRU_SIZE, local_ttl: float = PRINCIPAL_LOCAL_TTL,
+                 ttl: int = PRINCIPAL_CACHE_TTL):
+        self.max_size = max_size
+        self.local_ttl = local_ttl
+        self.ttl = ttl
+        # username -> (cached at, principal)
+        self._local: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, username: str, principal: Principal):
+        self._local[username] = (time.monotonic(), principal)
+        self._local.move_to_end(username)
+        while len(self._local) > self.max_size:
+            self._local.popitem(last=False)
+
+    async def get(self, db: AsyncSession, username: str) -> Optional[Principal]:
+        entry = self._local.get(username)
+        if entry is not None and time.monotonic() - entry[0] < self.local_ttl:
+            self._local.move_to_end(username)
+            self.hits += 1
+            return entry[1]
+
+        client = get_redis()
+        version = None
+        try:
+            version = await client.get(VERSION_KEY) or "0"
+            raw = await client.get(f"principal:{version}:{username}")
+            if raw is not None:
+                principal = Principal.model_validate_json(raw)
+                self._remember(username, principal)
+                self.hits += 1
+                return principal
+        except redis.RedisError as e:
+            logger.warning(f"Principal cache read failed: {e}")
+
+        self.misses += 1
+        principal = await load_principal(db, username)
+        if principal is None:
+            return None
+        self._remember(username, principal)
+        if version is not None:
+            try:
+                await client.set(f"principal:{version}:{username}", principal.model_dump_json(), ex=self.ttl)
+            except redis.RedisError as e:
+                logger.warning(f"Principal cache write failed: {e}")
+        return principal
+
+    async def invalidate(self):
+        """Drop every cached principal after a user or farm ownership change"""
+        self._local.clear()
+        try:
+            await get_redis().incr(VERSION_KEY)
+        except redis.RedisError as e:
+            logger.warning(f"Principal cache invalidation failed: {e}")
+
+# Shared cache for the worker
+principal_cache = PrincipalCache()
@@ -0,0 +1,141 @@
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Off by default: when enabled every statement is fingerprinted
+QUERY_PROFILING = os.getenv("QUERY_PROFILING", "false").lower() == "true"
+# Statements of the same shape issued this many times in one request are reported as N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+QUERY_TIME_HEADER = "X-Query-Time-Ms"
+QUERY_REPEATS_HEADER = "X-Query-Repeats"
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+# Expanded IN lists and multi-row VALUES vary in length with the data, not the code path
+_IN_LIST = re.compile(r"\bIN \((?:\s*(?:\?|%s|:\w+)\s*,?)+\)", re.IGNORECASE)
+_POSTCOMPILE = re.compile(r"\(__\[POSTCOMPILE_\w+\]\)")
+
+def fingerprint(statement: str) -> str:
+    """Reduce a statement to its shape, so the same query with other parameters compares equal"""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _STRING.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _POSTCOMPILE.sub("(...)", shape)
+    return _IN_LIST.sub("IN (...)", shape)
+
+class QueryProfile:
+    """Statements issued while a profile is active: count, time and repeated shapes"""
+
+    def __init__(self, threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.threshold = threshold
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[fingerprint(statement)] += 1
+
+    @property
+    def repeated(self) -> Dict[str, int]:
+        """Shapes issued at least threshold times, most frequent first"""
+        return {shape: n for shape, n in self.shapes.most_common() if n >= self.threshold}
+
+    def summary(self) -> dict:
+        return {
+            "queries": self.count,
+            "time_ms": round(self.seconds * 1000, 2),
+            "repeated": self.repeated
+        }
+
+_current: ContextVar[Optional[QueryProfile]] = ContextVar("query_profile", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is None:
+        return
+    started: List[float] = conn.info.get("query_started")
+    if not started:
+        return
+    profile.record(statement, time.perf_counter() - started.pop())
+
+def attach(engine):
+    """Listen for statements on an engine; async engines are watched through their sync core"""
+    target = getattr(engine, "sync_engine", engine)
+    if not event.contains(target, "before_cursor_execute", _before_cursor_execute):
+        event.listen(target, "before_cursor_execute", _before_cursor_execute)
+        event.listen(target, "after_cursor_execute", _after_cursor_execute)
+
+@contextmanager
+def profile_queries(threshold: int = N_PLUS_ONE_THRESHOLD):
+    """Collect the statements issued inside the block, e.g. to assert a query budget in a test
+
+    Only engines passed to attach() are observed.
+    """
+    profile = QueryProfile(threshold)
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+class QueryProfilingMiddleware:
+    """ASGI middleware that profiles each request and reports it in headers and the log
+
+    Statements issued after the response headers are sent, by streaming
+    responses, count towards the log line but not the headers.
+    """
+
+    def __init__(self, app, threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with profile_queries(self.threshold) as profile:
+            async def send_with_summary(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((QUERY_COUNT_HEADER.lower().encode(), str(profile.count).encode()))
+                    headers.append((QUERY_TIME_HEADER.lower().encode(), f"{profile.seconds * 1000:.2f}".encode()))
+                    repeats = max(profile.shapes.values(), default=0)
+                    if repeats >= self.threshold:
+                        headers.append((QUERY_REPEATS_HEADER.lower().encode(), str(repeats).encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_summary)
+
+        path = f"{scope['method']} {scope['path']}"
+        logger.debug(f"{path}: {profile.count} queries in {profile.seconds * 1000:.1f} ms")
+        for shape, n in profile.repeated.items():
+            logger.warning(f"Possible N+1 in {path}: {n} x {shape}")
+
+def enable_query_profiling(app, *engines):
+    """Profile every request to the app when QUERY_PROFILING is on"""
+    if not QUERY_PROFILING:
+        return
+    for engine in engines:
+        attach(engine)
+    app.add_middleware(QueryProfilingMiddleware)
+    logger.info(f"Query profiling enabled (N+1 threshold {N_PLUS_ONE_THRESHOLD})")
@@ -1,61 +1,117 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Dict, Any
-import httpx
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import case, func, select, true
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Dict, Any, Literal, Optional
+from datetime import datetime, timezone
+import asyncio
+import json
+import logging
 import os
 
-from app.database import get_db
-from app.models import User, Farm, Sensor, Alert, GrowingCycle
-from app.routers.auth import get_current_active_user
+from app.cache import cache_get, cache_set
+from app.database import AsyncSessionLocal, get_async_db
+from app.http_client import upstreams
+from app.models import Farm, FarmStatus, Sensor, Alert, GrowingCycle
+from app.pagination import NEXT_CURSOR_HEADER, page_rows, paginate
+from app.principal import Principal
+from app.streaming import column_serializer, ndjson_response, wants_ndjson
+from app.routers.auth import authorize_farm, get_current_active_user
+from app.routers.farms import get_farm_dashboard
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Service URLs
-IOT_SERVICE_URL = os.getenv("IOT_SERVICE_URL", "http://iot-service:8001")
-ANALYTICS_SERVICE_URL = os.getenv("ANALYTICS_SERVICE_URL", "http://analytics-service:8003")
+# Services reported by /system-health, by upstream name
+HEALTH_CHECKED_SERVICES = {
+    "iot_service": "iot",
+    "analytics_service": "analytics"
+}
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))  # seconds
+
+# Overview results are cached briefly per role scope and dropped on writes
+OVERVIEW_CACHE_TTL = float(os.getenv("OVERVIEW_CACHE_TTL", "10"))
+
+async def _probe_health(upstream: str) -> dict:
+    try:
+        response = await upstreams.get(upstream, "/health", timeout=HEALTH_CHECK_TIMEOUT)
+        return {
+            "status": "healthy" if response.status_code == 200 else "unhealthy",
+            "response_time": response.elapsed.total_seconds()
+        }
+    except Exception as e:
+        return {
+            "status": "offline",
+            "error": str(e)
+        }
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+def _scoped(query, model, current_user: Principal):
+    """Restrict a per-farm table to the user's farms with a join instead of IN (subquery)"""
+    if current_user.role.value in ["admin", "manager"]:
+        return query
+    return query.join(Farm, Farm.id == model.farm_id).where(Farm.owner_id == current_user.id)
+
+def _overview_scope(current_user: Principal) -> str:
+    # Admins and managers all see the same numbers, so they share one cache entry
+    if current_user.role.value in ["admin", "manager"]:
+        return "all"
+    return f"user:{current_user.id}"
 
 @router.get("/overview")
 async def get_dashboard_overview(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get overall system overview statistics"""
     
-    # Base query filters based on user role
-    if current_user.role.value in ["admin", "manager"]:
-        # Admin and managers see all data
-        farms_query = db.query(Farm)
-        sensors_query = db.query(Sensor)
-        alerts_query = db.query(Alert)
-        cycles_query = db.query(GrowingCycle)
-    else:
-        # Regular users see only their farms
-        user_farm_ids = db.query(Farm.id).filter(Farm.owner_id == current_user.id).subquery()
-        farms_query = db.query(Farm).filter(Farm.owner_id == current_user.id)
-        sensors_query = db.query(Sensor).filter(Sensor.farm_id.in_(user_farm_ids))
-        alerts_query = db.query(Alert).filter(Alert.farm_id.in_(user_farm_ids))
-        cycles_query = db.query(GrowingCycle).filter(GrowingCycle.farm_id.in_(user_farm_ids))
-    
-    # Get basic counts
-    total_farms = farms_query.count()
-    active_farms = farms_query.filter(Farm.status == "active").count()
-    total_sensors = sensors_query.count()
-    active_sensors = sensors_query.filter(Sensor.is_active == True).count()
-    
-    # Get alert counts
-    total_alerts = alerts_query.count()
-    active_alerts = alerts_query.filter(Alert.is_resolved == False).count()
-    critical_alerts = alerts_query.filter(
-        Alert.is_resolved == False,
-        Alert.severity == "critical"
-    ).count()
-    
-    # Get growing cycle counts
-    total_cycles = cycles_query.count()
-    active_cycles = cycles_query.filter(GrowingCycle.status == "active").count()
+    scope = _overview_scope(current_user)
+    cached = await cache_get("overview", scope)
+    if cached is not None:
+        return cached
     
-    return {
+    # One aggregate per table, combined into a single round trip
+    farms = select(
+        func.count(Farm.id).label("total"),
+        _count_if(Farm.status == FarmStatus.ACTIVE).label("active")
+    )
+    if current_user.role.value not in ["admin", "manager"]:
+        farms = farms.where(Farm.owner_id == current_user.id)
+    farms = farms.subquery()
+    
+    sensors = _scoped(select(
+        func.count(Sensor.id).label("total"),
+        _count_if(Sensor.is_active == True).label("active")
+    ).select_from(Sensor), Sensor, current_user).subquery()
+    
+    alerts = _scoped(select(
+        func.count(Alert.id).label("total"),
+        _count_if(Alert.is_resolved == False).label("active"),
+        _count_if((Alert.is_resolved == False) & (Alert.severity == "critical")).label("critical")
+    ).select_from(Alert), Alert, current_user).subquery()
+    
+    cycles = _scoped(select(
+        func.count(GrowingCycle.id).label("total"),
+        _count_if(GrowingCycle.status == "active").label("active")
+    ).select_from(GrowingCycle), GrowingCycle, current_user).subquery()
+    
+    result = await db.execute(
+        select(farms, sensors, alerts, cycles)
+        .select_from(farms)
+        .join(sensors, true())
+        .join(alerts, true())
+        .join(cycles, true())
+    )
+    row = result.one()
+    (total_farms, active_farms, total_sensors, active_sensors,
+     total_alerts, active_alerts, critical_alerts, total_cycles, active_cycles) = (int(value) for value in row)
+    
+    overview = {
         "farms": {
             "total": total_farms,
             "active": active_farms,
@@ -77,97 +133,133 @@ async def get_dashboard_overview(
             "completed_cycles": total_cycles - active_cycles
         }
     }
+    await cache_set("overview", scope, overview, OVERVIEW_CACHE_TTL)
+    return overview
 
 @router.get("/recent-alerts")
 async def get_recent_alerts(
-    limit: int = 10,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    limit: int = Query(10, ge=1, le=1000),
+    skip: int = 0,
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get recent alerts for the dashboard"""
     
     # Base query filters based on user role
     if current_user.role.value in ["admin", "manager"]:
-        alerts_query = db.query(Alert)
+        alerts_query = select(Alert)
     else:
-        user_farm_ids = db.query(Farm.id).filter(Farm.owner_id == current_user.id).subquery()
-        alerts_query = db.query(Alert).filter(Alert.farm_id.in_(user_farm_ids))
+        user_farm_ids = select(Farm.id).where(Farm.owner_id == current_user.id)
+        alerts_query = select(Alert).where(Alert.farm_id.in_(user_farm_ids))
     
-    alerts = alerts_query.order_by(Alert.created_at.desc()).limit(limit).all()
+    # Newest first on (created_at, id); the cursor continues into older alerts
+    keys = (Alert.created_at, Alert.id)
+    if wants_ndjson(request):
+        return ndjson_response(paginate(alerts_query, keys, None, cursor, skip, descending=True), column_serializer)
+    result = await db.execute(paginate(alerts_query, keys, limit, cursor, skip, descending=True))
     
-    return alerts
+    return page_rows(result.scalars().all(), keys, limit, response)
 
 @router.get("/sensor-data/{farm_id}")
 async def get_farm_sensor_data(
     farm_id: int,
-    hours: int = 24,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    hours: int = Query(24, ge=1, le=24 * 365 * 5),
+    points: int = Query(500, ge=10, le=5000),
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get recent sensor data for a farm"""
+    """Get sensor history for a farm, downsampled to about `points` points per sensor"""
     
     # Check if user has access to this farm
-    farm = db.query(Farm).filter(Farm.id == farm_id).first()
-    if farm is None:
-        raise HTTPException(status_code=404, detail="Farm not found")
-    
-    if current_user.role.value not in ["admin", "manager"] and farm.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    await authorize_farm(farm_id, current_user, db)
     
     # Get sensor data from IoT service
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{IOT_SERVICE_URL}/api/v1/sensors/data/farm/{farm_id}",
-                params={"hours": hours}
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"error": "Could not fetch sensor data", "sensors": []}
+        response = await upstreams.get(
+            "iot",
+            f"/api/v1/sensors/data/farm/{farm_id}",
+            params={"hours": hours, "points": points}
+        )
+        if response.status_code == 200:
+            return response.json()
+        else:
+            return {"error": "Could not fetch sensor data", "sensors": []}
     except Exception as e:
         return {"error": str(e), "sensors": []}
 
+@router.get("/sensor-snapshot/{farm_id}")
+async def get_farm_sensor_snapshot(
+    farm_id: int,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the latest reading of every sensor on a farm"""
+    
+    # Check if user has access to this farm
+    await authorize_farm(farm_id, current_user, db)
+    
+    # Served from the IoT service's latest-value cache, not from InfluxDB
+    try:
+        response = await upstreams.get("iot", f"/api/v1/sensors/snapshot/farm/{farm_id}")
+        if response.status_code == 200:
+            return response.json()
+        else:
+            return {"error": "Could not fetch sensor snapshot", "devices": {}}
+    except Exception as e:
+        return {"error": str(e), "devices": {}}
+
 @router.get("/production-summary/{farm_id}")
 async def get_production_summary(
     farm_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get production summary for a farm"""
     
     # Check if user has access to this farm
-    farm = db.query(Farm).filter(Farm.id == farm_id).first()
-    if farm is None:
-        raise HTTPException(status_code=404, detail="Farm not found")
-    
-    if current_user.role.value not in ["admin", "manager"] and farm.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    # Get growing cycles for this farm
-    cycles = db.query(GrowingCycle).filter(GrowingCycle.farm_id == farm_id).all()
-    
-    # Calculate summary metrics
-    total_cycles = len(cycles)
-    active_cycles = len([c for c in cycles if c.status == "active"])
-    completed_cycles = len([c for c in cycles if c.status == "harvested"])
+    await authorize_farm(farm_id, current_user, db)
     
-    total_yield = sum([c.actual_yield or 0 for c in cycles if c.actual_yield])
-    expected_yield = sum([c.expected_yield or 0 for c in cycles if c.expected_yield])
+    # Per-variety totals aggregated in the database; the farm totals are their sum
+    result = await db.execute(
+        select(
+            GrowingCycle.mushroom_variety,
+            func.count(GrowingCycle.id),
+            _count_if(GrowingCycle.status == "active"),
+            _count_if(GrowingCycle.status == "harvested"),
+            func.coalesce(func.sum(GrowingCycle.actual_yield), 0),
+            func.coalesce(func.sum(GrowingCycle.expected_yield), 0)
+        )
+        .where(GrowingCycle.farm_id == farm_id)
+        .group_by(GrowingCycle.mushroom_variety)
+    )
+    variety_rows = result.all()
     
-    # Group by mushroom variety
+    total_cycles = active_cycles = completed_cycles = 0
+    total_yield = expected_yield = 0
     varieties = {}
-    for cycle in cycles:
-        variety = cycle.mushroom_variety
-        if variety not in varieties:
-            varieties[variety] = {
-                "count": 0,
-                "total_yield": 0,
-                "expected_yield": 0
-            }
-        varieties[variety]["count"] += 1
-        varieties[variety]["total_yield"] += cycle.actual_yield or 0
-        varieties[variety]["expected_yield"] += cycle.expected_yield or 0
+    for variety, count, active, harvested, actual, expected in variety_rows:
+        total_cycles += count
+        active_cycles += int(active)
+        completed_cycles += int(harvested)
+        total_yield += actual
+        expected_yield += expected
+        varieties[variety] = {
+            "count": count,
+            "total_yield": actual,
+            "expected_yield": expected
+        }
+    
+    # Latest cycles, served by the (farm_id, start_date) index
+    result = await db.execute(
+        select(GrowingCycle)
+        .where(GrowingCycle.farm_id == farm_id)
+        .order_by(GrowingCycle.start_date.desc(), GrowingCycle.id.desc())
+        .limit(5)
+    )
+    recent_cycles = result.scalars().all()
     
     return {
         "farm_id": farm_id,
@@ -180,51 +272,228 @@ async def get_production_summary(
             "yield_efficiency": (total_yield / expected_yield * 100) if expected_yield > 0 else 0
         },
         "varieties": varieties,
-        "recent_cycles": cycles[-5:] if cycles else []
+        "recent_cycles": [
+            {
+                "id": cycle.id,
+                "mushroom_variety": cycle.mushroom_variety,
+                "status": cycle.status,
+                "start_date": cycle.start_date,
+                "expected_harvest_date": cycle.expected_harvest_date,
+                "actual_harvest_date": cycle.actual_harvest_date,
+                "substrate_weight": cycle.substrate_weight,
+                "expected_yield": cycle.expected_yield,
+                "actual_yield": cycle.actual_yield
+            }
+            for cycle in recent_cycles
+        ]
+    }
+
+FLEET_SORT_KEYS = ("name", "total_sensors", "active_sensors", "active_alerts", "critical_alerts", "active_cycles")
+
+@router.get("/fleet")
+async def get_fleet_overview(
+    response: Response,
+    sort: Literal[FLEET_SORT_KEYS] = "critical_alerts",
+    order: Literal["asc", "desc"] = "desc",
+    limit: int = Query(50, ge=1, le=500),
+    skip: int = 0,
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get sensor, alert and cycle counts for every visible farm in one grouped query"""
+    
+    sensors = _scoped(select(
+        Sensor.farm_id,
+        func.count(Sensor.id).label("total"),
+        _count_if(Sensor.is_active == True).label("active")
+    ).select_from(Sensor), Sensor, current_user).group_by(Sensor.farm_id).subquery()
+    
+    alerts = _scoped(select(
+        Alert.farm_id,
+        func.count(Alert.id).label("active"),
+        _count_if(Alert.severity == "critical").label("critical")
+    ).select_from(Alert).where(Alert.is_resolved == False), Alert, current_user).group_by(Alert.farm_id).subquery()
+    
+    cycles = _scoped(select(
+        GrowingCycle.farm_id,
+        func.count(GrowingCycle.id).label("active")
+    ).select_from(GrowingCycle).where(GrowingCycle.status == "active"), GrowingCycle, current_user).group_by(GrowingCycle.farm_id).subquery()
+    
+    columns = {
+        "total_sensors": func.coalesce(sensors.c.total, 0).label("total_sensors"),
+        "active_sensors": func.coalesce(sensors.c.active, 0).label("active_sensors"),
+        "active_alerts": func.coalesce(alerts.c.active, 0).label("active_alerts"),
+        "critical_alerts": func.coalesce(alerts.c.critical, 0).label("critical_alerts"),
+        "active_cycles": func.coalesce(cycles.c.active, 0).label("active_cycles"),
     }
+    query = (
+        select(Farm.id, Farm.name, Farm.status, *columns.values())
+        .outerjoin(sensors, sensors.c.farm_id == Farm.id)
+        .outerjoin(alerts, alerts.c.farm_id == Farm.id)
+        .outerjoin(cycles, cycles.c.farm_id == Farm.id)
+    )
+    if not current_user.sees_all_farms:
+        query = query.where(Farm.owner_id == current_user.id)
+    
+    # The farm id breaks ties so the cursor has a total order
+    keys = (Farm.name if sort == "name" else columns[sort], Farm.id)
+    result = await db.execute(paginate(query, keys, limit, cursor, skip, descending=order == "desc"))
+    rows = page_rows(result.all(), keys, limit, response)
+    
+    return [
+        {
+            "farm_id": row.id,
+            "name": row.name,
+            "status": row.status,
+            "sensors": {
+                "total": int(row.total_sensors),
+                "active": int(row.active_sensors),
+                "inactive": int(row.total_sensors) - int(row.active_sensors)
+            },
+            "alerts": {
+                "active": int(row.active_alerts),
+                "critical": int(row.critical_alerts)
+            },
+            "cycles": {
+                "active": int(row.active_cycles)
+            }
+        }
+        for row in rows
+    ]
 
 @router.get("/system-health")
 async def get_system_health(
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Get system health status"""
     
     if current_user.role.value not in ["admin", "manager"]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    # Check service health
-    services_health = {}
+    # Probe the services concurrently; an open circuit answers immediately
+    names = list(HEALTH_CHECKED_SERVICES)
+    results = await asyncio.gather(*(_probe_health(HEALTH_CHECKED_SERVICES[name]) for name in names))
+    services_health = dict(zip(names, results))
     
-    # Check IoT Service
+    return {
+        "api_gateway": {"status": "healthy"},
+        "services": services_health,
+        "circuits": upstreams.status(),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    } 
+
+
+# Batch endpoint: several dashboard widgets in one round trip
+BATCH_MAX_WIDGETS = int(os.getenv("BATCH_MAX_WIDGETS", "20"))
+
+WIDGET_TYPES = ("overview", "recent_alerts", "sensor_data", "sensor_snapshot", "production_summary", "farm_dashboard")
+FARM_WIDGETS = {"sensor_data", "sensor_snapshot", "production_summary", "farm_dashboard"}
+
+class RecentAlertsParams(BaseModel):
+    limit: int = Field(10, ge=1, le=1000)
+    cursor: Optional[str] = None
+
+class SensorDataParams(BaseModel):
+    hours: int = Field(24, ge=1, le=24 * 365 * 5)
+    points: int = Field(500, ge=10, le=5000)
+
+class WidgetRequest(BaseModel):
+    id: Optional[str] = None
+    type: Literal[WIDGET_TYPES]
+    farm_id: Optional[int] = None
+    params: Dict[str, Any] = {}
+
+class BatchRequest(BaseModel):
+    widgets: List[WidgetRequest]
+
+def _widget_request() -> Request:
+    """A bare GET for a widget, without the batch request's Accept or If-None-Match
+
+    The endpoints negotiate on those headers (ndjson streams, 304s), but a
+    widget result is always a full JSON body.
+    """
+    return Request({"type": "http", "method": "GET", "headers": [], "query_string": b""})
+
+async def _run_widget(widget: WidgetRequest, current_user: Principal) -> dict:
+    # Widgets run concurrently, so each gets its own session
+    async with AsyncSessionLocal() as db:
+        scratch = Response()
+        if widget.type == "overview":
+            data = await get_dashboard_overview(current_user=current_user, db=db)
+        elif widget.type == "recent_alerts":
+            params = RecentAlertsParams(**widget.params)
+            data = await get_recent_alerts(
+                request=_widget_request(), response=scratch, limit=params.limit, skip=0, cursor=params.cursor,
+                current_user=current_user, db=db
+            )
+        elif widget.type == "sensor_data":
+            params = SensorDataParams(**widget.params)
+            data = await get_farm_sensor_data(
+                widget.farm_id, hours=params.hours, points=params.points, current_user=current_user, db=db
+            )
+        elif widget.type == "sensor_snapshot":
+            data = await get_farm_sensor_snapshot(widget.farm_id, current_user=current_user, db=db)
+        elif widget.type == "production_summary":
+            data = await get_production_summary(widget.farm_id, current_user=current_user, db=db)
+        else:
+            data = await get_farm_dashboard(widget.farm_id, request=_widget_request(), current_user=current_user, db=db)
+        if isinstance(data, Response):
+            if data.status_code != 200 or isinstance(data, StreamingResponse):
+                raise RuntimeError(f"Unexpected {data.status_code} {type(data).__name__} from the {widget.type} widget")
+            data = json.loads(data.body)
+        result = {"status": 200, "data": jsonable_encoder(data)}
+        if NEXT_CURSOR_HEADER in scratch.headers:
+            result["next_cursor"] = scratch.headers[NEXT_CURSOR_HEADER]
+        return result
+
+async def _widget_result(widget: WidgetRequest, current_user: Principal,
+                         access: Dict[int, Optional[HTTPException]]) -> dict:
+    result = {"id": widget.id, "type": widget.type}
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{IOT_SERVICE_URL}/health")
-            services_health["iot_service"] = {
-                "status": "healthy" if response.status_code == 200 else "unhealthy",
-                "response_time": response.elapsed.total_seconds()
-            }
+        if widget.type in FARM_WIDGETS:
+            if widget.farm_id is None:
+                raise HTTPException(status_code=422, detail="farm_id is required for this widget")
+            denied = access[widget.farm_id]
+            if denied is not None:
+                raise denied
+        result.update(await _run_widget(widget, current_user))
+    except HTTPException as e:
+        result.update({"status": e.status_code, "error": e.detail})
+    except ValidationError as e:
+        result.update({"status": 422, "error": e.errors(include_url=False)})
     except Exception as e:
-        services_health["iot_service"] = {
-            "status": "offline",
-            "error": str(e)
-        }
+        logger.exception(f"Dashboard widget {widget.type} failed")
+        result.update({"status": 500, "error": str(e)})
+    return result
+
+@router.post("/batch")
+async def get_dashboard_batch(
+    batch: BatchRequest,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Run several dashboard widgets concurrently and return their results in request order"""
     
-    # Check Analytics Service
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{ANALYTICS_SERVICE_URL}/health")
-            services_health["analytics_service"] = {
-                "status": "healthy" if response.status_code == 200 else "unhealthy",
-                "response_time": response.elapsed.total_seconds()
-            }
-    except Exception as e:
-        services_health["analytics_service"] = {
-            "status": "offline",
-            "error": str(e)
-        }
+    if len(batch.widgets) > BATCH_MAX_WIDGETS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_WIDGETS} widgets per batch")
     
-    return {
-        "api_gateway": {"status": "healthy"},
-        "services": services_health,
-        "timestamp": func.now()
-    } 
\ No newline at end of file
+    # Check each farm once for all the widgets that use it
+    access: Dict[int, Optional[HTTPException]] = {}
+    for farm_id in {widget.farm_id for widget in batch.widgets if widget.farm_id is not None}:
+        try:
+            await authorize_farm(farm_id, current_user, db)
+            access[farm_id] = None
+        except HTTPException as e:
+            access[farm_id] = e
+    
+    # Widgets see the granted farms as already authorized, so their own
+    # authorize_farm calls return without another lookup
+    granted = {farm_id for farm_id, denied in access.items() if denied is None}
+    if not granted <= current_user.farm_ids:
+        current_user = current_user.model_copy(update={"farm_ids": current_user.farm_ids | granted})
+    
+    results = await asyncio.gather(*(
+        _widget_result(widget, current_user, access) for widget in batch.widgets
+    ))
+    return {"widgets": results}
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
-from app.database import get_db
-from app.models import Farm, User, FarmStatus, Sensor
-from app.routers.auth import get_current_active_user
+from app.conditional import farm_response
+from app.database import get_async_db
+from app.models import Farm, FarmStatus, Sensor
+from app.pagination import page_rows, paginate
+from app.streaming import model_serializer, ndjson_response, wants_ndjson
+from app.principal import Principal, principal_cache
+from app.routers.auth import authorize_farm, get_current_active_user
 
 router = APIRouter()
 
@@ -56,60 +61,75 @@ class SensorResponse(BaseModel):
     class Config:
         from_attributes = True
 
+async def _get_farm(db: AsyncSession, farm_id: int) -> Farm:
+    farm = await db.get(Farm, farm_id)
+    if farm is None:
+        raise HTTPException(status_code=404, detail="Farm not found")
+    return farm
+
 # Routes
 @router.post("/", response_model=FarmResponse)
 async def create_farm(
     farm: FarmCreate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     db_farm = Farm(
         **farm.dict(),
         owner_id=current_user.id
     )
     db.add(db_farm)
-    db.commit()
-    db.refresh(db_farm)
+    await db.commit()
+    await db.refresh(db_farm)
+    # Owners and admins now have access to one more farm
+    await principal_cache.invalidate()
     return db_farm
 
 @router.get("/", response_model=List[FarmResponse])
 async def read_farms(
+    request: Request,
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # If user is admin or manager, show all farms, otherwise show only owned farms
     if current_user.role.value in ["admin", "manager"]:
-        farms = db.query(Farm).offset(skip).limit(limit).all()
+        query = select(Farm)
     else:
-        farms = db.query(Farm).filter(Farm.owner_id == current_user.id).offset(skip).limit(limit).all()
-    return farms
+        query = select(Farm).where(Farm.owner_id == current_user.id)
+    keys = (Farm.id,)
+    if wants_ndjson(request):
+        return ndjson_response(paginate(query, keys, None, cursor, skip), model_serializer(FarmResponse))
+    result = await db.execute(paginate(query, keys, limit, cursor, skip))
+    return page_rows(result.scalars().all(), keys, limit, response)
 
 @router.get("/{farm_id}", response_model=FarmResponse)
 async def read_farm(
     farm_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    farm = db.query(Farm).filter(Farm.id == farm_id).first()
-    if farm is None:
-        raise HTTPException(status_code=404, detail="Farm not found")
-    
     # Check if user has access to this farm
-    if current_user.role.value not in ["admin", "manager"] and farm.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    await authorize_farm(farm_id, current_user, db)
     
-    return farm
+    async def build(response: Response):
+        farm = await _get_farm(db, farm_id)
+        return FarmResponse.model_validate(farm)
+    
+    return await farm_response(request, farm_id, "farm", build)
 
 @router.put("/{farm_id}", response_model=FarmResponse)
 async def update_farm(
     farm_id: int,
     farm_update: FarmUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    farm = db.query(Farm).filter(Farm.id == farm_id).first()
+    farm = await db.get(Farm, farm_id)
     if farm is None:
         raise HTTPException(status_code=404, detail="Farm not found")
     
@@ -122,17 +142,17 @@ async def update_farm(
     for field, value in update_data.items():
         setattr(farm, field, value)
     
-    db.commit()
-    db.refresh(farm)
+    await db.commit()
+    await db.refresh(farm)
     return farm
 
 @router.delete("/{farm_id}")
 async def delete_farm(
     farm_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    farm = db.query(Farm).filter(Farm.id == farm_id).first()
+    farm = await db.get(Farm, farm_id)
     if farm is None:
         raise HTTPException(status_code=404, detail="Farm not found")
     
@@ -140,55 +160,69 @@ async def delete_farm(
     if current_user.role.value not in ["admin", "manager"] and farm.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    db.delete(farm)
-    db.commit()
+    await db.delete(farm)
+    await db.commit()
+    await principal_cache.invalidate()
     return {"message": "Farm deleted successfully"}
 
 @router.get("/{farm_id}/sensors", response_model=List[SensorResponse])
 async def get_farm_sensors(
     farm_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(1000, ge=1, le=5000),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    farm = db.query(Farm).filter(Farm.id == farm_id).first()
-    if farm is None:
-        raise HTTPException(status_code=404, detail="Farm not found")
-    
     # Check if user has access to this farm
-    if current_user.role.value not in ["admin", "manager"] and farm.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    await authorize_farm(farm_id, current_user, db)
+    
+    # Walks the farm's slice of the sensors index in id order
+    keys = (Sensor.id,)
+    query = select(Sensor).where(Sensor.farm_id == farm_id)
+    if wants_ndjson(request):
+        return ndjson_response(paginate(query, keys, None, cursor, skip), model_serializer(SensorResponse))
     
-    sensors = db.query(Sensor).filter(Sensor.farm_id == farm_id).all()
-    return sensors
+    async def build(response: Response):
+        result = await db.execute(paginate(query, keys, limit, cursor, skip))
+        sensors = page_rows(result.scalars().all(), keys, limit, response)
+        return [SensorResponse.model_validate(sensor) for sensor in sensors]
+    
+    return await farm_response(request, farm_id, f"sensors?skip={skip}&limit={limit}&cursor={cursor}", build)
 
 @router.get("/{farm_id}/dashboard")
 async def get_farm_dashboard(
     farm_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    farm = db.query(Farm).filter(Farm.id == farm_id).first()
-    if farm is None:
-        raise HTTPException(status_code=404, detail="Farm not found")
-    
     # Check if user has access to this farm
-    if current_user.role.value not in ["admin", "manager"] and farm.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    await authorize_farm(farm_id, current_user, db)
     
-    # Get basic farm statistics
-    sensors_count = db.query(Sensor).filter(Sensor.farm_id == farm_id).count()
-    active_sensors_count = db.query(Sensor).filter(
-        Sensor.farm_id == farm_id,
-        Sensor.is_active == True
-    ).count()
+    async def build(response: Response):
+        farm = await _get_farm(db, farm_id)
+        
+        # Get basic farm statistics
+        result = await db.execute(
+            select(
+                func.count(Sensor.id),
+                func.coalesce(func.sum(case((Sensor.is_active == True, 1), else_=0)), 0)
+            ).where(Sensor.farm_id == farm_id)
+        )
+        sensors_count, active_sensors_count = (int(value) for value in result.one())
+        
+        return {
+            "farm": farm,
+            "sensors": {
+                "total": sensors_count,
+                "active": active_sensors_count,
+                "inactive": sensors_count - active_sensors_count
+            },
+            "status": farm.status,
+            "capacity_utilization": 0.0  # TODO: Calculate from growing cycles
+        }
     
-    return {
-        "farm": farm,
-        "sensors": {
-            "total": sensors_count,
-            "active": active_sensors_count,
-            "inactive": sensors_count - active_sensors_count
-        },
-        "status": farm.status,
-        "capacity_utilization": 0.0  # TODO: Calculate from growing cycles
-    } 
\ No newline at end of file
+    return await farm_response(request, farm_id, "dashboard", build) 
\ No newline at end of file
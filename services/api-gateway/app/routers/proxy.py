@@ -0,0 +1,129 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
+import httpx
+import os
+import re
+
+from app.database import get_async_db
+from app.http_client import UpstreamUnavailable, upstreams
+from app.principal import Principal
+from app.routers.auth import authorize_farm, get_current_active_user
+
+router = APIRouter()
+
+PROXY_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE"]
+
+# Hop-by-hop headers are per connection and must not be forwarded (RFC 7230 6.1)
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "trailers", "transfer-encoding", "upgrade"
+}
+# Identity headers set by the gateway; never trusted from clients
+AUTH_CONTEXT_HEADERS = {"x-user-id", "x-user-name", "x-user-role", "x-gateway-secret"}
+# Shared with the backend services so they can tell gateway requests from direct ones
+GATEWAY_SHARED_SECRET = os.getenv("GATEWAY_SHARED_SECRET", "")
+
+# Upstream paths scoped to one farm, with the farm id as the first group
+FARM_SCOPED_PATHS = {
+    "iot": re.compile(r"sensors/(?:snapshot|data)/farm/([^/]+)/?"),
+}
+# Writes whose body may carry readings for any farm; only users who see all farms may send them
+ALL_FARM_WRITE_PATHS = {
+    "iot": re.compile(r"sensors/data/?"),
+}
+READ_ONLY_ROLES = {"viewer"}
+
+async def _authorize(upstream: str, path: str, request: Request, current_user: Principal, db: AsyncSession):
+    """Apply the gateway's farm and role checks before a request leaves for a backend"""
+    writes = request.method not in ("GET", "HEAD", "OPTIONS")
+    if writes and current_user.role.value in READ_ONLY_ROLES:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    farm_scoped = FARM_SCOPED_PATHS.get(upstream)
+    match = farm_scoped.fullmatch(path) if farm_scoped else None
+    if match is not None:
+        if not match.group(1).isdigit():
+            raise HTTPException(status_code=404, detail="Farm not found")
+        await authorize_farm(int(match.group(1)), current_user, db)
+    all_farm_writes = ALL_FARM_WRITE_PATHS.get(upstream)
+    if writes and all_farm_writes and all_farm_writes.fullmatch(path) and not current_user.sees_all_farms:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    # Give the connection back before a possibly long-lived stream starts
+    await db.close()
+
+def _request_headers(request: Request, current_user: Principal) -> dict:
+    headers = {
+        name: value for name, value in request.headers.items()
+        if name not in HOP_BY_HOP_HEADERS and name not in AUTH_CONTEXT_HEADERS
+        and name not in ("host", "authorization")
+    }
+    headers["x-user-id"] = str(current_user.id)
+    headers["x-user-name"] = current_user.username
+    headers["x-user-role"] = current_user.role.value
+    if GATEWAY_SHARED_SECRET:
+        headers["x-gateway-secret"] = GATEWAY_SHARED_SECRET
+    client = request.client.host if request.client else ""
+    forwarded_for = request.headers.get("x-forwarded-for")
+    headers["x-forwarded-for"] = f"{forwarded_for}, {client}" if forwarded_for else client
+    return headers
+
+def _response_headers(response: httpx.Response) -> dict:
+    # content-length stays: the raw body is passed through byte for byte
+    return {name: value for name, value in response.headers.items() if name not in HOP_BY_HOP_HEADERS}
+
+async def _forward(upstream: str, path: str, request: Request, current_user: Principal):
+    """Relay a request to a backend service, streaming both bodies"""
+    # Only stream a body if the client sent one; GETs go out without chunked encoding
+    has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+    outbound = upstreams.clients[upstream].build_request(
+        request.method,
+        f"/api/v1/{path}",
+        params=request.query_params,
+        headers=_request_headers(request, current_user),
+        content=request.stream() if has_body else None
+    )
+    try:
+        response = await upstreams.open_stream(upstream, outbound)
+    except UpstreamUnavailable:
+        raise HTTPException(status_code=503, detail=f"{upstream} service unavailable", headers={"Retry-After": "5"})
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail=f"{upstream} service timed out")
+    except httpx.TransportError:
+        raise HTTPException(status_code=502, detail=f"{upstream} service unreachable")
+    return StreamingResponse(
+        response.aiter_raw(),
+        status_code=response.status_code,
+        headers=_response_headers(response),
+        background=BackgroundTask(response.aclose)
+    )
+
+@router.api_route("/iot/{path:path}", methods=PROXY_METHODS, include_in_schema=False)
+async def proxy_iot(
+    path: str,
+    request: Request,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    await _authorize("iot", path, request, current_user, db)
+    return await _forward("iot", path, request, current_user)
+
+@router.api_route("/business/{path:path}", methods=PROXY_METHODS, include_in_schema=False)
+async def proxy_business(
+    path: str,
+    request: Request,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    await _authorize("business", path, request, current_user, db)
+    return await _forward("business", path, request, current_user)
+
+@router.api_route("/analytics/{path:path}", methods=PROXY_METHODS, include_in_schema=False)
+async def proxy_analytics(
+    path: str,
+    request: Request,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    await _authorize("analytics", path, request, current_user, db)
+    return await _forward("analytics", path, request, current_user)
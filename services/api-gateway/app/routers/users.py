@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
-from app.database import get_db
-from app.models import User, UserRole
+from app.database import get_async_db
+from app.models import Farm, User, UserRole
+from app.pagination import page_rows, paginate
+from app.streaming import model_serializer, ndjson_response, wants_ndjson
+from app.principal import Principal, principal_cache
 from app.routers.auth import get_current_active_user
 
 router = APIRouter()
@@ -33,10 +37,13 @@ class UserResponse(BaseModel):
 # Routes
 @router.get("/", response_model=List[UserResponse])
 async def read_users(
+    request: Request,
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Only admin and manager can view all users
     if current_user.role.value not in ["admin", "manager"]:
@@ -45,14 +52,19 @@ async def read_users(
             detail="Not enough permissions"
         )
     
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+    # Pass the X-Next-Cursor token as `cursor` to continue after the last row
+    keys = (User.id,)
+    if wants_ndjson(request):
+        # Export mode: every row from the cursor on, streamed instead of one page
+        return ndjson_response(paginate(select(User), keys, None, cursor, skip), model_serializer(UserResponse))
+    result = await db.execute(paginate(select(User), keys, limit, cursor, skip))
+    return page_rows(result.scalars().all(), keys, limit, response)
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def read_user(
     user_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Users can only view their own profile unless they're admin/manager
     if current_user.role.value not in ["admin", "manager"] and current_user.id != user_id:
@@ -61,7 +73,7 @@ async def read_user(
             detail="Not enough permissions"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -71,8 +83,8 @@ async def read_user(
 async def update_user(
     user_id: int,
     user_update: UserUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Users can only update their own profile unless they're admin/manager
     if current_user.role.value not in ["admin", "manager"] and current_user.id != user_id:
@@ -81,7 +93,7 @@ async def update_user(
             detail="Not enough permissions"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -93,10 +105,11 @@ async def update_user(
     
     # Check if username/email already exists
     if "username" in update_data:
-        existing_user = db.query(User).filter(
+        result = await db.execute(select(User).where(
             User.username == update_data["username"],
             User.id != user_id
-        ).first()
+        ))
+        existing_user = result.scalars().first()
         if existing_user:
             raise HTTPException(
                 status_code=400,
@@ -104,10 +117,11 @@ async def update_user(
             )
     
     if "email" in update_data:
-        existing_user = db.query(User).filter(
+        result = await db.execute(select(User).where(
             User.email == update_data["email"],
             User.id != user_id
-        ).first()
+        ))
+        existing_user = result.scalars().first()
         if existing_user:
             raise HTTPException(
                 status_code=400,
@@ -118,15 +132,16 @@ async def update_user(
     for field, value in update_data.items():
         setattr(user, field, value)
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    await principal_cache.invalidate()
     return user
 
 @router.delete("/{user_id}")
 async def delete_user(
     user_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Only admin can delete users
     if current_user.role.value != "admin":
@@ -135,7 +150,7 @@ async def delete_user(
             detail="Not enough permissions"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -146,15 +161,16 @@ async def delete_user(
             detail="Cannot delete your own account"
         )
     
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    await principal_cache.invalidate()
     return {"message": "User deleted successfully"}
 
 @router.get("/{user_id}/farms")
 async def get_user_farms(
     user_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Users can only view their own farms unless they're admin/manager
     if current_user.role.value not in ["admin", "manager"] and current_user.id != user_id:
@@ -163,8 +179,9 @@ async def get_user_farms(
             detail="Not enough permissions"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return user.farms 
\ No newline at end of file
+    result = await db.execute(select(Farm).where(Farm.owner_id == user_id))
+    return result.scalars().all() 
\ No newline at end of file
@@ -0,0 +1,44 @@
+import json
+import os
+from typing import Any, Callable, Type
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import Select, inspect
+
+from app.database import AsyncSessionLocal
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Rows fetched from the server-side cursor per round trip
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+Serializer = Callable[[Any], str]
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def model_serializer(model: Type[BaseModel]) -> Serializer:
+    """Serialize rows through a response model, as the buffered endpoint would"""
+    return lambda obj: model.model_validate(obj).model_dump_json()
+
+def column_serializer(obj) -> str:
+    """Serialize the mapped columns of a row, for endpoints without a response model"""
+    return json.dumps(jsonable_encoder({attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}))
+
+def ndjson_response(query: Select, serialize: Serializer) -> StreamingResponse:
+    """Stream every row of a query as one JSON document per line
+
+    Rows come from a server-side cursor in batches of STREAM_BATCH_SIZE and
+    are written as soon as they are serialized, so memory does not grow
+    with the result. The query runs on its own session because the
+    response outlives the request's dependencies.
+    """
+    async def lines():
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+            async for obj in result.scalars():
+                yield serialize(obj) + "\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
@@ -1,70 +1,217 @@
 from fastapi import WebSocket
-from typing import Dict, List
+from collections import deque
+from typing import Deque, Dict, Optional, Set, Tuple
+import asyncio
 import json
 import logging
+import os
+
+import redis.asyncio as redis
+
+from app.broker import RedisBroker
 
 logger = logging.getLogger(__name__)
 
+# Outbound queue configuration
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))
+# What to do when a client's queue is full: drop_oldest, coalesce or disconnect
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+# "local" keeps broadcasts inside this process; "redis" shares them across workers
+WS_BROKER = os.getenv("WS_BROKER", "local")
+
+# Delivery scopes for broadcasts
+SCOPE_ALL = "all"
+SCOPE_ROOM = "room"
+SCOPE_CLIENT = "client"
+
+# Close code sent to clients disconnected for falling behind (RFC 6455 "Try Again Later")
+WS_CLOSE_TRY_AGAIN_LATER = 1013
+# Close code sent to a socket replaced by a newer connection with the same client id
+WS_CLOSE_REPLACED = 4000
+
+class ClientConnection:
+    """One WebSocket with its own bounded outbound queue and writer task"""
+
+    def __init__(self, websocket: WebSocket, client_id: str, queue_size: int, policy: str):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.queue_size = queue_size
+        self.policy = policy
+        # (coalesce key, encoded message)
+        self.queue: Deque[Tuple[Optional[str], str]] = deque()
+        self.rooms: Set[str] = set()
+        self.dropped = 0
+        self.closing = False
+        self.task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+
+    def enqueue(self, message: str, key: Optional[str] = None):
+        """Queue an already-encoded message without waiting on the socket"""
+        if self.closing:
+            return
+        if len(self.queue) >= self.queue_size:
+            if self.policy == "disconnect":
+                self.closing = True
+                self.queue.clear()
+                self._ready.set()
+                return
+            if self.policy == "coalesce" and key is not None:
+                # Drop the queued message with the same key so the client only gets the latest value
+                for index, (queued_key, _) in enumerate(self.queue):
+                    if queued_key == key:
+                        del self.queue[index]
+                        self.queue.append((key, message))
+                        self.dropped += 1
+                        return
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append((key, message))
+        self._ready.set()
+
+    async def run(self, manager: "WebSocketManager"):
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                while self.queue:
+                    _, message = self.queue.popleft()
+                    await self.websocket.send_text(message)
+                if self.closing:
+                    logger.warning(f"Disconnecting slow client {self.client_id}")
+                    await self.websocket.close(code=WS_CLOSE_TRY_AGAIN_LATER)
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending message to {self.client_id}: {e}")
+        manager.disconnect(self.client_id, self)
+
 class WebSocketManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.room_connections: Dict[str, List[str]] = {}
+    def __init__(self, queue_size: int = WS_SEND_QUEUE_SIZE, policy: str = WS_SLOW_CONSUMER_POLICY):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.active_connections: Dict[str, ClientConnection] = {}
+        self.room_connections: Dict[str, Set[str]] = {}
+        self.dropped_messages = 0
+        self.broker: Optional[RedisBroker] = None
+
+    async def attach_broker(self, broker: RedisBroker):
+        """Route broadcasts through a broker so clients on every worker receive them"""
+        await broker.start(self._deliver)
+        self.broker = broker
+
+    async def detach_broker(self):
+        if self.broker is not None:
+            await self.broker.close()
+            self.broker = None
 
-    async def connect(self, websocket: WebSocket, client_id: str):
+    async def connect(self, websocket: WebSocket, client_id: str) -> ClientConnection:
         await websocket.accept()
-        self.active_connections[client_id] = websocket
+        replaced = self.active_connections.get(client_id)
+        if replaced is not None:
+            self.disconnect(client_id, replaced)
+        connection = ClientConnection(websocket, client_id, self.queue_size, self.policy)
+        connection.task = asyncio.create_task(connection.run(self), name=f"ws-writer-{client_id}")
+        self.active_connections[client_id] = connection
         logger.info(f"Client {client_id} connected")
+        if replaced is not None:
+            # End the stale socket so its receive loop exits instead of lingering
+            try:
+                await replaced.websocket.close(code=WS_CLOSE_REPLACED)
+            except Exception as e:
+                logger.debug(f"Could not close replaced socket of {client_id}: {e}")
+        return connection
+
+    def disconnect(self, client_id: str, connection: Optional[ClientConnection] = None):
+        current = self.active_connections.get(client_id)
+        if current is None or (connection is not None and current is not connection):
+            return
+        del self.active_connections[client_id]
+        self.dropped_messages += current.dropped
+        # Remove from the rooms this client joined
+        for room in current.rooms:
+            clients = self.room_connections.get(room)
+            if clients is not None:
+                clients.discard(client_id)
+                if not clients:
+                    del self.room_connections[room]
+        if current.task is not None and current.task is not asyncio.current_task():
+            current.task.cancel()
+        logger.info(f"Client {client_id} disconnected")
 
-    def disconnect(self, client_id: str):
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
-            # Remove from all rooms
-            for room, clients in self.room_connections.items():
-                if client_id in clients:
-                    clients.remove(client_id)
-            logger.info(f"Client {client_id} disconnected")
+    def _enqueue(self, client_id: str, message: str, key: Optional[str] = None):
+        connection = self.active_connections.get(client_id)
+        if connection is not None:
+            connection.enqueue(message, key)
+
+    def _fan_out(self, client_ids, message: str, key: Optional[str] = None):
+        # Snapshot the ids: a disconnect policy may change membership while we enqueue
+        connections = self.active_connections
+        for client_id in list(client_ids):
+            connection = connections.get(client_id)
+            if connection is not None:
+                connection.enqueue(message, key)
+
+    def _deliver(self, scope: str, target: Optional[str], key: Optional[str], message: str):
+        """Hand an encoded message to the matching connections of this worker"""
+        if scope == SCOPE_ALL:
+            self._fan_out(self.active_connections, message, key)
+        elif scope == SCOPE_ROOM:
+            if target in self.room_connections:
+                self._fan_out(self.room_connections[target], message, key)
+        elif scope == SCOPE_CLIENT:
+            self._enqueue(target, message, key)
+
+    async def _dispatch(self, scope: str, target: Optional[str], message: str, key: Optional[str] = None):
+        if self.broker is None:
+            self._deliver(scope, target, key, message)
+            return
+        try:
+            await self.broker.publish(scope, target, key, message)
+        except redis.RedisError as e:
+            # Reach at least this worker's clients while the broker is unavailable
+            logger.warning(f"WebSocket broker publish failed, delivering locally: {e}")
+            self._deliver(scope, target, key, message)
 
     async def send_personal_message(self, message: str, client_id: str):
-        if client_id in self.active_connections:
-            websocket = self.active_connections[client_id]
-            try:
-                await websocket.send_text(message)
-            except Exception as e:
-                logger.error(f"Error sending message to {client_id}: {e}")
-                self.disconnect(client_id)
+        if client_id in self.active_connections or self.broker is None:
+            self._enqueue(client_id, message)
+        else:
+            await self._dispatch(SCOPE_CLIENT, client_id, message)
 
     async def send_json_message(self, data: dict, client_id: str):
-        if client_id in self.active_connections:
-            websocket = self.active_connections[client_id]
-            try:
-                await websocket.send_json(data)
-            except Exception as e:
-                logger.error(f"Error sending JSON to {client_id}: {e}")
-                self.disconnect(client_id)
+        await self.send_personal_message(json.dumps(data), client_id)
 
     def join_room(self, client_id: str, room: str):
-        if room not in self.room_connections:
-            self.room_connections[room] = []
-        if client_id not in self.room_connections[room]:
-            self.room_connections[room].append(client_id)
+        connection = self.active_connections.get(client_id)
+        if connection is None:
+            return
+        self.room_connections.setdefault(room, set()).add(client_id)
+        connection.rooms.add(room)
 
     def leave_room(self, client_id: str, room: str):
-        if room in self.room_connections and client_id in self.room_connections[room]:
-            self.room_connections[room].remove(client_id)
+        clients = self.room_connections.get(room)
+        if clients is not None:
+            clients.discard(client_id)
+            if not clients:
+                del self.room_connections[room]
+        connection = self.active_connections.get(client_id)
+        if connection is not None:
+            connection.rooms.discard(room)
 
-    async def broadcast_to_room(self, message: str, room: str):
-        if room in self.room_connections:
-            for client_id in self.room_connections[room]:
-                await self.send_personal_message(message, client_id)
+    async def broadcast_to_room(self, message: str, room: str, key: Optional[str] = None):
+        await self._dispatch(SCOPE_ROOM, room, message, key)
 
-    async def broadcast_json_to_room(self, data: dict, room: str):
-        if room in self.room_connections:
-            for client_id in self.room_connections[room]:
-                await self.send_json_message(data, client_id)
+    async def broadcast_json_to_room(self, data: dict, room: str, key: Optional[str] = None):
+        # Encode once for every recipient on every worker
+        await self._dispatch(SCOPE_ROOM, room, json.dumps(data), key)
 
-    async def broadcast_to_all(self, message: str):
-        for client_id in self.active_connections:
-            await self.send_personal_message(message, client_id)
+    async def broadcast_to_all(self, message: str, key: Optional[str] = None):
+        await self._dispatch(SCOPE_ALL, None, message, key)
 
     async def broadcast_sensor_data(self, sensor_data: dict):
         """Broadcast sensor data to all connected clients"""
@@ -73,13 +220,36 @@ class WebSocketManager:
             "data": sensor_data,
             "timestamp": sensor_data.get("timestamp")
         }
-        await self.broadcast_json_to_room(message, "dashboard")
+        # Slow clients under the coalesce policy only keep the latest value per sensor
+        key = f"sensor_data:{sensor_data.get('device_id')}:{sensor_data.get('sensor_type')}"
+        await self.broadcast_json_to_room(message, "dashboard", key=key)
 
-    async def broadcast_alert(self, alert_data: dict):
-        """Broadcast alerts to all connected clients"""
-        message = {
+    @staticmethod
+    def _alert_message(alert_data: dict) -> str:
+        return json.dumps({
             "type": "alert",
             "data": alert_data,
             "severity": alert_data.get("severity", "info")
+        })
+
+    async def broadcast_alert(self, alert_data: dict):
+        """Broadcast alerts to all connected clients"""
+        await self.broadcast_to_all(self._alert_message(alert_data))
+
+    def deliver_alert_locally(self, alert_data: dict):
+        """Send an alert to this worker's clients only, for events every worker already receives"""
+        self._deliver(SCOPE_ALL, None, None, self._alert_message(alert_data))
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self.active_connections),
+            "rooms": {room: len(clients) for room, clients in self.room_connections.items()},
+            "queued_messages": sum(len(c.queue) for c in self.active_connections.values()),
+            "dropped_messages": self.dropped_messages + sum(c.dropped for c in self.active_connections.values()),
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "broker": {
+                "published": self.broker.published,
+                "received": self.broker.received
+            } if self.broker is not None else None
         }
-        await self.broadcast_to_all(json.dumps(message)) 
\ No newline at end of file
@@ -0,0 +1,317 @@
+"""Endpoint benchmark for the api-gateway against a seeded local database
+
+Seeds a database with the fixtures in benchmarks.fixtures (SQLite by
+default, or any URL such as a MySQL container), starts the gateway under
+uvicorn with query profiling on and a local Redis stand-in, then drives
+each endpoint at every concurrency level. For each endpoint and level it
+reports throughput, p50/p95/p99 latency and queries per request (from
+the X-Query-Count header). The JSON baseline it writes can be compared
+against a later run to catch regressions.
+
+    python -m benchmarks.endpoints --scale 0.1 --output benchmarks/baseline.json
+    python -m benchmarks.endpoints --scale 0.1 --compare benchmarks/baseline.json
+
+SQLite runs need aiosqlite installed next to the gateway requirements.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.fixtures import BENCH_PASSWORD, BENCH_USERNAME, hash_password, is_seeded, scaled, seed
+from benchmarks.local_redis import LocalRedis
+
+GATEWAY_DIR = Path(__file__).resolve().parent.parent
+
+ENDPOINTS = ["overview", "production-summary", "farm-sensors", "token", "websocket"]
+# bcrypt dominates /auth/token, so it gets a smaller share of the request budget
+REQUEST_SHARE = {"token": 0.1}
+
+
+def async_url(database_url: str) -> str:
+    if database_url.startswith("sqlite:"):
+        return database_url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    return database_url.replace("+pymysql", "+aiomysql", 1)
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float, queries: List[int]) -> dict:
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": None,
+        "p95_ms": None,
+        "p99_ms": None,
+        "queries_per_request": round(statistics.mean(queries), 2) if queries else None,
+    }
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        result.update(p50_ms=round(cuts[49] * 1000, 2), p95_ms=round(cuts[94] * 1000, 2),
+                      p99_ms=round(cuts[98] * 1000, 2))
+    return result
+
+
+class Gateway:
+    """The gateway app running under uvicorn in a child process"""
+
+    def __init__(self, args, database_url: str, redis_url: str):
+        self.args = args
+        self.port = args.port or free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.env = {
+            **os.environ,
+            "DATABASE_URL": database_url,
+            "ASYNC_DATABASE_URL": async_url(database_url),
+            "REDIS_URL": redis_url,
+            "WS_BROKER": "redis" if args.workers > 1 else "local",
+            "QUERY_PROFILING": "true",
+            "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+        }
+        self.process: Optional[subprocess.Popen] = None
+
+    async def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(self.port),
+             "--workers", str(self.args.workers), "--log-level", "warning", "--no-access-log"],
+            cwd=GATEWAY_DIR, env=self.env
+        )
+        deadline = time.monotonic() + 60
+        async with httpx.AsyncClient(base_url=self.base_url) as client:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"gateway exited with code {self.process.returncode}")
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        return
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.2)
+        raise RuntimeError("gateway did not become healthy within 60s")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+
+
+async def http_load(client: httpx.AsyncClient, concurrency: int, total: int,
+                    request: Callable[[httpx.AsyncClient], "asyncio.Future"]) -> dict:
+    """Run total requests spread over concurrency workers, as fast as they complete"""
+    latencies: List[float] = []
+    queries: List[int] = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await request(client)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            if response.status_code >= 400:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if "x-query-count" in response.headers:
+                queries.append(int(response.headers["x-query-count"]))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started, queries)
+
+
+async def websocket_load(base_url: str, concurrency: int, total: int) -> dict:
+    """Echo round trips over one WebSocket per worker"""
+    import websockets
+
+    latencies: List[float] = []
+    errors = 0
+    per_worker = max(1, total // concurrency)
+    ws_url = base_url.replace("http://", "ws://", 1)
+
+    async def worker(index: int):
+        nonlocal errors
+        try:
+            async with websockets.connect(f"{ws_url}/ws/bench-{index}") as connection:
+                for seq in range(per_worker):
+                    started = time.perf_counter()
+                    await connection.send(f"ping {seq}")
+                    await connection.recv()
+                    latencies.append(time.perf_counter() - started)
+        except (OSError, websockets.WebSocketException):
+            errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started, [])
+
+
+def build_requests(token: str, farms: int) -> Dict[str, Callable]:
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def farm_id() -> int:
+        return random.randint(1, farms)
+
+    return {
+        "overview": lambda client: client.get("/api/v1/dashboard/overview", headers=headers),
+        "production-summary": lambda client: client.get(
+            f"/api/v1/dashboard/production-summary/{farm_id()}", headers=headers),
+        "farm-sensors": lambda client: client.get(f"/api/v1/farms/{farm_id()}/sensors", headers=headers),
+        "token": lambda client: client.post(
+            "/api/v1/auth/token", data={"username": BENCH_USERNAME, "password": BENCH_PASSWORD}),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=GATEWAY_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> List[str]:
+    """Describe every endpoint/level that got slower, less throughput or more queries than allowed"""
+    regressions = []
+    for endpoint, levels in current["results"].items():
+        for level, now in levels.items():
+            before = baseline.get("results", {}).get(endpoint, {}).get(level)
+            if before is None:
+                continue
+            name = f"{endpoint} @ {level}"
+            if before["p95_ms"] and now["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {now['p95_ms']}ms")
+            if now["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+                regressions.append(f"{name}: throughput {before['throughput_rps']} -> {now['throughput_rps']} rps")
+            if (before["queries_per_request"] is not None and now["queries_per_request"] is not None
+                    and now["queries_per_request"] > before["queries_per_request"]):
+                regressions.append(
+                    f"{name}: queries/request {before['queries_per_request']} -> {now['queries_per_request']}")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, dict]]):
+    print(f"{'endpoint':<20}{'conc':>6}{'reqs':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'queries':>9}")
+    for endpoint, levels in results.items():
+        for level, r in levels.items():
+            queries = "-" if r["queries_per_request"] is None else r["queries_per_request"]
+            print(f"{endpoint:<20}{level:>6}{r['requests']:>8}{r['errors']:>6}{r['throughput_rps']:>10}"
+                  f"{r['p50_ms'] or '-':>10}{r['p95_ms'] or '-':>10}{r['p99_ms'] or '-':>10}{queries:>9}")
+
+
+async def main(args) -> int:
+    sizes = scaled(args.scale)
+    if args.reseed or not is_seeded(args.database_url, sizes):
+        seed(args.database_url, sizes, hash_password(BENCH_PASSWORD, args.bcrypt_rounds))
+
+    redis_server = None
+    redis_url = args.redis_url
+    if redis_url is None:
+        redis_server = LocalRedis()
+        await redis_server.start()
+        redis_url = redis_server.url
+
+    gateway = Gateway(args, args.database_url, redis_url)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    endpoints = args.endpoints.split(",") if args.endpoints else ENDPOINTS
+    results: Dict[str, Dict[str, dict]] = {}
+    try:
+        await gateway.start()
+        limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+        async with httpx.AsyncClient(base_url=gateway.base_url, limits=limits, timeout=60) as client:
+            response = await client.post(
+                "/api/v1/auth/token", data={"username": BENCH_USERNAME, "password": BENCH_PASSWORD})
+            response.raise_for_status()
+            requests = build_requests(response.json()["access_token"], sizes["farms"])
+
+            for endpoint in endpoints:
+                total = max(1, int(args.requests * REQUEST_SHARE.get(endpoint, 1)))
+                results[endpoint] = {}
+                if endpoint != "websocket":
+                    # Warm connections, the pool and the caches the endpoint would have in steady state
+                    await http_load(client, min(levels), args.warmup, requests[endpoint])
+                for level in levels:
+                    if endpoint == "websocket":
+                        result = await websocket_load(gateway.base_url, level, total)
+                    else:
+                        result = await http_load(client, level, total, requests[endpoint])
+                    results[endpoint][str(level)] = result
+                    print(f"{endpoint} @ {level}: {result['throughput_rps']} rps, p95 {result['p95_ms']} ms")
+    finally:
+        gateway.stop()
+        if redis_server is not None:
+            await redis_server.close()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "database": args.database_url.split(":", 1)[0],
+            "fixtures": sizes,
+            "workers": args.workers,
+            "requests": args.requests,
+            "bcrypt_rounds": args.bcrypt_rounds,
+            "python": platform.python_version(),
+        },
+        "results": results,
+    }
+    print()
+    print_table(results)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nbaseline written to {args.output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(baseline, report, args.tolerance)
+        print(f"\ncompared with {args.compare} (commit {baseline['meta'].get('commit')}):")
+        for line in regressions:
+            print(f"  REGRESSION {line}")
+        if not regressions:
+            print("  no regressions")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:////tmp/shroomlab-bench.db",
+                        help="sync SQLAlchemy URL, e.g. mysql+pymysql://... for a MySQL container")
+    parser.add_argument("--redis-url", help="use this Redis instead of the in-process stand-in")
+    parser.add_argument("--scale", type=float, default=1.0, help="fraction of the full fixture sizes")
+    parser.add_argument("--reseed", action="store_true", help="recreate the fixtures even if they match")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint and level")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--endpoints", help=f"comma-separated subset of {','.join(ENDPOINTS)}")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--output", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to compare against; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before flagging")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,186 @@
+"""Seeded database fixtures for the gateway benchmarks
+
+Creates the gateway schema in a fresh database and fills it with a
+deterministic fleet: users, farms, sensors, alerts and growing cycles at
+the sizes in FIXTURES, optionally scaled down. Works against SQLite files
+and against a MySQL container.
+
+    python -m benchmarks.fixtures --database-url sqlite:////tmp/shroomlab-bench.db --scale 0.1
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+from sqlalchemy import create_engine, func, select
+
+# Full-size fleet; --scale multiplies every count
+FIXTURES = {
+    "users": 1_000,
+    "farms": 500,
+    "sensors": 50_000,
+    "alerts": 1_000_000,
+    "growing_cycles": 100_000,
+}
+
+BENCH_USERNAME = "bench_admin"
+BENCH_PASSWORD = "benchmark"
+
+SENSOR_TYPES = ["temperature", "humidity", "co2", "ph", "light"]
+VARIETIES = ["Oyster", "Shiitake", "Lion's Mane", "King Oyster", "Enoki", "Maitake", "Reishi", "Button"]
+SEVERITIES = ["low", "medium", "medium", "high", "critical"]
+
+CHUNK_SIZE = 20_000
+ALERT_HISTORY_DAYS = 90
+UNRESOLVED_ALERT_RATE = 0.05
+
+
+def scaled(scale: float) -> Dict[str, int]:
+    return {table: max(1, int(count * scale)) for table, count in FIXTURES.items()}
+
+
+def _chunks(rows: Iterator[dict], size: int = CHUNK_SIZE) -> Iterator[List[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _users(count: int, password_hash: str) -> Iterator[dict]:
+    from app.models import UserRole
+
+    roles = [UserRole.MANAGER, UserRole.OPERATOR, UserRole.OPERATOR, UserRole.VIEWER]
+    yield {
+        "id": 1, "username": BENCH_USERNAME, "email": "bench_admin@bench.local", "hashed_password": password_hash,
+        "full_name": "Benchmark Admin", "role": UserRole.ADMIN, "is_active": True
+    }
+    for user_id in range(2, count + 1):
+        yield {
+            "id": user_id, "username": f"user{user_id:05d}", "email": f"user{user_id:05d}@bench.local",
+            "hashed_password": password_hash, "full_name": f"User {user_id}",
+            "role": roles[user_id % len(roles)], "is_active": True
+        }
+
+
+def _farms(count: int, users: int, rng: random.Random) -> Iterator[dict]:
+    from app.models import FarmStatus
+
+    for farm_id in range(1, count + 1):
+        yield {
+            "id": farm_id, "name": f"Farm {farm_id}", "description": "Benchmark farm",
+            "location": f"Site {farm_id % 40}", "owner_id": rng.randint(1, users),
+            "status": FarmStatus.MAINTENANCE if farm_id % 25 == 0 else FarmStatus.ACTIVE,
+            "total_area": rng.uniform(100, 5000), "growing_rooms": rng.randint(1, 12),
+            "max_capacity": rng.uniform(500, 20000)
+        }
+
+
+def _sensors(count: int, farms: int) -> Iterator[dict]:
+    for sensor_id in range(1, count + 1):
+        sensor_type = SENSOR_TYPES[sensor_id % len(SENSOR_TYPES)]
+        yield {
+            "id": sensor_id, "farm_id": (sensor_id - 1) % farms + 1, "sensor_type": sensor_type,
+            "name": f"{sensor_type} {sensor_id}", "location": f"Room {sensor_id % 12 + 1}",
+            "device_id": f"bench-{sensor_id:07d}", "is_active": sensor_id % 20 != 0,
+            "min_threshold": 15.0, "max_threshold": 25.0, "alert_enabled": True
+        }
+
+
+def _alerts(count: int, sensors: int, farms: int, rng: random.Random, now: datetime) -> Iterator[dict]:
+    history = ALERT_HISTORY_DAYS * 86400
+    for alert_id in range(1, count + 1):
+        sensor_id = rng.randint(1, sensors)
+        created_at = now - timedelta(seconds=rng.randrange(history))
+        resolved = rng.random() >= UNRESOLVED_ALERT_RATE
+        yield {
+            "id": alert_id, "farm_id": (sensor_id - 1) % farms + 1, "sensor_id": sensor_id,
+            "alert_type": "threshold", "severity": rng.choice(SEVERITIES),
+            "title": f"Threshold breached on sensor {sensor_id}", "is_resolved": resolved,
+            "resolved_at": created_at + timedelta(minutes=30) if resolved else None,
+            "created_at": created_at
+        }
+
+
+def _cycles(count: int, farms: int, rng: random.Random, now: datetime) -> Iterator[dict]:
+    for cycle_id in range(1, count + 1):
+        start = now - timedelta(days=rng.uniform(0, 365))
+        status = "active" if start > now - timedelta(days=40) else rng.choice(["harvested", "harvested", "failed"])
+        substrate = rng.uniform(50, 500)
+        expected = substrate * rng.uniform(0.5, 1.0)
+        yield {
+            "id": cycle_id, "farm_id": rng.randint(1, farms), "mushroom_variety": rng.choice(VARIETIES),
+            "start_date": start, "expected_harvest_date": start + timedelta(days=40),
+            "actual_harvest_date": start + timedelta(days=42) if status == "harvested" else None,
+            "status": status, "substrate_weight": substrate, "expected_yield": expected,
+            "actual_yield": expected * rng.uniform(0.7, 1.2) if status == "harvested" else None,
+            "created_at": start
+        }
+
+
+def is_seeded(database_url: str, sizes: Dict[str, int]) -> bool:
+    """Whether the database already holds exactly these fixture sizes"""
+    from app.database import Base
+
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as conn:
+            for table, count in sizes.items():
+                if conn.execute(select(func.count()).select_from(Base.metadata.tables[table])).scalar() != count:
+                    return False
+        return True
+    except Exception:
+        return False
+    finally:
+        engine.dispose()
+
+
+def seed(database_url: str, sizes: Dict[str, int], password_hash: str, seed_value: int = 42):
+    """Recreate the schema and insert the fixtures"""
+    from app.database import Base
+    from app import models  # noqa: F401  registers the tables
+
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    engine = create_engine(database_url)
+    tables = Base.metadata.tables
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    plan = [
+        ("users", _users(sizes["users"], password_hash)),
+        ("farms", _farms(sizes["farms"], sizes["users"], rng)),
+        ("sensors", _sensors(sizes["sensors"], sizes["farms"])),
+        ("alerts", _alerts(sizes["alerts"], sizes["sensors"], sizes["farms"], rng, now)),
+        ("growing_cycles", _cycles(sizes["growing_cycles"], sizes["farms"], rng, now)),
+    ]
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        for table, rows in plan:
+            started = time.perf_counter()
+            for chunk in _chunks(rows):
+                conn.execute(tables[table].insert(), chunk)
+            print(f"seeded {table:<15} {sizes[table]:>9,} rows in {time.perf_counter() - started:.1f}s")
+        if engine.dialect.name == "sqlite":
+            conn.exec_driver_sql("ANALYZE")
+    engine.dispose()
+
+
+def hash_password(password: str, rounds: int) -> str:
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds).hash(password)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:////tmp/shroomlab-bench.db")
+    parser.add_argument("--scale", type=float, default=1.0, help="fraction of the full fixture sizes")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    args = parser.parse_args()
+    seed(args.database_url, scaled(args.scale), hash_password(BENCH_PASSWORD, args.bcrypt_rounds))
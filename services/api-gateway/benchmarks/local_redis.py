@@ -0,0 +1,167 @@
+"""Minimal in-process Redis stand-in for local harnesses
+
+Speaks enough RESP2 for redis-py clients doing pub/sub (SUBSCRIBE,
+UNSUBSCRIBE, PUBLISH, PING), the string and hash commands the gateway
+caches use (GET, SET with EX/NX, INCR/INCRBY, DEL, EXPIRE, HGET, HSET), and
+answers +OK to connection setup commands. Keys live in process memory
+without persistence; it only lets gateway workers talk to "Redis" on one
+machine without a server installed.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+
+def _bulk(value: bytes) -> bytes:
+    return b"$" + str(len(value)).encode() + b"\r\n" + value + b"\r\n"
+
+
+def _array(items: List[bytes]) -> bytes:
+    return b"*" + str(len(items)).encode() + b"\r\n" + b"".join(items)
+
+
+def _integer(value: int) -> bytes:
+    return b":" + str(value).encode() + b"\r\n"
+
+
+NIL = b"$-1\r\n"
+OK = b"+OK\r\n"
+
+
+class LocalRedis:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.published = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._channels: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+        self._connections: Set[asyncio.Task] = set()
+        # key -> (value, expires at or None); hashes are dicts of field -> value
+        self._keys: Dict[bytes, Tuple[object, Optional[float]]] = {}
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # Hang up on clients still connected so their handlers finish before the loop closes
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.strip().split()
+        args = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    def _lookup(self, key: bytes):
+        entry = self._keys.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._keys[key]
+            return None
+        return value
+
+    def _command(self, name: bytes, args: List[bytes]) -> bytes:
+        """Answer a key-value command"""
+        if name == b"GET":
+            value = self._lookup(args[0])
+            return NIL if value is None else _bulk(value)
+        if name == b"SET":
+            key, value, options = args[0], args[1], [option.upper() for option in args[2:]]
+            if b"NX" in options and self._lookup(key) is not None:
+                return NIL
+            expires_at = None
+            if b"EX" in options:
+                expires_at = time.monotonic() + int(options[options.index(b"EX") + 1])
+            elif b"PX" in options:
+                expires_at = time.monotonic() + int(options[options.index(b"PX") + 1]) / 1000
+            self._keys[key] = (value, expires_at)
+            return OK
+        if name in (b"INCR", b"INCRBY"):
+            value = int(self._lookup(args[0]) or 0) + (int(args[1]) if len(args) > 1 else 1)
+            expires_at = self._keys.get(args[0], (None, None))[1]
+            self._keys[args[0]] = (str(value).encode(), expires_at)
+            return _integer(value)
+        if name == b"DEL":
+            return _integer(sum(1 for key in args if self._keys.pop(key, None) is not None))
+        if name == b"EXPIRE":
+            value = self._lookup(args[0])
+            if value is None:
+                return _integer(0)
+            self._keys[args[0]] = (value, time.monotonic() + int(args[1]))
+            return _integer(1)
+        if name == b"HGET":
+            fields = self._lookup(args[0]) or {}
+            value = fields.get(args[1])
+            return NIL if value is None else _bulk(value)
+        if name == b"HSET":
+            fields = self._lookup(args[0])
+            if fields is None:
+                fields = {}
+                self._keys[args[0]] = (fields, None)
+            pairs = list(zip(args[1::2], args[2::2]))
+            added = sum(1 for field, _ in pairs if field not in fields)
+            fields.update(pairs)
+            return _integer(added)
+        return OK
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscriptions: Set[bytes] = set()
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                name = command[0].upper()
+                if name == b"SUBSCRIBE":
+                    for channel in command[1:]:
+                        subscriptions.add(channel)
+                        self._channels.setdefault(channel, set()).add(writer)
+                        writer.write(_array([_bulk(b"subscribe"), _bulk(channel), _integer(len(subscriptions))]))
+                elif name == b"UNSUBSCRIBE":
+                    for channel in command[1:] or list(subscriptions):
+                        subscriptions.discard(channel)
+                        self._channels.get(channel, set()).discard(writer)
+                        writer.write(_array([_bulk(b"unsubscribe"), _bulk(channel), _integer(len(subscriptions))]))
+                elif name == b"PUBLISH":
+                    channel, data = command[1], command[2]
+                    subscribers = self._channels.get(channel, set())
+                    frame = _array([_bulk(b"message"), _bulk(channel), _bulk(data)])
+                    for subscriber in subscribers:
+                        subscriber.write(frame)
+                    self.published += 1
+                    writer.write(_integer(len(subscribers)))
+                elif name == b"PING":
+                    if subscriptions:
+                        writer.write(_array([_bulk(b"pong"), _bulk(b"")]))
+                    else:
+                        writer.write(b"+PONG\r\n")
+                else:
+                    writer.write(self._command(name, command[1:]))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(task)
+            for channel in subscriptions:
+                self._channels.get(channel, set()).discard(writer)
+            writer.close()
@@ -0,0 +1,83 @@
+"""Worker startup benchmark for the api-gateway
+
+Starts fresh interpreter processes, as a new worker or replica would,
+and times importing app.main and running its startup phase (lifespan
+up to the first request) against a local SQLite database and the Redis
+stand-in. Reports the interpreter-to-ready total as well.
+
+    python -m benchmarks.startup --runs 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.local_redis import LocalRedis
+
+GATEWAY_DIR = Path(__file__).resolve().parent.parent
+
+
+async def child():
+    started = time.perf_counter()
+    from app.main import app
+
+    imported = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+    print(json.dumps({"import": imported - started, "lifespan": ready - imported}))
+
+
+def run_once(env: dict) -> dict:
+    launched = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child"], cwd=GATEWAY_DIR, env=env,
+        capture_output=True, text=True, check=True
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["total"] = time.perf_counter() - launched
+    return timings
+
+
+async def main(args) -> int:
+    redis_server = LocalRedis()
+    await redis_server.start()
+    database = Path(tempfile.gettempdir()) / "shroomlab-startup.db"
+    env = {
+        **os.environ,
+        "DATABASE_URL": args.database_url or f"sqlite:///{database}",
+        "ASYNC_DATABASE_URL": args.async_database_url or f"sqlite+aiosqlite:///{database}",
+        "REDIS_URL": redis_server.url,
+    }
+    loop = asyncio.get_running_loop()
+    runs = []
+    try:
+        for _ in range(args.runs):
+            runs.append(await loop.run_in_executor(None, run_once, env))
+    finally:
+        await redis_server.close()
+
+    print(f"runs: {args.runs}")
+    for phase in ("import", "lifespan", "total"):
+        values = [run[phase] * 1000 for run in runs]
+        print(f"{phase:<10} median {statistics.median(values):8.1f} ms   min {min(values):8.1f} ms   "
+              f"max {max(values):8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--database-url", help="sync URL; defaults to a temporary SQLite file")
+    parser.add_argument("--async-database-url")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        asyncio.run(child())
+        sys.exit(0)
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,150 @@
+"""Multi-worker harness for the Redis-backed WebSocket broker
+
+Starts a local Redis stand-in and several worker processes. Each worker
+runs its own WebSocketManager attached to a RedisBroker, with fake
+WebSocket clients in the "dashboard" room. Every worker broadcasts sensor
+data and alerts; the harness checks that every client on every worker
+received every message exactly once and reports end-to-end latency.
+
+    python -m benchmarks.ws_broker_harness --workers 4 --clients 250 --messages 200
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import statistics
+import sys
+import time
+
+from benchmarks.local_redis import LocalRedis
+
+LATENCY_SAMPLES_PER_CLIENT = 50
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.received = 0
+        self.latencies = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        received_at = time.time()
+        self.received += 1
+        if len(self.latencies) < LATENCY_SAMPLES_PER_CLIENT:
+            data = json.loads(message)["data"]
+            self.latencies.append(received_at - data["sent_at"])
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def run_worker(index: int, args, redis_url: str, barrier, results):
+    from app.broker import RedisBroker
+    from app.websocket import WebSocketManager
+
+    manager = WebSocketManager(queue_size=args.workers * (args.messages + args.alerts) + 10)
+    await manager.attach_broker(RedisBroker(redis_url=redis_url, channel="harness:ws"))
+
+    sockets = []
+    for client in range(args.clients):
+        websocket = FakeWebSocket()
+        client_id = f"w{index}-c{client}"
+        await manager.connect(websocket, client_id)
+        manager.join_room(client_id, "dashboard")
+        sockets.append(websocket)
+
+    # Start publishing only once every worker is subscribed
+    await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+
+    interval = 1 / args.rate if args.rate else 0
+    started = time.time()
+    for seq in range(args.messages):
+        await manager.broadcast_sensor_data({
+            "device_id": f"worker-{index}", "sensor_type": "temperature", "value": seq,
+            "seq": seq, "sent_at": time.time(), "timestamp": None
+        })
+        if seq < args.alerts:
+            await manager.broadcast_alert({"severity": "high", "seq": seq, "sent_at": time.time()})
+        if interval:
+            await asyncio.sleep(interval)
+
+    expected = args.workers * (args.messages + args.alerts)
+    deadline = time.time() + args.timeout
+    while time.time() < deadline and min(s.received for s in sockets) < expected:
+        await asyncio.sleep(0.05)
+    elapsed = time.time() - started
+
+    results.put({
+        "worker": index,
+        "received": [s.received for s in sockets],
+        "latencies": [latency for s in sockets for latency in s.latencies],
+        "elapsed": elapsed,
+        "published": manager.broker.published
+    })
+    await manager.detach_broker()
+
+
+def worker_main(index, args, redis_url, barrier, results):
+    asyncio.run(run_worker(index, args, redis_url, barrier, results))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def main(args) -> int:
+    server = LocalRedis()
+    await server.start()
+
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(args.workers)
+    results = context.Queue()
+    workers = [
+        context.Process(target=worker_main, args=(index, args, server.url, barrier, results))
+        for index in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    loop = asyncio.get_running_loop()
+    reports = [await loop.run_in_executor(None, results.get) for _ in workers]
+    for worker in workers:
+        await loop.run_in_executor(None, worker.join)
+    await server.close()
+
+    expected = args.workers * (args.messages + args.alerts)
+    received = [count for report in reports for count in report["received"]]
+    latencies = [latency for report in reports for latency in report["latencies"]]
+    elapsed = max(report["elapsed"] for report in reports)
+    deliveries = sum(received)
+    ok = all(count == expected for count in received)
+
+    print(f"workers:              {args.workers}")
+    print(f"clients per worker:   {args.clients}")
+    print(f"messages per worker:  {args.messages} sensor + {args.alerts} alert")
+    print(f"published frames:     {server.published}")
+    print(f"expected per client:  {expected}")
+    print(f"received per client:  min={min(received)} max={max(received)}")
+    print(f"deliveries:           {deliveries} in {elapsed:.2f}s ({deliveries / elapsed:,.0f}/s)")
+    print(
+        f"latency ms:           p50={percentile(latencies, 0.5) * 1000:.2f} "
+        f"p95={percentile(latencies, 0.95) * 1000:.2f} "
+        f"p99={percentile(latencies, 0.99) * 1000:.2f} "
+        f"mean={statistics.mean(latencies) * 1000:.2f}"
+    )
+    print("result:               " + ("OK" if ok else "FAILED (missing or duplicate deliveries)"))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=250, help="fake clients per worker")
+    parser.add_argument("--messages", type=int, default=200, help="sensor broadcasts per worker")
+    parser.add_argument("--alerts", type=int, default=10, help="alert broadcasts per worker")
+    parser.add_argument("--rate", type=float, default=200, help="broadcasts per second per worker, 0 = unthrottled")
+    parser.add_argument("--timeout", type=float, default=30)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,211 @@
+"""initial schema
+
+Tables of the gateway models (users, farms, growing cycles, sensors,
+production logs, alerts). Databases created by the former MySQL init script
+already have them, with the same foreign keys; those are adopted and their
+secondary indexes brought in line with the models.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 01:04:00
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Secondary indexes of the models; those an adopted database lacks are created
+INDEXES = [
+    ('idx_role', 'users', ['role']),
+    ('idx_owner', 'farms', ['owner_id']),
+    ('idx_farm_status', 'farms', ['status']),
+    ('idx_farm_start', 'growing_cycles', ['farm_id', 'start_date']),
+    ('idx_cycle_status', 'growing_cycles', ['status']),
+    ('idx_variety', 'growing_cycles', ['mushroom_variety']),
+    ('idx_sensor_farm', 'sensors', ['farm_id']),
+    ('idx_sensor_type', 'sensors', ['sensor_type']),
+    ('idx_log_cycle', 'production_logs', ['growing_cycle_id']),
+    ('idx_log_type', 'production_logs', ['log_type']),
+    ('idx_created', 'alerts', ['created_at', 'id']),
+    ('idx_farm_created', 'alerts', ['farm_id', 'created_at', 'id']),
+    ('idx_alert_sensor', 'alerts', ['sensor_id']),
+    ('idx_severity', 'alerts', ['severity']),
+    ('idx_resolved', 'alerts', ['is_resolved']),
+]
+
+# Indexes the models declare on columns, which the init script did not have
+COLUMN_INDEXES = [
+    ('ix_users_email', 'users', ['email'], True),
+    ('ix_users_id', 'users', ['id'], False),
+    ('ix_users_username', 'users', ['username'], True),
+    ('ix_farms_id', 'farms', ['id'], False),
+    ('ix_growing_cycles_id', 'growing_cycles', ['id'], False),
+    ('ix_sensors_id', 'sensors', ['id'], False),
+    ('ix_alerts_id', 'alerts', ['id'], False),
+    ('ix_production_logs_id', 'production_logs', ['id'], False),
+]
+
+# Init script indexes that the models name per table (index names must be
+# unique across the schema on some backends) or that duplicate another index,
+# including the unique keys MySQL named after the username and email columns.
+# Dropped after INDEXES are created, so foreign keys keep an index throughout.
+RETIRED_INDEXES = [
+    ('username', 'users'),
+    ('email', 'users'),
+    ('idx_username', 'users'),
+    ('idx_email', 'users'),
+    ('idx_status', 'farms'),
+    ('idx_farm', 'growing_cycles'),
+    ('idx_status', 'growing_cycles'),
+    ('idx_farm', 'sensors'),
+    ('idx_device', 'sensors'),
+    ('idx_type', 'sensors'),
+    ('idx_cycle', 'production_logs'),
+    ('idx_type', 'production_logs'),
+    ('idx_farm', 'alerts'),
+    ('idx_sensor', 'alerts'),
+]
+
+
+def _index_names(inspector, table):
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def _adopt(inspector):
+    for name, table, columns, unique in COLUMN_INDEXES:
+        if name not in _index_names(inspector, table):
+            op.create_index(name, table, columns, unique=unique)
+    for name, table, columns in INDEXES:
+        if name not in _index_names(inspector, table):
+            op.create_index(name, table, columns, unique=False)
+    for name, table in RETIRED_INDEXES:
+        if name in _index_names(inspector, table):
+            op.drop_index(name, table_name=table)
+
+
+def upgrade():
+    if not context.is_offline_mode():
+        inspector = sa.inspect(op.get_bind())
+        if inspector.has_table('users'):
+            _adopt(inspector)
+            return
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=50), nullable=False),
+    sa.Column('email', sa.String(length=100), nullable=False),
+    sa.Column('hashed_password', sa.String(length=255), nullable=False),
+    sa.Column('full_name', sa.String(length=100), nullable=False),
+    sa.Column('role', sa.Enum('ADMIN', 'MANAGER', 'OPERATOR', 'VIEWER', name='userrole'), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=True)
+    op.create_table('farms',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('location', sa.String(length=200), nullable=True),
+    sa.Column('status', sa.Enum('ACTIVE', 'INACTIVE', 'MAINTENANCE', name='farmstatus'), nullable=True),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('total_area', sa.Float(), nullable=True),
+    sa.Column('growing_rooms', sa.Integer(), nullable=True),
+    sa.Column('max_capacity', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_farms_id'), 'farms', ['id'], unique=False)
+    op.create_table('growing_cycles',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('farm_id', sa.Integer(), nullable=False),
+    sa.Column('mushroom_variety', sa.String(length=100), nullable=False),
+    sa.Column('start_date', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('expected_harvest_date', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('actual_harvest_date', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('status', sa.String(length=50), nullable=True),
+    sa.Column('substrate_weight', sa.Float(), nullable=True),
+    sa.Column('expected_yield', sa.Float(), nullable=True),
+    sa.Column('actual_yield', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['farm_id'], ['farms.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_growing_cycles_id'), 'growing_cycles', ['id'], unique=False)
+    op.create_table('sensors',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('farm_id', sa.Integer(), nullable=False),
+    sa.Column('sensor_type', sa.String(length=50), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('location', sa.String(length=200), nullable=True),
+    sa.Column('device_id', sa.String(length=100), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('min_threshold', sa.Float(), nullable=True),
+    sa.Column('max_threshold', sa.Float(), nullable=True),
+    sa.Column('alert_enabled', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['farm_id'], ['farms.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('device_id')
+    )
+    op.create_index(op.f('ix_sensors_id'), 'sensors', ['id'], unique=False)
+    op.create_table('alerts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('farm_id', sa.Integer(), nullable=False),
+    sa.Column('sensor_id', sa.Integer(), nullable=True),
+    sa.Column('alert_type', sa.String(length=50), nullable=False),
+    sa.Column('severity', sa.String(length=20), nullable=True),
+    sa.Column('title', sa.String(length=200), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('is_resolved', sa.Boolean(), nullable=True),
+    sa.Column('resolved_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('resolved_by', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['farm_id'], ['farms.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['sensor_id'], ['sensors.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_alerts_id'), 'alerts', ['id'], unique=False)
+    op.create_table('production_logs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('growing_cycle_id', sa.Integer(), nullable=False),
+    sa.Column('log_type', sa.String(length=50), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('quantity', sa.Float(), nullable=True),
+    sa.Column('unit', sa.String(length=20), nullable=True),
+    sa.Column('performed_by', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['growing_cycle_id'], ['growing_cycles.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_production_logs_id'), 'production_logs', ['id'], unique=False)
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_production_logs_id'), table_name='production_logs')
+    op.drop_table('production_logs')
+    op.drop_index(op.f('ix_alerts_id'), table_name='alerts')
+    op.drop_table('alerts')
+    op.drop_index(op.f('ix_sensors_id'), table_name='sensors')
+    op.drop_table('sensors')
+    op.drop_index(op.f('ix_growing_cycles_id'), table_name='growing_cycles')
+    op.drop_table('growing_cycles')
+    op.drop_index(op.f('ix_farms_id'), table_name='farms')
+    op.drop_table('farms')
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
@@ -0,0 +1,70 @@
+"""seed default admin and demo farm
+
+The rows the former MySQL init script inserted: an admin account
+(password admin123, change it after the first login) and a demo farm it
+owns. Skipped where they already exist.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 01:20:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+ADMIN_PASSWORD_HASH = '$2b$12$nmOqSaVklrX7WidGBMJTL.YeemIEutLhQPONg2UVQCnaVZ0bQbkV6'
+
+users = sa.table(
+    'users',
+    sa.column('id', sa.Integer),
+    sa.column('username', sa.String),
+    sa.column('email', sa.String),
+    sa.column('hashed_password', sa.String),
+    sa.column('full_name', sa.String),
+    sa.column('role', sa.String),
+    sa.column('is_active', sa.Boolean),
+)
+farms = sa.table(
+    'farms',
+    sa.column('name', sa.String),
+    sa.column('description', sa.Text),
+    sa.column('location', sa.String),
+    sa.column('status', sa.String),
+    sa.column('owner_id', sa.Integer),
+    sa.column('total_area', sa.Float),
+    sa.column('growing_rooms', sa.Integer),
+    sa.column('max_capacity', sa.Float),
+)
+
+
+def upgrade():
+    # INSERT ... SELECT guarded by NOT EXISTS, so this also works as offline SQL (alembic upgrade --sql)
+    # Enum columns store member names (app.models.UserRole / FarmStatus)
+    admin = sa.select(
+        sa.literal('admin'), sa.literal('admin@shroomlab.com'), sa.literal(ADMIN_PASSWORD_HASH),
+        sa.literal('System Administrator'), sa.literal('ADMIN'), sa.literal(True)
+    ).where(~sa.exists().where(users.c.username == 'admin'))
+    op.execute(users.insert().from_select(
+        ['username', 'email', 'hashed_password', 'full_name', 'role', 'is_active'], admin
+    ))
+
+    demo_farm = sa.select(
+        sa.literal('Demo Farm'), sa.literal('Demonstration mushroom farm for testing'),
+        sa.literal('Lab Environment'), sa.literal('ACTIVE'), users.c.id, sa.literal(100.0), sa.literal(3),
+        sa.literal(500.0)
+    ).where(users.c.username == 'admin', ~sa.exists().where(farms.c.name == 'Demo Farm'))
+    op.execute(farms.insert().from_select(
+        ['name', 'description', 'location', 'status', 'owner_id', 'total_area', 'growing_rooms', 'max_capacity'],
+        demo_farm
+    ))
+
+
+def downgrade():
+    # The admin account stays: it may own data created since
+    admin_id = sa.select(users.c.id).where(users.c.username == 'admin').scalar_subquery()
+    op.execute(farms.delete().where(farms.c.name == 'Demo Farm', farms.c.owner_id == admin_id))
@@ -0,0 +1,27 @@
+"""sensor calibration
+
+Linear calibration applied by the IoT service on ingest:
+value * calibration_scale + calibration_offset.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 02:10:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('sensors', sa.Column('calibration_offset', sa.Float(), server_default='0', nullable=False))
+    op.add_column('sensors', sa.Column('calibration_scale', sa.Float(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('sensors', 'calibration_scale')
+    op.drop_column('sensors', 'calibration_offset')
@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+from shroomlab_instrumentation import instrument
 
 app = FastAPI(
     title="ShroomLab Business Service",
@@ -16,6 +17,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request metrics, served from /metrics
+instrument(app)
+
 @app.get("/")
 async def root():
     return {
@@ -0,0 +1,132 @@
+"""Request, connection pool and WebSocket metrics shared by the ShroomLab services"""
+import time
+from typing import Callable, Dict
+
+from fastapi import FastAPI, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of the response",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled"
+)
+HTTP_RESPONSE_BYTES = Histogram(
+    "http_response_size_bytes",
+    "Size of response bodies",
+    ["method", "route"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the database pool",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "websocket_connections",
+    "Open WebSocket connections on this process"
+)
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, in-flight requests and response size per route
+
+    Routes are labelled by their template (/api/v1/farms/{farm_id}), not the
+    raw path, to keep label cardinality bounded. Written as plain ASGI so
+    streaming responses pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_and_measure(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUEST_SECONDS.labels(method, template, str(status)).observe(time.perf_counter() - started)
+            HTTP_RESPONSE_BYTES.labels(method, template).observe(size)
+
+def instrumented_pool(pool_class, name: str):
+    """A subclass of a SQLAlchemy pool class that times connection checkouts"""
+
+    class InstrumentedPool(pool_class):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                DB_POOL_CHECKOUT_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+    InstrumentedPool.__name__ = f"Instrumented{pool_class.__name__}"
+    return InstrumentedPool
+
+class _PoolCollector:
+    """Reads pool occupancy at scrape time, so nothing has to be updated on checkout"""
+
+    def __init__(self):
+        self.engines: Dict[str, object] = {}
+
+    def collect(self):
+        family = GaugeMetricFamily(
+            "db_pool_connections", "Database pool connections by state", labels=["pool", "state"]
+        )
+        for name, engine in self.engines.items():
+            # Read the pool on every scrape: dispose() replaces it
+            pool = getattr(engine, "sync_engine", engine).pool
+            if not hasattr(pool, "checkedout"):
+                continue
+            family.add_metric([name, "size"], pool.size())
+            family.add_metric([name, "checked_out"], pool.checkedout())
+            family.add_metric([name, "idle"], pool.checkedin())
+            family.add_metric([name, "overflow"], max(pool.overflow(), 0))
+        yield family
+
+_pools = _PoolCollector()
+REGISTRY.register(_pools)
+
+def track_pool(name: str, engine):
+    """Export the size and occupancy of an engine's (sync or async) connection pool"""
+    _pools.engines[name] = engine
+
+def track_websockets(count: Callable[[], int]):
+    WEBSOCKET_CONNECTIONS.set_function(count)
+
+def metrics_response() -> Response:
+    """Render the process metrics in the Prometheus text format"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+async def _metrics_endpoint(request: Request) -> Response:
+    return metrics_response()
+
+def instrument(app: FastAPI):
+    """Record request metrics for the app and serve them from /metrics"""
+    app.add_middleware(MetricsMiddleware)
+    # An API route sets scope["route"], so scrapes are labelled /metrics rather than unmatched
+    app.add_api_route("/metrics", _metrics_endpoint, include_in_schema=False)
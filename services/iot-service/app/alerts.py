@@ -0,0 +1,184 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+import redis.asyncio as redis
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.ingestion import SensorPoint
+from app.models import Alert, Sensor
+from app.registry import (
+    ACTIVE, ALERT_ENABLED, FARM_VERSION_PREFIX, OVERVIEW_CACHE_KEY, DeviceRegistry, DeviceTable, device_registry
+)
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+ALERT_CHANNEL = os.getenv("ALERT_CHANNEL", "shroomlab:alerts")
+# A breach further than this fraction of the allowed band is reported as critical
+ALERT_CRITICAL_RATIO = float(os.getenv("ALERT_CRITICAL_RATIO", "0.25"))
+
+
+class Breach(NamedTuple):
+    sensor_id: int
+    farm_id: int
+    value: float
+    threshold: float
+    direction: str  # "below" or "above"
+    severity: str
+    timestamp_ns: int
+
+
+def evaluate(table: DeviceTable, batch: List[SensorPoint]) -> List[Breach]:
+    """Check a micro-batch against the registry in one vectorized pass and return new breaches"""
+    if not batch or not len(table):
+        return []
+    count = len(batch)
+    slots = table.resolve(batch)
+    values = np.fromiter((point.value for point in batch), dtype=np.float64, count=count)
+
+    positions = np.flatnonzero(slots >= 0)
+    if positions.size == 0:
+        return []
+    slots = slots[positions]
+    values = values[positions]
+    low = table.min[slots]
+    high = table.max[slots]
+    below = values < low
+    above = values > high
+    enabled = (table.flags[slots] & (ACTIVE | ALERT_ENABLED)) == (ACTIVE | ALERT_ENABLED)
+    breached = enabled & (below | above)
+
+    # First breaching reading per slot, for slots that were in range before this batch
+    breach_positions = np.flatnonzero(breached)
+    breach_slots, first = np.unique(slots[breach_positions], return_index=True)
+    first = breach_positions[first]
+    fresh = ~table.in_breach[breach_slots]
+    new_positions = first[fresh]
+
+    # The state after the batch follows the last reading of every slot
+    reversed_slots, last = np.unique(slots[::-1], return_index=True)
+    table.in_breach[reversed_slots] = breached[slots.size - 1 - last]
+
+    if new_positions.size == 0:
+        return []
+    new_slots = slots[new_positions]
+    new_values = values[new_positions]
+    is_below = below[new_positions]
+    thresholds = np.where(is_below, low[new_positions], high[new_positions])
+    band = np.abs(table.max[new_slots] - table.min[new_slots])
+    band = np.where(np.isnan(band), np.abs(thresholds), band)
+    excess = np.abs(new_values - thresholds) / np.maximum(band, 1e-9)
+    critical = excess >= ALERT_CRITICAL_RATIO
+
+    return [
+        Breach(
+            sensor_id=int(table.sensor_id[slot]),
+            farm_id=int(table.farm_id[slot]),
+            value=float(value),
+            threshold=float(threshold),
+            direction="below" if low_side else "above",
+            severity="critical" if is_critical else "high",
+            timestamp_ns=batch[int(positions[position])].timestamp_ns
+        )
+        for slot, value, threshold, low_side, is_critical, position in zip(
+            new_slots, new_values, thresholds, is_below, critical, new_positions
+        )
+    ]
+
+
+class AlertEvaluator:
+    """Ingestion stage that turns threshold breaches into Alert rows and live events"""
+
+    def __init__(self, registry: DeviceRegistry, redis_url: str = REDIS_URL):
+        self.registry = registry
+        self.redis_url = redis_url
+        self._redis: Optional[redis.Redis] = None
+        self.alerts_raised = 0
+
+    async def start(self):
+        self._redis = redis.from_url(self.redis_url, decode_responses=True)
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def process(self, batch: List[SensorPoint]):
+        """Batch processor: evaluate thresholds and raise alerts for new breaches"""
+        breaches = evaluate(self.registry.table, batch)
+        if not breaches:
+            return
+        alerts = await asyncio.to_thread(self._store_alerts, breaches)
+        self.alerts_raised += len(alerts)
+        await self._publish(alerts)
+
+    @staticmethod
+    def _store_alerts(breaches: List[Breach]) -> List[dict]:
+        db = SessionLocal()
+        try:
+            # Names are not kept in the registry; fetch them for the few sensors that breached
+            names = dict(db.execute(
+                select(Sensor.id, Sensor.name).where(Sensor.id.in_({breach.sensor_id for breach in breaches}))
+            ).all())
+            rows = []
+            for breach in breaches:
+                name = names.get(breach.sensor_id, f"Sensor {breach.sensor_id}")
+                rows.append(Alert(
+                    farm_id=breach.farm_id,
+                    sensor_id=breach.sensor_id,
+                    alert_type="threshold",
+                    severity=breach.severity,
+                    title=f"{name} {breach.direction} threshold",
+                    description=(
+                        f"{name} reported {breach.value:g}, "
+                        f"{breach.direction} the configured threshold of {breach.threshold:g}"
+                    )
+                ))
+            db.add_all(rows)
+            db.flush()
+            events = [
+                {
+                    "id": alert.id,
+                    "farm_id": alert.farm_id,
+                    "sensor_id": alert.sensor_id,
+                    "alert_type": alert.alert_type,
+                    "severity": alert.severity,
+                    "title": alert.title,
+                    "description": alert.description,
+                    "value": breach.value,
+                    "threshold": breach.threshold,
+                    "timestamp": datetime.fromtimestamp(breach.timestamp_ns / 1e9, tz=timezone.utc).isoformat()
+                }
+                for alert, breach in zip(rows, breaches)
+            ]
+            db.commit()
+            return events
+        finally:
+            db.close()
+
+    async def _publish(self, alerts: List[dict]):
+        # The api-gateway relays this channel to WebSocketManager.broadcast_alert;
+        # its caches are invalidated the way DeviceRegistry.publish does
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for alert in alerts:
+                    pipe.publish(ALERT_CHANNEL, json.dumps(alert))
+                for farm_id in {alert["farm_id"] for alert in alerts}:
+                    key = f"{FARM_VERSION_PREFIX}{farm_id}"
+                    pipe.set(key, time.time_ns(), nx=True)
+                    pipe.incr(key)
+                pipe.delete(OVERVIEW_CACHE_KEY)
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not publish {len(alerts)} alerts: {e}")
+
+
+# Shared evaluator instance for the service
+alert_evaluator = AlertEvaluator(device_registry)
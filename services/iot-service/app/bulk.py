@@ -0,0 +1,94 @@
+import json
+import math
+from typing import AsyncIterator, Union
+
+import msgpack
+
+from app.ingestion import PayloadError
+
+# Upper bound for a single NDJSON line / msgpack record held in memory
+MAX_RECORD_BYTES = 64 * 1024
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+class StreamFormatError(ValueError):
+    """Raised when a bulk body is malformed beyond the current record"""
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Union[dict, PayloadError]]:
+    """Yield one decoded object per line as the body arrives"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        if b"\n" not in chunk:
+            if len(buffer) > MAX_RECORD_BYTES:
+                raise StreamFormatError(f"NDJSON line exceeds {MAX_RECORD_BYTES} bytes")
+            continue
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            record = _decode_json_line(line)
+            if record is not None:
+                yield record
+    record = _decode_json_line(buffer)
+    if record is not None:
+        yield record
+
+
+def _decode_json_line(line: bytes):
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        # A bad line only rejects that record; the stream stays in sync on newlines
+        return PayloadError(f"Invalid JSON: {e}")
+
+
+def _array_header_length(first_byte: int) -> int:
+    if 0x90 <= first_byte <= 0x9f:
+        return 1
+    if first_byte == 0xdc:
+        return 3
+    if first_byte == 0xdd:
+        return 5
+    return 0
+
+
+async def iter_msgpack(chunks: AsyncIterator[bytes]) -> AsyncIterator[dict]:
+    """Yield records from a msgpack array (or a stream of concatenated maps)
+
+    The top-level array header is stripped by hand so the unpacker can emit
+    each element as soon as it is complete instead of the whole array at once.
+    """
+    unpacker = msgpack.Unpacker(raw=False, max_buffer_size=MAX_RECORD_BYTES * 16)
+    pending = b""
+    header_done = False
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                # Starlette yields b"" for an empty body and at the end of the stream
+                continue
+            if not header_done:
+                pending += chunk
+                header_length = _array_header_length(pending[0])
+                if len(pending) < header_length:
+                    continue
+                chunk = pending[header_length:]
+                header_done = True
+            unpacker.feed(chunk)
+            for record in unpacker:
+                yield record
+    except (msgpack.UnpackException, ValueError) as e:
+        raise StreamFormatError(f"Invalid msgpack body: {e}")
+    if not header_done:
+        raise StreamFormatError("msgpack body ended before the array header" if pending else "Empty msgpack body")
+
+
+def retry_after_seconds(queue_depth: int, batch_size: int, flush_interval: float) -> int:
+    """Estimate how long the write queue needs to drain, clamped to 1-30s"""
+    flushes = queue_depth / max(batch_size, 1)
+    return max(1, min(30, math.ceil(flushes * flush_interval)))
@@ -0,0 +1,485 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Tuple
+
+import httpx
+import paho.mqtt.client as mqtt
+
+logger = logging.getLogger(__name__)
+
+# InfluxDB configuration
+INFLUXDB_URL = os.getenv("INFLUXDB_URL", "http://localhost:8086")
+INFLUXDB_TOKEN = os.getenv("INFLUXDB_TOKEN", "shroomlab-token")
+INFLUXDB_ORG = os.getenv("INFLUXDB_ORG", "shroomlab")
+INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET", "sensors")
+INFLUX_MEASUREMENT = "sensor_readings"
+# Range of timestamps InfluxDB accepts, in nanoseconds (1677-09-21 to 2262-04-11)
+INFLUX_MIN_TIMESTAMP_NS = -9223372036854775806
+INFLUX_MAX_TIMESTAMP_NS = 9223372036854775806
+
+# MQTT configuration
+MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost:1883")
+MQTT_SENSOR_TOPIC = os.getenv("MQTT_SENSOR_TOPIC", "sensors/#")
+MQTT_ENABLED = os.getenv("INGEST_MQTT_ENABLED", "true").lower() == "true"
+
+# Batching configuration
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "5000"))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "1.0"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "100000"))
+INGEST_WRITE_RETRIES = int(os.getenv("INGEST_WRITE_RETRIES", "3"))
+
+
+class PayloadError(ValueError):
+    """Raised when a sensor payload cannot be decoded"""
+
+
+class SensorPoint(NamedTuple):
+    farm_id: str
+    device_id: str
+    sensor_type: str
+    value: float
+    unit: str
+    timestamp_ns: int
+
+
+# A batch processor is called with every flushed batch (snapshot cache, alerts, ...)
+BatchProcessor = Callable[[List[SensorPoint]], Awaitable[None]]
+# A batch transform rewrites a flushed batch before it is written (calibration)
+BatchTransform = Callable[[List[SensorPoint]], List[SensorPoint]]
+
+
+def parse_topic(topic: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    """Split a sensor data topic into (farm_id, device_id, sensor_type)"""
+    parts = topic.split("/")
+    if parts[0] != "sensors" or parts[-1] != "data":
+        return None
+    if len(parts) == 5:
+        return parts[1], parts[2], parts[3]
+    if len(parts) == 4:
+        # Devices that publish all readings on sensors/{farm_id}/{device_id}/data
+        return parts[1], parts[2], None
+    return None
+
+
+def _timestamp_in_range(timestamp_ns) -> int:
+    # Also rejects inf and NaN, which fail every comparison
+    if not INFLUX_MIN_TIMESTAMP_NS <= timestamp_ns <= INFLUX_MAX_TIMESTAMP_NS:
+        raise PayloadError("Timestamp out of range")
+    return int(timestamp_ns)
+
+
+def parse_timestamp(raw) -> int:
+    """Convert an ISO-8601 string or epoch number into nanoseconds"""
+    if raw is None:
+        return time.time_ns()
+    if isinstance(raw, bool):
+        raise PayloadError("Invalid timestamp")
+    if isinstance(raw, (int, float)):
+        # Devices send seconds, milliseconds or nanoseconds since the epoch
+        if raw < 1e11:
+            return _timestamp_in_range(raw * 1_000_000_000)
+        if raw < 1e14:
+            return _timestamp_in_range(raw * 1_000_000)
+        return _timestamp_in_range(raw)
+    if isinstance(raw, str):
+        try:
+            parsed = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+        except ValueError:
+            raise PayloadError(f"Invalid timestamp: {raw}")
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return _timestamp_in_range(int(parsed.timestamp()) * 1_000_000_000 + parsed.microsecond * 1000)
+    raise PayloadError("Invalid timestamp")
+
+
+def _parse_value(sensor_type: str, reading) -> Tuple[float, str]:
+    if isinstance(reading, dict):
+        value = reading.get("value")
+        unit = reading.get("unit") or ""
+    else:
+        value = reading
+        unit = ""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise PayloadError(f"Reading '{sensor_type}' has no numeric value")
+    try:
+        value = float(value)
+    except OverflowError:
+        # Integers too large for a float
+        raise PayloadError(f"Reading '{sensor_type}' is out of range")
+    if not math.isfinite(value):
+        raise PayloadError(f"Reading '{sensor_type}' is not finite")
+    return value, str(unit)
+
+
+def decode_sensor_payload(
+    payload: dict,
+    farm_id: Optional[str] = None,
+    device_id: Optional[str] = None,
+    sensor_type: Optional[str] = None
+) -> List[SensorPoint]:
+    """Decode a sensor data payload (see docs/IoT-Architecture.md) into points"""
+    if not isinstance(payload, dict):
+        raise PayloadError("Payload must be a JSON object")
+
+    device_id = payload.get("device_id") or device_id
+    farm_id = payload.get("farm_id", farm_id)
+    if not device_id:
+        raise PayloadError("Missing device_id")
+    if farm_id is None or farm_id == "":
+        raise PayloadError("Missing farm_id")
+
+    readings = payload.get("readings")
+    if readings is None and "value" in payload and sensor_type:
+        # Single-reading payloads on sensors/{farm_id}/{device_id}/{sensor_type}/data
+        readings = {sensor_type: {"value": payload["value"], "unit": payload.get("unit")}}
+    if not isinstance(readings, dict) or not readings:
+        raise PayloadError("Payload has no readings")
+
+    timestamp_ns = parse_timestamp(payload.get("timestamp"))
+    points = []
+    for reading_type, reading in readings.items():
+        value, unit = _parse_value(reading_type, reading)
+        points.append(SensorPoint(
+            farm_id=str(farm_id),
+            device_id=str(device_id),
+            sensor_type=str(reading_type),
+            value=value,
+            unit=unit,
+            timestamp_ns=timestamp_ns
+        ))
+    return points
+
+
+def _escape_tag(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+
+def to_line_protocol(point: SensorPoint) -> str:
+    """Render a point as one InfluxDB line protocol row"""
+    tags = (
+        f"farm_id={_escape_tag(point.farm_id)},"
+        f"device_id={_escape_tag(point.device_id)},"
+        f"sensor_type={_escape_tag(point.sensor_type)}"
+    )
+    if point.unit:
+        tags += f",unit={_escape_tag(point.unit)}"
+    return f"{INFLUX_MEASUREMENT},{tags} value={point.value!r} {point.timestamp_ns}"
+
+
+class InfluxWriter:
+    """Writes line protocol to the InfluxDB v2 HTTP API over a keep-alive client"""
+
+    def __init__(self, url: str = INFLUXDB_URL, token: str = INFLUXDB_TOKEN,
+                 org: str = INFLUXDB_ORG, bucket: str = INFLUXDB_BUCKET, timeout: float = 10.0):
+        self.url = url
+        self.token = token
+        self.org = org
+        self.bucket = bucket
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        self._client = httpx.AsyncClient(
+            base_url=self.url,
+            headers={
+                "Authorization": f"Token {self.token}",
+                "Content-Type": "text/plain; charset=utf-8"
+            },
+            timeout=self.timeout
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Authenticated client for other InfluxDB API calls (queries, buckets)"""
+        return self._client
+
+    async def write(self, lines: List[str], bucket: Optional[str] = None):
+        response = await self._client.post(
+            "/api/v2/write",
+            params={"org": self.org, "bucket": bucket or self.bucket, "precision": "ns"},
+            content="\n".join(lines).encode()
+        )
+        response.raise_for_status()
+
+
+class IngestionStats:
+    def __init__(self):
+        self.received = 0
+        self.written = 0
+        self.dropped = 0
+        self.invalid = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.last_batch_size = 0
+        self.last_batch_latency = 0.0
+        self.max_batch_latency = 0.0
+        self.total_batch_latency = 0.0
+
+    def record_batch(self, size: int, latency: float, written: bool):
+        self.last_batch_size = size
+        self.last_batch_latency = latency
+        self.max_batch_latency = max(self.max_batch_latency, latency)
+        self.total_batch_latency += latency
+        if written:
+            self.batches += 1
+            self.written += size
+        else:
+            self.failed_batches += 1
+            self.dropped += size
+
+    def snapshot(self) -> dict:
+        flushes = self.batches + self.failed_batches
+        return {
+            "received": self.received,
+            "written": self.written,
+            "dropped": self.dropped,
+            "invalid": self.invalid,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "last_batch_size": self.last_batch_size,
+            "last_batch_latency_ms": round(self.last_batch_latency * 1000, 3),
+            "avg_batch_latency_ms": round(self.total_batch_latency / flushes * 1000, 3) if flushes else 0.0,
+            "max_batch_latency_ms": round(self.max_batch_latency * 1000, 3)
+        }
+
+
+class MQTTConsumer:
+    """Bridges paho-mqtt's network thread into the ingestion engine"""
+
+    def __init__(self, engine: "IngestionEngine", broker: str = MQTT_BROKER, topic: str = MQTT_SENSOR_TOPIC):
+        self.engine = engine
+        self.topic = topic
+        host, _, port = broker.partition(":")
+        self.host = host
+        self.port = int(port or 1883)
+        self._client: Optional[mqtt.Client] = None
+
+    def start(self):
+        self._client = mqtt.Client(client_id=f"iot-service-{os.getpid()}", clean_session=True)
+        self._client.on_connect = self._on_connect
+        self._client.on_message = self._on_message
+        self._client.reconnect_delay_set(min_delay=1, max_delay=30)
+        self._client.connect_async(self.host, self.port, keepalive=60)
+        self._client.loop_start()
+        logger.info(f"MQTT consumer connecting to {self.host}:{self.port}")
+
+    def stop(self):
+        if self._client is not None:
+            self._client.disconnect()
+            self._client.loop_stop()
+            self._client = None
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            client.subscribe(self.topic, qos=0)
+            logger.info(f"MQTT consumer subscribed to {self.topic}")
+        else:
+            logger.error(f"MQTT connection refused: rc={rc}")
+
+    def _on_message(self, client, userdata, msg):
+        # Runs on the paho network thread; decode here and hand points to the loop
+        try:
+            self.engine.submit_message(msg.topic, msg.payload)
+        except Exception:
+            # paho re-raises callback errors, which would stop its network thread
+            logger.exception(f"Failed to handle MQTT message on {msg.topic}")
+            self.engine.report_invalid()
+
+
+class IngestionEngine:
+    """Collects sensor points into size/time bounded batches and writes them to InfluxDB"""
+
+    def __init__(self, writer: Optional[InfluxWriter] = None, batch_size: int = INGEST_BATCH_SIZE,
+                 flush_interval: float = INGEST_FLUSH_INTERVAL, queue_size: int = INGEST_QUEUE_SIZE):
+        self.writer = writer or InfluxWriter()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.stats = IngestionStats()
+        self._processors: List[BatchProcessor] = []
+        self._transforms: List[BatchTransform] = []
+        self._queue: Optional[asyncio.Queue] = None
+        # Points taken off the queue for the batch being collected
+        self._pending: List[SensorPoint] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Future] = None
+        self._mqtt: Optional[MQTTConsumer] = None
+
+    def add_processor(self, processor: BatchProcessor):
+        self._processors.append(processor)
+
+    def add_transform(self, transform: BatchTransform):
+        self._transforms.append(transform)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def has_capacity(self, count: int) -> bool:
+        return self._queue is not None and self.queue_size - self._queue.qsize() >= count
+
+    def offer(self, points: List[SensorPoint]) -> bool:
+        """Enqueue points atomically; returns False if the queue has no room for all of them"""
+        if not self.has_capacity(len(points)):
+            return False
+        for point in points:
+            self._queue.put_nowait(point)
+        self.stats.received += len(points)
+        return True
+
+    def submit_message(self, topic: str, payload: bytes):
+        """Thread-safe entry point for raw MQTT messages"""
+        route = parse_topic(topic)
+        if route is None:
+            return
+        farm_id, device_id, sensor_type = route
+        try:
+            points = decode_sensor_payload(json.loads(payload), farm_id, device_id, sensor_type)
+        except (ValueError, UnicodeDecodeError) as e:
+            self.report_invalid()
+            logger.debug(f"Rejected MQTT message on {topic}: {e}")
+            return
+        self._loop.call_soon_threadsafe(self._offer_or_drop, points)
+
+    def report_invalid(self):
+        """Thread-safe count of a message that could not be ingested"""
+        self._loop.call_soon_threadsafe(self._record_invalid)
+
+    def _record_invalid(self):
+        self.stats.invalid += 1
+
+    def _offer_or_drop(self, points: List[SensorPoint]):
+        if not self.offer(points):
+            self.stats.dropped += len(points)
+
+    async def start(self, mqtt_enabled: bool = MQTT_ENABLED):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        await self.writer.start()
+        self._task = asyncio.create_task(self._run(), name="ingestion-batcher")
+        if mqtt_enabled:
+            self._mqtt = MQTTConsumer(self)
+            self._mqtt.start()
+        logger.info(
+            f"Ingestion engine started (batch_size={self.batch_size}, "
+            f"flush_interval={self.flush_interval}s, queue_size={self.queue_size})"
+        )
+
+    async def stop(self):
+        if self._mqtt is not None:
+            self._mqtt.stop()
+            self._mqtt = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight is not None:
+            await self._inflight
+
+        # Flush whatever is still buffered so a restart does not lose readings,
+        # starting with the batch the cancelled collector had already dequeued
+        remaining, self._pending = self._pending, []
+        while self._queue is not None and not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+        await self.writer.close()
+        logger.info("Ingestion engine stopped")
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            # Shield the write so shutdown waits for it instead of losing the batch
+            self._inflight = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._inflight)
+            self._inflight = None
+
+    async def _collect_batch(self) -> List[SensorPoint]:
+        # Collected on self, not a local, so stop() can flush it if cancelled mid-batch
+        batch = self._pending
+        batch.append(await self._queue.get())
+        deadline = self._loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        self._pending = []
+        return batch
+
+    async def _flush(self, batch: List[SensorPoint]):
+        for transform in self._transforms:
+            try:
+                batch = transform(batch)
+            except Exception:
+                # Write the readings as received rather than lose them
+                logger.exception(f"Batch transform {transform!r} failed")
+        started = time.perf_counter()
+        written = await self._write(batch)
+        self.stats.record_batch(len(batch), time.perf_counter() - started, written)
+        if not written:
+            # Keep the snapshot, alerts and rollups consistent with what InfluxDB stored
+            return
+
+        for processor in self._processors:
+            try:
+                await processor(batch)
+            except Exception:
+                logger.exception(f"Batch processor {processor!r} failed")
+
+    async def _write(self, batch: List[SensorPoint]) -> bool:
+        lines = [to_line_protocol(point) for point in batch]
+        for attempt in range(INGEST_WRITE_RETRIES):
+            try:
+                await self.writer.write(lines)
+                return True
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                if 400 <= status < 500 and status != 429:
+                    # The batch itself was rejected (e.g. a malformed point); retrying cannot help
+                    logger.error(f"InfluxDB rejected batch of {len(lines)} points ({status}): {e.response.text[:500]}")
+                    return False
+                logger.warning(f"InfluxDB write of {len(lines)} points failed (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(min(2 ** attempt * 0.5, 5.0))
+            except httpx.HTTPError as e:
+                logger.warning(f"InfluxDB write of {len(lines)} points failed (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(min(2 ** attempt * 0.5, 5.0))
+        logger.error(f"Dropping batch of {len(lines)} points after {INGEST_WRITE_RETRIES} attempts")
+        return False
+
+    def status(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "mqtt_connected": bool(self._mqtt and self._mqtt._client and self._mqtt._client.is_connected()),
+            "queue_depth": self.queue_depth,
+            "queue_size": self.queue_size,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            **self.stats.snapshot()
+        }
+
+
+# Shared engine instance for the service
+ingestion_engine = IngestionEngine()
@@ -1,13 +1,40 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
 from dotenv import load_dotenv
+from shroomlab_instrumentation import instrument, track_pool
+
+# Load environment variables before the app modules read their configuration
+load_dotenv()
 
 from app.routers import sensors, devices
+from app.ingestion import ingestion_engine
+from app.snapshot import snapshot_cache
+from app.alerts import alert_evaluator
+from app.registry import device_registry
+from app.rollups import rollup_aggregator
+from app.database import engine
 
-# Load environment variables
-load_dotenv()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start the MQTT -> InfluxDB ingestion pipeline for the lifetime of the app
+    await device_registry.start()
+    await snapshot_cache.start()
+    await alert_evaluator.start()
+    await rollup_aggregator.start()
+    ingestion_engine.add_transform(device_registry.calibrate)
+    ingestion_engine.add_processor(snapshot_cache.update)
+    ingestion_engine.add_processor(alert_evaluator.process)
+    ingestion_engine.add_processor(rollup_aggregator.update)
+    await ingestion_engine.start()
+    yield
+    await ingestion_engine.stop()
+    await rollup_aggregator.close()
+    await alert_evaluator.close()
+    await snapshot_cache.close()
+    await device_registry.close()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -15,7 +42,8 @@ app = FastAPI(
     description="IoT and Sensor Management Service for Mushroom Farm",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -27,6 +55,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request and DB pool metrics, served from /metrics
+instrument(app)
+track_pool("sync", engine)
+
 # Include routers
 app.include_router(sensors.router, prefix="/api/v1/sensors", tags=["Sensors"])
 app.include_router(devices.router, prefix="/api/v1/devices", tags=["Devices"])
@@ -0,0 +1,52 @@
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float
+from sqlalchemy.sql import func
+from app.database import Base
+
+# These mirror the api-gateway models for the tables the IoT service reads and
+# writes. The schema itself is owned by the api-gateway, so foreign keys are
+# left to the database.
+
+class Farm(Base):
+    __tablename__ = "farms"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, nullable=False)
+
+class Sensor(Base):
+    __tablename__ = "sensors"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    farm_id = Column(Integer, nullable=False)
+    sensor_type = Column(String(50), nullable=False)  # temperature, humidity, co2, ph, etc.
+    name = Column(String(100), nullable=False)
+    location = Column(String(200))  # room location within farm
+    device_id = Column(String(100), unique=True, nullable=False)  # IoT device identifier
+    is_active = Column(Boolean, default=True)
+    
+    # Sensor configuration
+    min_threshold = Column(Float)
+    max_threshold = Column(Float)
+    alert_enabled = Column(Boolean, default=True)
+    # Linear calibration applied on ingest: value * scale + offset
+    calibration_offset = Column(Float, nullable=False, default=0.0, server_default="0")
+    calibration_scale = Column(Float, nullable=False, default=1.0, server_default="1")
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+class Alert(Base):
+    __tablename__ = "alerts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    farm_id = Column(Integer, nullable=False)
+    sensor_id = Column(Integer)
+    alert_type = Column(String(50), nullable=False)  # threshold, device_offline, system, etc.
+    severity = Column(String(20), default="medium")  # low, medium, high, critical
+    title = Column(String(200), nullable=False)
+    description = Column(Text)
+    is_resolved = Column(Boolean, default=False)
+    resolved_at = Column(DateTime(timezone=True))
+    resolved_by = Column(String(100))
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -0,0 +1,371 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import redis.asyncio as redis
+from sqlalchemy import func, select
+
+from app.database import SessionLocal
+from app.ingestion import SensorPoint
+from app.models import Sensor
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+DEVICE_CHANNEL = os.getenv("DEVICE_CHANNEL", "shroomlab:devices")
+# Full reloads reconcile the registry with notifications that were missed
+REGISTRY_REFRESH_INTERVAL = float(os.getenv("REGISTRY_REFRESH_INTERVAL", "30"))  # seconds
+
+# Keys of the api-gateway caches that sensor writes make stale
+FARM_VERSION_PREFIX = "version:farm:"
+OVERVIEW_CACHE_KEY = "cache:overview"
+
+# Columns the ingest path needs; names and locations stay in the database
+SENSOR_FIELDS = (
+    "id", "farm_id", "device_id", "sensor_type", "is_active", "min_threshold",
+    "max_threshold", "alert_enabled", "calibration_offset", "calibration_scale"
+)
+
+# Slot flags
+IN_USE = 1
+ACTIVE = 2
+ALERT_ENABLED = 4
+
+# Value of unused slots for arrays that do not start out as zeros
+_FILL = {"min": np.nan, "max": np.nan, "scale": 1.0}
+
+
+class DeviceTable:
+    """Devices stored in per-slot arrays with a device_id -> slot index
+
+    device_id is unique across sensors, so it alone picks the slot and the
+    sensor type of a reading only has to match. Slots of removed devices are
+    reused; unset thresholds are NaN, which never compares as a breach.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.index: Dict[str, int] = {}
+        self.types: List[str] = []
+        self.type_codes: Dict[str, int] = {}
+        self.calibrated = 0  # slots whose calibration is not the identity
+        self._free: List[int] = []
+        self._used = 0  # high-water mark of allocated slots
+        capacity = max(capacity, 1)
+        self.sensor_id = np.zeros(capacity, dtype=np.int32)
+        self.farm_id = np.zeros(capacity, dtype=np.int32)
+        self.type_code = np.zeros(capacity, dtype=np.uint16)
+        self.flags = np.zeros(capacity, dtype=np.uint8)
+        self.min = np.full(capacity, np.nan, dtype=np.float64)
+        self.max = np.full(capacity, np.nan, dtype=np.float64)
+        self.offset = np.zeros(capacity, dtype=np.float64)
+        self.scale = np.ones(capacity, dtype=np.float64)
+        # Whether the last reading of each slot was out of range; alerts fire on the transition
+        self.in_breach = np.zeros(capacity, dtype=bool)
+
+    @classmethod
+    def from_records(cls, records: List[dict]) -> "DeviceTable":
+        table = cls(capacity=len(records))
+        for record in records:
+            table.upsert(record)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def capacity(self) -> int:
+        return self.sensor_id.size
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            name: getattr(self, name)
+            for name in ("sensor_id", "farm_id", "type_code", "flags", "min", "max", "offset", "scale", "in_breach")
+        }
+
+    def _grow(self):
+        size = self.capacity
+        for name, array in self._arrays().items():
+            grown = np.resize(array, size * 2)
+            grown[size:] = _FILL.get(name, 0)
+            setattr(self, name, grown)
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._used == self.capacity:
+            self._grow()
+        self._used += 1
+        return self._used - 1
+
+    def _type_code(self, sensor_type: str) -> int:
+        code = self.type_codes.get(sensor_type)
+        if code is None:
+            code = self.type_codes[sensor_type] = len(self.types)
+            self.types.append(sensor_type)
+        return code
+
+    def _is_calibrated(self, slot: int) -> bool:
+        return bool(self.flags[slot] & IN_USE and (self.scale[slot] != 1.0 or self.offset[slot] != 0.0))
+
+    def upsert(self, record: dict) -> int:
+        """Insert or update a device from a sensor record; returns its slot"""
+        slot = self.index.get(record["device_id"])
+        if slot is None:
+            slot = self.index[record["device_id"]] = self._allocate()
+            self.in_breach[slot] = False
+        else:
+            self.calibrated -= self._is_calibrated(slot)
+            if self.sensor_id[slot] != record["id"]:
+                # Same device re-registered as a new sensor
+                self.in_breach[slot] = False
+
+        self.sensor_id[slot] = record["id"]
+        self.farm_id[slot] = record["farm_id"]
+        self.type_code[slot] = self._type_code(record["sensor_type"])
+        self.flags[slot] = (
+            IN_USE
+            | (ACTIVE if record["is_active"] else 0)
+            | (ALERT_ENABLED if record["alert_enabled"] else 0)
+        )
+        min_threshold, max_threshold = record["min_threshold"], record["max_threshold"]
+        self.min[slot] = np.nan if min_threshold is None else min_threshold
+        self.max[slot] = np.nan if max_threshold is None else max_threshold
+        offset, scale = record.get("calibration_offset"), record.get("calibration_scale")
+        self.offset[slot] = 0.0 if offset is None else offset
+        self.scale[slot] = 1.0 if scale is None else scale
+        self.calibrated += self._is_calibrated(slot)
+        return slot
+
+    def remove(self, device_id: str) -> bool:
+        slot = self.index.pop(device_id, None)
+        if slot is None:
+            return False
+        self.calibrated -= self._is_calibrated(slot)
+        self.flags[slot] = 0
+        self.in_breach[slot] = False
+        self._free.append(slot)
+        return True
+
+    def carry_breach_state(self, previous: "DeviceTable"):
+        """Keep breach state across reloads so a reload does not re-alert"""
+        old_slots = np.fromiter(previous.index.values(), dtype=np.int64, count=len(previous))
+        old_slots = old_slots[previous.in_breach[old_slots]]
+        breached = set(previous.sensor_id[old_slots].tolist())
+        if not breached:
+            return
+        slots = np.fromiter(self.index.values(), dtype=np.int64, count=len(self))
+        self.in_breach[slots] = np.isin(self.sensor_id[slots], list(breached))
+
+    def lookup(self, device_id: str, sensor_type: str) -> int:
+        """Slot of a device reading this sensor type, or -1"""
+        slot = self.index.get(device_id, -1)
+        if slot >= 0 and self.types[self.type_code[slot]] != sensor_type:
+            return -1
+        return slot
+
+    def resolve(self, batch: List[SensorPoint]) -> np.ndarray:
+        """Slots of a batch of readings, -1 where the device or sensor type is unknown"""
+        count = len(batch)
+        index = self.index
+        type_codes = self.type_codes
+        slots = np.fromiter((index.get(point.device_id, -1) for point in batch), dtype=np.int64, count=count)
+        codes = np.fromiter((type_codes.get(point.sensor_type, -1) for point in batch), dtype=np.int64, count=count)
+        known = slots >= 0
+        slots[known & (self.type_code[np.where(known, slots, 0)] != codes)] = -1
+        return slots
+
+    def calibrate(self, batch: List[SensorPoint]) -> List[SensorPoint]:
+        """Apply each device's linear calibration; returns the batch unchanged if none applies
+
+        Readings that calibrate to inf or NaN are dropped.
+        """
+        if not self.calibrated or not batch:
+            return batch
+        slots = self.resolve(batch)
+        positions = np.flatnonzero(slots >= 0)
+        slots = slots[positions]
+        adjusted = (self.scale[slots] != 1.0) | (self.offset[slots] != 0.0)
+        if not adjusted.any():
+            return batch
+        positions = positions[adjusted]
+        slots = slots[adjusted]
+        calibrated = list(batch)
+        overflowed = []
+        for position, scale, offset in zip(positions.tolist(), self.scale[slots].tolist(), self.offset[slots].tolist()):
+            point = calibrated[position]
+            value = point.value * scale + offset
+            if math.isfinite(value):
+                calibrated[position] = point._replace(value=value)
+            else:
+                overflowed.append(position)
+        if overflowed:
+            # InfluxDB rejects the whole write if one value is not finite
+            dropped = {calibrated[position].device_id for position in overflowed}
+            logger.warning(f"Dropped {len(overflowed)} readings that calibrate to non-finite values "
+                           f"(devices: {', '.join(sorted(dropped))})")
+            for position in reversed(overflowed):
+                del calibrated[position]
+        return calibrated
+
+    def memory_usage(self) -> dict:
+        array_bytes = sum(array.nbytes for array in self._arrays().values())
+        index_bytes = sys.getsizeof(self.index) + sum(sys.getsizeof(device_id) for device_id in self.index)
+        return {"array_bytes": array_bytes, "index_bytes": index_bytes}
+
+
+def sensor_record(sensor: Sensor) -> dict:
+    return {field: getattr(sensor, field) for field in SENSOR_FIELDS}
+
+
+def load_sensor_records() -> List[dict]:
+    db = SessionLocal()
+    try:
+        columns = [getattr(Sensor, field) for field in SENSOR_FIELDS]
+        return [dict(zip(SENSOR_FIELDS, row)) for row in db.execute(select(*columns).order_by(Sensor.id))]
+    finally:
+        db.close()
+
+
+def sensor_config_version() -> tuple:
+    """Cheap fingerprint of the sensors table used to detect missed changes"""
+    db = SessionLocal()
+    try:
+        return tuple(db.execute(
+            select(func.count(Sensor.id), func.max(Sensor.created_at), func.max(Sensor.updated_at))
+        ).one())
+    finally:
+        db.close()
+
+
+class DeviceRegistry:
+    """In-memory device index for the ingest path
+
+    Bulk-loaded at startup and kept current by change notifications that the
+    device endpoints publish on every write; every worker applies them to its
+    own table. A periodic fingerprint check reloads the table if a
+    notification was missed.
+    """
+
+    def __init__(self, redis_url: str = REDIS_URL, refresh_interval: float = REGISTRY_REFRESH_INTERVAL):
+        self.redis_url = redis_url
+        self.refresh_interval = refresh_interval
+        self.table = DeviceTable()
+        self.changes_applied = 0
+        self._version: Optional[tuple] = None
+        self._redis: Optional[redis.Redis] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        self._redis = redis.from_url(self.redis_url, decode_responses=True)
+        try:
+            await self.refresh(force=True)
+        except Exception as e:
+            logger.error(f"Could not load device registry: {e}")
+        self._tasks = [
+            asyncio.create_task(self._listen(), name="device-registry-listener"),
+            asyncio.create_task(self._refresh_loop(), name="device-registry-refresh"),
+        ]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def refresh(self, force: bool = False):
+        """Reload all devices if the sensors table changed since the last load"""
+        version = await asyncio.to_thread(sensor_config_version)
+        if not force and version == self._version:
+            return
+        started = time.perf_counter()
+        # Building the arrays takes about a second per 100k devices; keep it off the loop
+        table = await asyncio.to_thread(lambda: DeviceTable.from_records(load_sensor_records()))
+        table.carry_breach_state(self.table)
+        self.table = table
+        self._version = version
+        logger.info(f"Loaded {len(table)} devices into the registry in {time.perf_counter() - started:.2f}s")
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Device registry refresh failed: {e}")
+
+    async def _listen(self):
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(DEVICE_CHANNEL)
+                # Changes published while unsubscribed were missed
+                await self.refresh()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    try:
+                        self.apply(json.loads(message["data"]))
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning(f"Ignoring malformed device change: {message['data']!r}")
+            except redis.RedisError as e:
+                logger.warning(f"Device change listener lost Redis connection: {e}")
+                await asyncio.sleep(5)
+            except Exception as e:
+                logger.warning(f"Device change listener failed: {e}")
+                await asyncio.sleep(5)
+            finally:
+                await pubsub.aclose()
+
+    def apply(self, change: dict):
+        """Apply one change notification to this worker's table"""
+        if change["op"] == "upsert":
+            self.table.upsert(change["sensor"])
+        elif change["op"] == "delete":
+            self.table.remove(change["device_id"])
+        else:
+            raise ValueError(f"Unknown device change {change['op']!r}")
+        self.changes_applied += 1
+
+    async def publish(self, change: dict, farm_ids: Iterable[int]):
+        """Apply a committed change locally and notify the other workers and the api-gateway"""
+        self.apply(change)
+        farm_ids = set(farm_ids)
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.publish(DEVICE_CHANNEL, json.dumps(change))
+                for farm_id in farm_ids:
+                    key = f"{FARM_VERSION_PREFIX}{farm_id}"
+                    pipe.set(key, time.time_ns(), nx=True)
+                    pipe.incr(key)
+                pipe.delete(OVERVIEW_CACHE_KEY)
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not publish device change for farms {sorted(farm_ids)}: {e}")
+
+    def calibrate(self, batch: List[SensorPoint]) -> List[SensorPoint]:
+        """Batch transform for the ingestion engine"""
+        return self.table.calibrate(batch)
+
+    def status(self) -> dict:
+        table = self.table
+        return {
+            "devices": len(table),
+            "capacity": table.capacity,
+            "sensor_types": len(table.types),
+            "calibrated": table.calibrated,
+            "changes_applied": self.changes_applied,
+            **table.memory_usage()
+        }
+
+
+# Shared registry instance for the service
+device_registry = DeviceRegistry()
@@ -0,0 +1,405 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import math
+import os
+import re
+import socket
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+
+from app.ingestion import (
+    INFLUX_MEASUREMENT, INFLUXDB_BUCKET, INFLUXDB_ORG, InfluxWriter, SensorPoint, _escape_tag
+)
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_MEASUREMENT = "sensor_rollup"
+ROLLUP_FLUSH_INTERVAL = float(os.getenv("ROLLUP_FLUSH_INTERVAL", "10"))  # seconds
+# How long after a bucket closes before it is written, to absorb slightly late readings
+ROLLUP_GRACE = int(os.getenv("ROLLUP_GRACE", "30"))
+# How long closed buckets stay in memory so late readings can be merged into them
+ROLLUP_LATE_WINDOW = int(os.getenv("ROLLUP_LATE_WINDOW", "600"))
+ROLLUP_TARGET_POINTS = int(os.getenv("ROLLUP_TARGET_POINTS", "500"))
+# Identifies this process's partial aggregates; queries merge across writers. Unique per
+# process so a restarted container (same hostname and pid) does not overwrite its predecessor
+ROLLUP_WRITER_ID = os.getenv("ROLLUP_WRITER_ID", f"{socket.gethostname()}-{uuid.uuid4().hex[:12]}")
+
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800, "y": 31536000}
+
+
+def parse_duration(value: str) -> int:
+    """Parse retention strings like '7d', '12h' or '0' (keep forever) into seconds"""
+    match = re.fullmatch(r"\s*(\d+)\s*([smhdwy]?)\s*", value)
+    if match is None:
+        raise ValueError(f"Invalid duration: {value}")
+    return int(match.group(1)) * _DURATION_UNITS[match.group(2) or "s"]
+
+
+class Resolution(NamedTuple):
+    name: str
+    seconds: int  # 0 for raw readings
+    bucket: str
+    retention: int  # seconds, 0 = forever
+
+
+RAW = Resolution("raw", 0, INFLUXDB_BUCKET, parse_duration(os.getenv("RAW_RETENTION", "0")))
+RESOLUTIONS = [
+    Resolution("1m", 60, f"{INFLUXDB_BUCKET}_1m", parse_duration(os.getenv("ROLLUP_RETENTION_1M", "30d"))),
+    Resolution("15m", 900, f"{INFLUXDB_BUCKET}_15m", parse_duration(os.getenv("ROLLUP_RETENTION_15M", "180d"))),
+    Resolution("1h", 3600, f"{INFLUXDB_BUCKET}_1h", parse_duration(os.getenv("ROLLUP_RETENTION_1H", "5y"))),
+]
+
+
+def plan_resolution(start: float, end: float, target_points: int = ROLLUP_TARGET_POINTS,
+                    now: Optional[float] = None) -> Resolution:
+    """Pick the coarsest resolution that still gives roughly target_points per series
+
+    Resolutions whose retention no longer covers `start` are skipped.
+    """
+    now = time.time() if now is None else now
+    span = max(end - start, 1)
+    available = [
+        resolution for resolution in [RAW] + RESOLUTIONS
+        if not resolution.retention or now - start <= resolution.retention
+    ]
+    if not available:
+        return RESOLUTIONS[-1]
+    for resolution in reversed(available):
+        if resolution.seconds and span / resolution.seconds >= target_points / 2:
+            return resolution
+    return available[0]
+
+
+class Aggregate:
+    __slots__ = ("min", "max", "sum", "count")
+
+    def __init__(self, value: float = None):
+        if value is None:
+            self.min = math.inf
+            self.max = -math.inf
+            self.sum = 0.0
+            self.count = 0
+        else:
+            self.min = self.max = self.sum = value
+            self.count = 1
+
+    def add(self, value: float):
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Aggregate"):
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sum += other.sum
+        self.count += other.count
+
+
+SeriesKey = Tuple[str, str, str]  # (farm_id, device_id, sensor_type)
+BucketKey = Tuple[int, int]  # (resolution index, bucket start in seconds)
+
+
+class RollupBucket:
+    __slots__ = ("series", "dirty", "late", "changes")
+
+    def __init__(self, late: bool = False):
+        self.series: Dict[SeriesKey, Aggregate] = {}
+        self.dirty = True
+        # Bumped by every reading, so a flush can tell if the bucket changed while it was writing
+        self.changes = 0
+        # Reopened after eviction: what was already written must be read back and merged first
+        self.late = late
+
+
+class RollupAggregator:
+    """Continuously maintains 1m/15m/1h min/max/mean/count rollups of ingested readings
+
+    Every reading is folded into the open bucket of each resolution. Buckets are
+    written once they close (plus ROLLUP_GRACE) and stay in memory for
+    ROLLUP_LATE_WINDOW so late readings rewrite the merged aggregate. Readings
+    for buckets that were already evicted reopen the bucket; before it is
+    written again, this writer's stored aggregate is read back and merged in.
+    """
+
+    def __init__(self, writer: Optional[InfluxWriter] = None, flush_interval: float = ROLLUP_FLUSH_INTERVAL):
+        self.writer = writer or InfluxWriter()
+        self.flush_interval = flush_interval
+        self._buckets: Dict[BucketKey, RollupBucket] = {}
+        self._evicted_until = [0] * len(RESOLUTIONS)
+        self._task: Optional[asyncio.Task] = None
+        self.rows_written = 0
+
+    async def start(self):
+        await self.writer.start()
+        try:
+            await ensure_buckets(self.writer)
+        except httpx.HTTPError as e:
+            logger.error(f"Could not ensure rollup buckets: {e}")
+        self._task = asyncio.create_task(self._flush_loop(), name="rollup-flush")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Write open buckets too; the next process adds to them under its own writer tag
+        await self.flush(force=True)
+        await self.writer.close()
+
+    async def update(self, batch: List[SensorPoint]):
+        """Batch processor: fold every reading into the open rollup buckets"""
+        buckets = self._buckets
+        for point in batch:
+            timestamp = point.timestamp_ns // 1_000_000_000
+            series = (point.farm_id, point.device_id, point.sensor_type)
+            for index, resolution in enumerate(RESOLUTIONS):
+                start = timestamp - timestamp % resolution.seconds
+                key = (index, start)
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = RollupBucket(late=start < self._evicted_until[index])
+                bucket.dirty = True
+                bucket.changes += 1
+                aggregate = bucket.series.get(series)
+                if aggregate is None:
+                    bucket.series[series] = Aggregate(point.value)
+                else:
+                    aggregate.add(point.value)
+
+    async def flush(self, force: bool = False):
+        now = time.time()
+        pending: Dict[int, List[Tuple[int, RollupBucket]]] = {}
+        for (index, start), bucket in self._buckets.items():
+            end = start + RESOLUTIONS[index].seconds
+            if bucket.dirty and (force or end + ROLLUP_GRACE <= now):
+                pending.setdefault(index, []).append((start, bucket))
+
+        for index, due in pending.items():
+            bucket_name = RESOLUTIONS[index].bucket
+            late = [(start, bucket) for start, bucket in due if bucket.late]
+            try:
+                if late:
+                    await self._merge_stored(index, late)
+                written = [bucket.changes for _, bucket in due]
+                lines = [
+                    _rollup_line(series, aggregate, ROLLUP_WRITER_ID, start)
+                    for start, bucket in due for series, aggregate in bucket.series.items()
+                ]
+                await self.writer.write(lines, bucket=bucket_name)
+            except httpx.HTTPError as e:
+                # Buckets stay dirty and are retried on the next tick
+                logger.warning(f"Rollup write to {bucket_name} failed: {e}")
+                continue
+            self.rows_written += len(lines)
+            for (_, bucket), changes in zip(due, written):
+                # Readings added during the write are not in these lines; leave the bucket dirty for them
+                if bucket.changes == changes:
+                    bucket.dirty = False
+
+        # Evict clean buckets that are past the late window
+        expired = [
+            key for key, bucket in self._buckets.items()
+            if not bucket.dirty and key[1] + RESOLUTIONS[key[0]].seconds + ROLLUP_LATE_WINDOW <= now
+        ]
+        for key in expired:
+            index, start = key
+            del self._buckets[key]
+            self._evicted_until[index] = max(self._evicted_until[index], start + RESOLUTIONS[index].seconds)
+
+    async def _merge_stored(self, index: int, late: List[Tuple[int, RollupBucket]]):
+        """Fold this writer's stored aggregates into reopened buckets, so rewriting them keeps old data"""
+        buckets = dict(late)
+        flux = (
+            f'from(bucket: {json.dumps(RESOLUTIONS[index].bucket)})\n'
+            f'  |> range(start: {_iso(min(buckets))}, stop: {_iso(max(buckets) + 1)})\n'
+            f'  |> filter(fn: (r) => r._measurement == "{ROLLUP_MEASUREMENT}" '
+            f'and r.writer == {json.dumps(ROLLUP_WRITER_ID)})\n'
+            f'  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")\n'
+            f'  |> keep(columns: ["_time", "farm_id", "device_id", "sensor_type", "min", "max", "sum", "count"])\n'
+        )
+        response = await self.writer.client.post(
+            "/api/v2/query",
+            params={"org": INFLUXDB_ORG},
+            headers={"Accept": "application/csv", "Content-Type": "application/json"},
+            json={"query": flux, "type": "flux", "dialect": {"header": True, "annotations": []}}
+        )
+        response.raise_for_status()
+        for row in _parse_csv_tables(response.text):
+            start = int(datetime.fromisoformat(row["_time"].replace("Z", "+00:00")).timestamp())
+            bucket = buckets.get(start)
+            aggregate = bucket.series.get((row["farm_id"], row["device_id"], row["sensor_type"])) if bucket else None
+            # Series without new readings are left as stored
+            if aggregate is not None:
+                aggregate.merge(_stored_aggregate(row))
+        for bucket in buckets.values():
+            bucket.late = False
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Rollup flush failed")
+
+    def status(self) -> dict:
+        return {
+            "open_buckets": len(self._buckets),
+            "dirty_buckets": sum(1 for bucket in self._buckets.values() if bucket.dirty),
+            "rows_written": self.rows_written,
+            "resolutions": [
+                {"name": r.name, "bucket": r.bucket, "retention_seconds": r.retention} for r in [RAW] + RESOLUTIONS
+            ]
+        }
+
+
+def _rollup_line(series: SeriesKey, aggregate: Aggregate, writer_id: str, start: int) -> str:
+    farm_id, device_id, sensor_type = series
+    return (
+        f"{ROLLUP_MEASUREMENT},farm_id={_escape_tag(farm_id)},device_id={_escape_tag(device_id)},"
+        f"sensor_type={_escape_tag(sensor_type)},writer={_escape_tag(writer_id)} "
+        f"min={aggregate.min!r},max={aggregate.max!r},sum={aggregate.sum!r},count={aggregate.count}i "
+        f"{start * 1_000_000_000}"
+    )
+
+
+async def ensure_buckets(writer: InfluxWriter):
+    """Create the rollup buckets and keep their retention in line with configuration"""
+    client = writer.client
+    response = await client.get("/api/v2/orgs", params={"org": INFLUXDB_ORG})
+    response.raise_for_status()
+    org_id = response.json()["orgs"][0]["id"]
+
+    for resolution in RESOLUTIONS:
+        rules = [{"type": "expire", "everySeconds": resolution.retention}] if resolution.retention else []
+        response = await client.get("/api/v2/buckets", params={"name": resolution.bucket, "orgID": org_id})
+        response.raise_for_status()
+        existing = response.json().get("buckets", [])
+        if not existing:
+            response = await client.post(
+                "/api/v2/buckets",
+                json={"orgID": org_id, "name": resolution.bucket, "retentionRules": rules}
+            )
+            logger.info(f"Created rollup bucket {resolution.bucket}")
+        elif [rule.get("everySeconds") for rule in existing[0].get("retentionRules", [])] != \
+                [rule["everySeconds"] for rule in rules]:
+            response = await client.patch(
+                f"/api/v2/buckets/{existing[0]['id']}",
+                json={"retentionRules": rules}
+            )
+            logger.info(f"Updated retention of rollup bucket {resolution.bucket}")
+        response.raise_for_status()
+
+
+def _stored_aggregate(row: dict) -> Aggregate:
+    aggregate = Aggregate()
+    aggregate.min = float(row["min"])
+    aggregate.max = float(row["max"])
+    aggregate.sum = float(row["sum"])
+    aggregate.count = int(row["count"])
+    return aggregate
+
+
+def _iso(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse_csv_tables(text: str):
+    # Flux CSV without annotations: one header per table, tables separated by blank lines
+    header = None
+    for row in csv.reader(io.StringIO(text)):
+        if not row or not any(row):
+            header = None
+            continue
+        if header is None:
+            header = row
+            continue
+        yield dict(zip(header, row))
+
+
+async def query_farm_history(client: httpx.AsyncClient, farm_id: str, start: float, end: float,
+                             target_points: int = ROLLUP_TARGET_POINTS) -> dict:
+    """Sensor history for a farm at the resolution chosen by plan_resolution
+
+    Rows are merged across rollup writers and re-windowed so each series has
+    at most about target_points points.
+    """
+    resolution = plan_resolution(start, end, target_points)
+    window = max(math.ceil((end - start) / max(target_points, 1)), resolution.seconds or 1)
+    if resolution.seconds:
+        window = math.ceil(window / resolution.seconds) * resolution.seconds
+        measurement, fields = ROLLUP_MEASUREMENT, '"min", "max", "sum", "count"'
+        field_filter = ""
+    else:
+        measurement, fields = INFLUX_MEASUREMENT, '"value"'
+        field_filter = ' and r._field == "value"'
+
+    flux = (
+        f'from(bucket: {json.dumps(resolution.bucket)})\n'
+        f'  |> range(start: {_iso(start)}, stop: {_iso(end)})\n'
+        f'  |> filter(fn: (r) => r._measurement == "{measurement}" and r.farm_id == {json.dumps(farm_id)}{field_filter})\n'
+        f'  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")\n'
+        f'  |> keep(columns: ["_time", "device_id", "sensor_type", {fields}])\n'
+    )
+    response = await client.post(
+        "/api/v2/query",
+        params={"org": INFLUXDB_ORG},
+        headers={"Accept": "application/csv", "Content-Type": "application/json"},
+        json={"query": flux, "type": "flux", "dialect": {"header": True, "annotations": []}}
+    )
+    response.raise_for_status()
+
+    series: Dict[Tuple[str, str], Dict[int, Aggregate]] = {}
+    for row in _parse_csv_tables(response.text):
+        timestamp = datetime.fromisoformat(row["_time"].replace("Z", "+00:00")).timestamp()
+        window_start = int(timestamp // window * window)
+        windows = series.setdefault((row["device_id"], row["sensor_type"]), {})
+        aggregate = windows.get(window_start)
+        if aggregate is None:
+            aggregate = windows[window_start] = Aggregate()
+        if resolution.seconds:
+            aggregate.merge(_stored_aggregate(row))
+        else:
+            aggregate.add(float(row["value"]))
+
+    return {
+        "farm_id": farm_id,
+        "resolution": resolution.name,
+        "window_seconds": window,
+        "start": _iso(start),
+        "end": _iso(end),
+        "sensors": [
+            {
+                "device_id": device_id,
+                "sensor_type": sensor_type,
+                "points": [
+                    {
+                        "time": _iso(window_start),
+                        "min": aggregate.min,
+                        "max": aggregate.max,
+                        "mean": aggregate.sum / aggregate.count,
+                        "count": aggregate.count
+                    }
+                    for window_start, aggregate in sorted(windows.items())
+                ]
+            }
+            for (device_id, sensor_type), windows in sorted(series.items())
+        ]
+    }
+
+
+# Shared rollup aggregator for the service
+rollup_aggregator = RollupAggregator()
@@ -1,15 +1,223 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import Iterable, NamedTuple, Optional
+import asyncio
+import hmac
+import os
+
+from app.database import SessionLocal
+from app.models import Alert, Farm, Sensor
+from app.registry import SENSOR_FIELDS, device_registry, sensor_record
 
 router = APIRouter()
 
+# Set on the api-gateway as well; when set, only requests it proxied may use the device routes
+GATEWAY_SHARED_SECRET = os.getenv("GATEWAY_SHARED_SECRET", "")
+# Roles that manage devices on every farm; other users only on farms they own
+DEVICE_ADMIN_ROLES = {"admin", "manager"}
+
+class Caller(NamedTuple):
+    user_id: int
+    role: str
+
+def get_caller(
+    x_user_id: Optional[str] = Header(None),
+    x_user_role: Optional[str] = Header(None),
+    x_gateway_secret: Optional[str] = Header(None)
+) -> Caller:
+    """Identity of the user the api-gateway authenticated"""
+    if GATEWAY_SHARED_SECRET and not hmac.compare_digest(x_gateway_secret or "", GATEWAY_SHARED_SECRET):
+        raise HTTPException(status_code=401, detail="Requests must come through the api-gateway")
+    if not x_user_id or not x_user_role:
+        raise HTTPException(status_code=401, detail="Missing gateway identity headers")
+    try:
+        return Caller(user_id=int(x_user_id), role=x_user_role)
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Invalid gateway identity headers")
+
+def _authorize_farms(db: Session, caller: Caller, farm_ids: Iterable[int]):
+    """Raise 400/403 unless every farm exists and the caller may manage its devices"""
+    for farm_id in set(farm_ids):
+        owner_id = db.scalar(select(Farm.owner_id).where(Farm.id == farm_id))
+        if owner_id is None:
+            raise HTTPException(status_code=400, detail=f"Farm {farm_id} does not exist")
+        if caller.role not in DEVICE_ADMIN_ROLES and owner_id != caller.user_id:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+
+class DeviceRegistration(BaseModel):
+    device_id: str
+    farm_id: int
+    sensor_type: str
+    name: str
+    location: Optional[str] = None
+    is_active: bool = True
+    min_threshold: Optional[float] = None
+    max_threshold: Optional[float] = None
+    alert_enabled: bool = True
+    calibration_offset: float = 0.0
+    calibration_scale: float = 1.0
+
+class DeviceUpdate(BaseModel):
+    farm_id: Optional[int] = None
+    sensor_type: Optional[str] = None
+    name: Optional[str] = None
+    location: Optional[str] = None
+    is_active: Optional[bool] = None
+    min_threshold: Optional[float] = None
+    max_threshold: Optional[float] = None
+    alert_enabled: Optional[bool] = None
+    calibration_offset: Optional[float] = None
+    calibration_scale: Optional[float] = None
+
+def _device(sensor: Sensor) -> dict:
+    return {
+        **sensor_record(sensor),
+        "name": sensor.name,
+        "location": sensor.location,
+        "created_at": sensor.created_at,
+        "updated_at": sensor.updated_at
+    }
+
+def _upsert_change(device: dict) -> dict:
+    return {"op": "upsert", "sensor": {field: device[field] for field in SENSOR_FIELDS}}
+
+def _list_devices(caller: Caller, farm_id: Optional[int], skip: int, limit: int) -> list:
+    db = SessionLocal()
+    try:
+        query = select(Sensor).order_by(Sensor.id).offset(skip).limit(limit)
+        if farm_id is not None:
+            _authorize_farms(db, caller, [farm_id])
+            query = query.where(Sensor.farm_id == farm_id)
+        elif caller.role not in DEVICE_ADMIN_ROLES:
+            query = query.where(Sensor.farm_id.in_(select(Farm.id).where(Farm.owner_id == caller.user_id)))
+        return [_device(sensor) for sensor in db.scalars(query)]
+    finally:
+        db.close()
+
+def _get_device(device_id: str, caller: Caller) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        sensor = db.scalar(select(Sensor).where(Sensor.device_id == device_id))
+        if sensor is None:
+            return None
+        _authorize_farms(db, caller, [sensor.farm_id])
+        return _device(sensor)
+    finally:
+        db.close()
+
+def _register_device(registration: DeviceRegistration, caller: Caller) -> Optional[dict]:
+    """Insert the sensor row; returns None if the device_id is taken"""
+    db = SessionLocal()
+    try:
+        _authorize_farms(db, caller, [registration.farm_id])
+        if db.scalar(select(Sensor.id).where(Sensor.device_id == registration.device_id)) is not None:
+            return None
+        sensor = Sensor(**registration.model_dump())
+        db.add(sensor)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            # Lost a race for the same device_id
+            if db.scalar(select(Sensor.id).where(Sensor.device_id == registration.device_id)) is not None:
+                return None
+            raise
+        db.refresh(sensor)
+        return _device(sensor)
+    finally:
+        db.close()
+
+def _update_device(device_id: str, changes: dict, caller: Caller) -> Optional[tuple]:
+    """Apply changes; returns the device and the farm it belonged to before"""
+    db = SessionLocal()
+    try:
+        sensor = db.scalar(select(Sensor).where(Sensor.device_id == device_id))
+        if sensor is None:
+            return None
+        previous_farm_id = sensor.farm_id
+        # Moving a device needs rights on both the farm it leaves and the one it joins
+        _authorize_farms(db, caller, {previous_farm_id, changes.get("farm_id") or previous_farm_id})
+        for field, value in changes.items():
+            setattr(sensor, field, value)
+        try:
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=f"Invalid device update: {e.orig}")
+        db.refresh(sensor)
+        return _device(sensor), previous_farm_id
+    finally:
+        db.close()
+
+def _delete_device(device_id: str, caller: Caller) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        sensor = db.scalar(select(Sensor).where(Sensor.device_id == device_id))
+        if sensor is None:
+            return None
+        _authorize_farms(db, caller, [sensor.farm_id])
+        device = _device(sensor)
+        # Alerts outlive the sensor that raised them
+        db.execute(update(Alert).where(Alert.sensor_id == sensor.id).values(sensor_id=None))
+        db.delete(sensor)
+        db.commit()
+        return device
+    finally:
+        db.close()
+
 @router.get("/")
-async def list_devices():
-    return {"message": "Devices endpoint - coming in Phase 2"}
+async def list_devices(
+    farm_id: Optional[int] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    caller: Caller = Depends(get_caller)
+):
+    return await asyncio.to_thread(_list_devices, caller, farm_id, skip, limit)
 
 @router.get("/health")
 async def device_health():
     return {"status": "healthy", "service": "devices"}
 
-@router.post("/register")
-async def register_device():
-    return {"message": "Device registration endpoint - coming in Phase 2"} 
\ No newline at end of file
+@router.get("/registry")
+async def registry_status(caller: Caller = Depends(get_caller)):
+    """Size and memory footprint of this worker's device registry"""
+    # Covers the devices of every farm
+    if caller.role not in DEVICE_ADMIN_ROLES:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return device_registry.status()
+
+@router.post("/register", status_code=201)
+async def register_device(registration: DeviceRegistration, caller: Caller = Depends(get_caller)):
+    device = await asyncio.to_thread(_register_device, registration, caller)
+    if device is None:
+        raise HTTPException(status_code=409, detail=f"Device {registration.device_id} is already registered")
+    await device_registry.publish(_upsert_change(device), [device["farm_id"]])
+    return device
+
+@router.get("/{device_id}")
+async def get_device(device_id: str, caller: Caller = Depends(get_caller)):
+    device = await asyncio.to_thread(_get_device, device_id, caller)
+    if device is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return device
+
+@router.put("/{device_id}")
+async def update_device(device_id: str, changes: DeviceUpdate, caller: Caller = Depends(get_caller)):
+    result = await asyncio.to_thread(_update_device, device_id, changes.model_dump(exclude_unset=True), caller)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    device, previous_farm_id = result
+    await device_registry.publish(
+        _upsert_change(device), {previous_farm_id, device["farm_id"]}
+    )
+    return device
+
+@router.delete("/{device_id}", status_code=204)
+async def delete_device(device_id: str, caller: Caller = Depends(get_caller)):
+    device = await asyncio.to_thread(_delete_device, device_id, caller)
+    if device is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    await device_registry.publish({"op": "delete", "device_id": device_id}, [device["farm_id"]])
@@ -1,7 +1,26 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+import asyncio
+import httpx
+import json
+import os
+import time
+
+from app.bulk import (
+    MSGPACK_TYPES, NDJSON_TYPES, StreamFormatError,
+    iter_msgpack, iter_ndjson, retry_after_seconds
+)
+from app.ingestion import PayloadError, decode_sensor_payload, ingestion_engine
+from app.rollups import ROLLUP_TARGET_POINTS, query_farm_history, rollup_aggregator
+from app.snapshot import snapshot_cache
 
 router = APIRouter()
 
+# Bulk ingestion configuration
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))  # records per enqueue
+BULK_ENQUEUE_TIMEOUT = float(os.getenv("BULK_ENQUEUE_TIMEOUT", "0.5"))
+BULK_MAX_ERRORS = 20  # per-record errors echoed back to the client
+
 @router.get("/")
 async def list_sensors():
     return {"message": "Sensors endpoint - coming in Phase 2"}
@@ -10,6 +29,120 @@ async def list_sensors():
 async def sensor_health():
     return {"status": "healthy", "service": "sensors"}
 
-@router.post("/data")
-async def receive_sensor_data():
-    return {"message": "Sensor data ingestion endpoint - coming in Phase 2"} 
\ No newline at end of file
+async def _iter_json_body(request: Request):
+    # Plain JSON bodies are small (single payload or short array), so read them whole
+    try:
+        body = json.loads(await request.body())
+    except ValueError as e:
+        raise StreamFormatError(f"Invalid JSON body: {e}")
+    for record in body if isinstance(body, list) else [body]:
+        yield record
+
+async def _enqueue(points) -> bool:
+    """Wait briefly for queue room before giving up and applying backpressure"""
+    deadline = time.monotonic() + BULK_ENQUEUE_TIMEOUT
+    while not ingestion_engine.offer(points):
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+def _backpressure_response(result: dict) -> JSONResponse:
+    retry_after = retry_after_seconds(
+        ingestion_engine.queue_depth,
+        ingestion_engine.batch_size,
+        ingestion_engine.flush_interval
+    )
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(retry_after)},
+        content={"detail": "Ingestion queue is full", **result}
+    )
+
+@router.post("/data", status_code=202)
+async def receive_sensor_data(request: Request):
+    """Bulk ingest sensor payloads as NDJSON, a msgpack array or plain JSON
+
+    The body is parsed incrementally and enqueued in batches of BULK_BATCH_SIZE
+    records. When the write queue stays full the request stops with 429 and
+    `resume_from` tells the client which record index to resend from.
+    """
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip()
+    if content_type in NDJSON_TYPES:
+        records = iter_ndjson(request.stream())
+    elif content_type in MSGPACK_TYPES:
+        records = iter_msgpack(request.stream())
+    elif content_type == "application/json":
+        records = _iter_json_body(request)
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type: {content_type}")
+
+    result = {"accepted": 0, "rejected": 0, "points": 0, "resume_from": 0, "batches": [], "errors": []}
+    batch = {"batch": 0, "records": 0, "accepted": 0, "rejected": 0, "points": 0}
+    points = []
+
+    async def flush_batch() -> bool:
+        nonlocal batch, points
+        if points and not await _enqueue(points):
+            return False
+        result["batches"].append(batch)
+        result["accepted"] += batch["accepted"]
+        result["rejected"] += batch["rejected"]
+        result["points"] += batch["points"]
+        result["resume_from"] += batch["records"]
+        batch = {"batch": batch["batch"] + 1, "records": 0, "accepted": 0, "rejected": 0, "points": 0}
+        points = []
+        return True
+
+    index = 0
+    try:
+        async for record in records:
+            batch["records"] += 1
+            try:
+                if isinstance(record, PayloadError):
+                    raise record
+                record_points = decode_sensor_payload(record)
+            except PayloadError as e:
+                batch["rejected"] += 1
+                if len(result["errors"]) < BULK_MAX_ERRORS:
+                    result["errors"].append({"record": index, "error": str(e)})
+            else:
+                batch["accepted"] += 1
+                batch["points"] += len(record_points)
+                points.extend(record_points)
+            index += 1
+
+            if batch["records"] >= BULK_BATCH_SIZE and not await flush_batch():
+                return _backpressure_response(result)
+    except StreamFormatError as e:
+        # Keep what was already queued and report where parsing stopped
+        if not await flush_batch():
+            return _backpressure_response(result)
+        return JSONResponse(status_code=400, content={"detail": str(e), **result})
+
+    if batch["records"] and not await flush_batch():
+        return _backpressure_response(result)
+    return result
+
+@router.get("/snapshot/farm/{farm_id}")
+async def get_farm_snapshot(farm_id: str):
+    """Latest reading of every sensor on a farm, served from the snapshot cache"""
+    return await snapshot_cache.get_farm_snapshot(farm_id)
+
+@router.get("/data/farm/{farm_id}")
+async def get_farm_sensor_history(
+    farm_id: str,
+    hours: float = Query(24, gt=0, le=24 * 365 * 5),
+    points: int = Query(ROLLUP_TARGET_POINTS, ge=10, le=5000)
+):
+    """Sensor history for a farm, read from the coarsest rollup that fits the range"""
+    end = time.time()
+    try:
+        return await query_farm_history(rollup_aggregator.writer.client, farm_id, end - hours * 3600, end, points)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Time-series query failed: {e}")
+
+@router.get("/ingestion/stats")
+async def ingestion_stats():
+    """Queue depth, batch latency and drop counters for the ingestion engine"""
+    return {**ingestion_engine.status(), "rollups": rollup_aggregator.status()}
@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+from app.ingestion import SensorPoint
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+SNAPSHOT_LOCAL_TTL = float(os.getenv("SNAPSHOT_LOCAL_TTL", "1.0"))  # seconds
+SNAPSHOT_KEY_TTL = int(os.getenv("SNAPSHOT_KEY_TTL", str(7 * 24 * 3600)))  # seconds
+SNAPSHOT_KEY_PREFIX = "snapshot:farm:"
+
+# Only overwrite a field when the incoming reading is at least as new as the stored one,
+# so late backfills from gateways that were offline never replace fresher values.
+# Stored values are "<timestamp_ms>|<json>".
+_UPSERT_LATEST = """
+-- Timestamp prefix of an encoded reading; nil for anything unparsable,
+-- which counts as older than any reading
+local function stamp(value)
+  return tonumber(string.match(value, '^(-?%d+)|'))
+end
+local updated = 0
+for i = 2, #ARGV, 2 do
+  local current = redis.call('HGET', KEYS[1], ARGV[i])
+  local incoming = stamp(ARGV[i + 1])
+  local stored = current and stamp(current)
+  if incoming and (not stored or stored <= incoming) then
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    updated = updated + 1
+  end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return updated
+"""
+
+SensorKey = Tuple[str, str]  # (device_id, sensor_type)
+
+
+def _encode(reading: dict) -> str:
+    return f"{reading['t']}|{json.dumps(reading, separators=(',', ':'))}"
+
+
+def _decode(raw: str) -> dict:
+    return json.loads(raw.partition("|")[2])
+
+
+def _iso(timestamp_ms: int) -> str:
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).isoformat()
+
+
+class LatestValueCache:
+    """Latest reading per farm -> device -> sensor_type
+
+    Redis holds the shared copy for all workers; each worker keeps an
+    in-process layer that is written through on ingest and refreshed from
+    Redis at most every SNAPSHOT_LOCAL_TTL seconds per farm.
+    """
+
+    def __init__(self, redis_url: str = REDIS_URL, local_ttl: float = SNAPSHOT_LOCAL_TTL):
+        self.redis_url = redis_url
+        self.local_ttl = local_ttl
+        self._redis: Optional[redis.Redis] = None
+        self._upsert = None
+        self._farms: Dict[str, Dict[SensorKey, dict]] = {}
+        self._fetched_at: Dict[str, float] = {}
+
+    async def start(self):
+        self._redis = redis.from_url(self.redis_url, decode_responses=True)
+        self._upsert = self._redis.register_script(_UPSERT_LATEST)
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def _merge(self, farm_id: str, key: SensorKey, reading: dict) -> bool:
+        readings = self._farms.setdefault(farm_id, {})
+        current = readings.get(key)
+        if current is not None and current["t"] > reading["t"]:
+            return False
+        readings[key] = reading
+        return True
+
+    async def update(self, batch: List[SensorPoint]):
+        """Batch processor: record the newest reading of every sensor in the batch"""
+        ingested_ms = int(time.time() * 1000)
+        changed: Dict[str, Dict[str, str]] = {}
+        for point in batch:
+            reading = {
+                "v": point.value,
+                "u": point.unit,
+                "t": point.timestamp_ns // 1_000_000,
+                "i": ingested_ms
+            }
+            if self._merge(point.farm_id, (point.device_id, point.sensor_type), reading):
+                field = f"{point.device_id}:{point.sensor_type}"
+                changed.setdefault(point.farm_id, {})[field] = _encode(reading)
+
+        if not changed or self._redis is None:
+            return
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for farm_id, fields in changed.items():
+                    args = [SNAPSHOT_KEY_TTL]
+                    for field, value in fields.items():
+                        args.extend((field, value))
+                    await self._upsert(keys=[SNAPSHOT_KEY_PREFIX + farm_id], args=args, client=pipe)
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Snapshot cache write to Redis failed: {e}")
+
+    async def _refresh(self, farm_id: str):
+        try:
+            fields = await self._redis.hgetall(SNAPSHOT_KEY_PREFIX + farm_id)
+        except redis.RedisError as e:
+            # Serve this worker's own view until Redis is reachable again
+            logger.warning(f"Snapshot cache read from Redis failed: {e}")
+            return
+        for field, raw in fields.items():
+            device_id, _, sensor_type = field.rpartition(":")
+            self._merge(farm_id, (device_id, sensor_type), _decode(raw))
+        self._fetched_at[farm_id] = time.monotonic()
+
+    async def get_farm_snapshot(self, farm_id: str) -> dict:
+        """Latest reading of every sensor on a farm, O(sensors) and without InfluxDB"""
+        fetched_at = self._fetched_at.get(farm_id)
+        if self._redis is not None and (fetched_at is None or time.monotonic() - fetched_at >= self.local_ttl):
+            await self._refresh(farm_id)
+
+        devices: Dict[str, dict] = {}
+        for (device_id, sensor_type), reading in self._farms.get(farm_id, {}).items():
+            devices.setdefault(device_id, {})[sensor_type] = {
+                "value": reading["v"],
+                "unit": reading["u"],
+                "timestamp": _iso(reading["t"]),
+                "ingested_at": _iso(reading["i"])
+            }
+        return {
+            "farm_id": farm_id,
+            "sensor_count": sum(len(sensors) for sensors in devices.values()),
+            "devices": devices
+        }
+
+
+# Shared cache instance for the service
+snapshot_cache = LatestValueCache()
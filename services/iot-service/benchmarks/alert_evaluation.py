@@ -0,0 +1,74 @@
+"""Throughput benchmark for the vectorized threshold evaluation stage
+
+Builds a device registry table for N synthetic sensors and measures how
+many readings per second the alert evaluation can check, and how much
+memory the table takes. No database or Redis is needed.
+
+    python -m benchmarks.alert_evaluation --sensors 10000 --batch-size 5000
+"""
+import argparse
+import random
+import time
+
+from app.alerts import evaluate
+from app.ingestion import SensorPoint
+from app.registry import DeviceTable
+
+
+def build_table(sensor_count: int) -> DeviceTable:
+    records = [
+        {
+            "id": slot + 1, "farm_id": slot // 100 + 1, "device_id": f"esp32_{slot:06d}",
+            "sensor_type": "temperature", "is_active": True, "min_threshold": 15.0, "max_threshold": 25.0,
+            "alert_enabled": True, "calibration_offset": 0.0, "calibration_scale": 1.0
+        }
+        for slot in range(sensor_count)
+    ]
+    return DeviceTable.from_records(records)
+
+
+def build_batch(sensor_count: int, batch_size: int, breach_rate: float) -> list:
+    now = time.time_ns()
+    batch = []
+    for _ in range(batch_size):
+        slot = random.randrange(sensor_count)
+        value = random.uniform(26.0, 30.0) if random.random() < breach_rate else random.uniform(16.0, 24.0)
+        batch.append(SensorPoint("1", f"esp32_{slot:06d}", "temperature", value, "C", now))
+    return batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sensors", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--batches", type=int, default=200)
+    parser.add_argument("--breach-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    table = build_table(args.sensors)
+    load_time = time.perf_counter() - started
+    batches = [build_batch(args.sensors, args.batch_size, args.breach_rate) for _ in range(20)]
+
+    breaches = 0
+    started = time.perf_counter()
+    for i in range(args.batches):
+        breaches += len(evaluate(table, batches[i % len(batches)]))
+    elapsed = time.perf_counter() - started
+
+    readings = args.batches * args.batch_size
+    memory = table.memory_usage()
+    print(f"sensors:          {args.sensors}")
+    print(f"table load:       {load_time * 1000:.1f}ms")
+    print(f"table memory:     {(memory['array_bytes'] + memory['index_bytes']) / 2**20:.1f} MiB "
+          f"({memory['array_bytes'] / 2**20:.1f} MiB arrays)")
+    print(f"batch size:       {args.batch_size}")
+    print(f"readings:         {readings}")
+    print(f"new breaches:     {breaches}")
+    print(f"elapsed:          {elapsed:.3f}s")
+    print(f"per batch:        {elapsed / args.batches * 1000:.3f}ms")
+    print(f"readings/second:  {readings / elapsed:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
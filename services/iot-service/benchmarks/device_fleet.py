@@ -0,0 +1,425 @@
+"""MQTT device fleet simulator for ingestion load testing
+
+Simulates ESP32 and Raspberry Pi devices publishing the sensor data,
+status and heartbeat payloads from docs/IoT-Architecture.md to an MQTT
+broker (the local mosquitto from config/mosquitto by default). Devices
+are asyncio tasks spread over a few processes, each holding one MQTT
+connection, so a single machine can simulate tens of thousands.
+
+Publish intervals carry jitter. Periodic bursts make a share of the fleet
+flush a backlog of readings at once, and reconnect storms drop a share
+of the connections and bring them back together. While the fleet runs,
+the latest-reading snapshot of the IoT service is sampled and ingestion
+lag is measured as ingested_at minus the timestamp embedded by the
+device. Both clocks are read on this machine, so run the service here or
+keep the clocks synchronised.
+
+    python -m benchmarks.device_fleet --devices 50000 --processes 8 --rate 0.2 --duration 300
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import resource
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.mqtt_publisher import MqttPublisher
+
+DEVICE_PREFIX = "sim"
+FIRMWARE_VERSION = "1.2.3"
+
+# (sensor_type, unit, typical value, spread) per device kind
+SENSOR_SETS = {
+    "esp32": [("temperature", "°C", 22.0, 2.0), ("humidity", "%", 85.0, 5.0)],
+    "rpi": [("temperature", "°C", 22.0, 2.0), ("humidity", "%", 85.0, 5.0),
+            ("co2", "ppm", 900.0, 150.0), ("light", "lux", 300.0, 100.0)],
+}
+RPI_SHARE = 0.2
+
+CONNECT_SAMPLES = 2000  # connect latencies kept per process and report
+MAX_RECONNECT_BACKOFF = 30.0
+
+
+def _iso_now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def percentiles(values: List[float]) -> dict:
+    if len(values) < 2:
+        return {"p50": None, "p95": None, "p99": None, "max": max(values, default=None)}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": round(cuts[49], 4), "p95": round(cuts[94], 4), "p99": round(cuts[98], 4),
+            "max": round(max(values), 4)}
+
+
+class FleetStats:
+    """Counters for the devices of one process"""
+
+    def __init__(self):
+        self.data = 0
+        self.messages = 0
+        self.bytes = 0
+        self.connects = 0
+        self.connect_failures = 0
+        self.drops = 0
+        self.connected = 0
+        self.connect_seconds: List[float] = []
+
+    def connected_in(self, seconds: float):
+        self.connects += 1
+        self.connected += 1
+        if len(self.connect_seconds) < CONNECT_SAMPLES:
+            self.connect_seconds.append(seconds)
+        else:
+            self.connect_seconds[random.randrange(CONNECT_SAMPLES)] = seconds
+
+    def snapshot(self, process: int) -> dict:
+        return {
+            "process": process, "data": self.data, "messages": self.messages, "bytes": self.bytes,
+            "connects": self.connects, "connect_failures": self.connect_failures, "drops": self.drops,
+            "connected": self.connected, "connect_seconds": list(self.connect_seconds),
+        }
+
+
+class SimulatedDevice:
+    def __init__(self, index: int, args, stats: FleetStats, rng: random.Random):
+        self.args = args
+        self.stats = stats
+        self.rng = rng
+        self.kind = "rpi" if rng.random() < RPI_SHARE else "esp32"
+        self.device_id = f"{DEVICE_PREFIX}_{self.kind}_{index:06d}"
+        self.farm_id = index % args.farms + 1
+        self.sensors = SENSOR_SETS[self.kind]
+        self.client = MqttPublisher(args.host, args.port, self.device_id, args.keepalive)
+        self.topic = f"sensors/{self.farm_id}/{self.device_id}"
+        self.started = time.monotonic()
+        self.battery = rng.randint(40, 100)
+        # Set by the fleet controller; the device acts on them at its next wake-up
+        self.wake = asyncio.Event()
+        self.burst = 0
+        self.drop = False
+
+    def sensor_payload(self) -> bytes:
+        readings = {
+            sensor_type: {"value": round(self.rng.gauss(typical, spread), 2), "unit": unit}
+            for sensor_type, unit, typical, spread in self.sensors
+        }
+        return json.dumps({
+            "device_id": self.device_id, "timestamp": _iso_now(), "farm_id": self.farm_id,
+            "location": f"Room {self.farm_id % 6 + 1}", "readings": readings,
+            "battery": self.battery, "signal_strength": self.rng.randint(-80, -40)
+        }).encode()
+
+    def status_payload(self) -> bytes:
+        return json.dumps({
+            "device_id": self.device_id, "timestamp": _iso_now(), "device_type": "sensor",
+            "hardware": "ESP32" if self.kind == "esp32" else "RaspberryPi", "farm_id": self.farm_id,
+            "sensor_types": [sensor[0] for sensor in self.sensors], "firmware_version": FIRMWARE_VERSION,
+            "status": "online", "battery_level": self.battery
+        }).encode()
+
+    def heartbeat_payload(self) -> bytes:
+        return json.dumps({
+            "device_id": self.device_id, "timestamp": _iso_now(),
+            "uptime": int(time.monotonic() - self.started)
+        }).encode()
+
+    def _next(self, interval: float) -> float:
+        jitter = self.args.jitter
+        return time.monotonic() + interval * self.rng.uniform(1 - jitter, 1 + jitter)
+
+    async def _publish(self, suffix: str, payload: bytes, data: bool = False):
+        await self.client.publish(f"{self.topic}/{suffix}", payload)
+        self.stats.messages += 1
+        self.stats.bytes += len(payload)
+        if data:
+            self.stats.data += 1
+
+    async def _connect(self, stop: asyncio.Event):
+        backoff = 1.0
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                await self.client.connect(self.args.connect_timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                self.stats.connect_failures += 1
+                # Firmware-style exponential backoff with full jitter
+                await asyncio.sleep(self.rng.uniform(0, backoff))
+                backoff = min(backoff * 2, MAX_RECONNECT_BACKOFF)
+                continue
+            self.stats.connected_in(time.perf_counter() - started)
+            await self._publish("status", self.status_payload())
+            return
+
+    def _lost(self):
+        self.client.abort()
+        self.stats.connected -= 1
+
+    async def run(self, stop: asyncio.Event, start_delay: float):
+        await asyncio.sleep(start_delay)
+        args = self.args
+        next_data = self._next(1 / args.rate)
+        next_status = self._next(args.status_interval)
+        next_heartbeat = self._next(args.heartbeat_interval)
+        while not stop.is_set():
+            if not self.client.connected:
+                await self._connect(stop)
+                continue
+            try:
+                if self.drop:
+                    self.drop = False
+                    self.stats.drops += 1
+                    self._lost()
+                    # Everyone dropped by the storm comes back within the spread
+                    await asyncio.sleep(self.rng.uniform(0, args.storm_spread))
+                    continue
+                while self.burst:
+                    self.burst -= 1
+                    await self._publish("data", self.sensor_payload(), data=True)
+                now = time.monotonic()
+                if now >= next_data:
+                    await self._publish("data", self.sensor_payload(), data=True)
+                    next_data = self._next(1 / args.rate)
+                if now >= next_status:
+                    await self._publish("status", self.status_payload())
+                    next_status = self._next(args.status_interval)
+                if now >= next_heartbeat:
+                    await self._publish("heartbeat", self.heartbeat_payload())
+                    next_heartbeat = self._next(args.heartbeat_interval)
+                await self.client.ping_if_idle()
+            except (ConnectionError, OSError):
+                self._lost()
+                continue
+            self.wake.clear()
+            try:
+                wait = max(0.0, min(next_data, next_status, next_heartbeat) - time.monotonic())
+                await asyncio.wait_for(self.wake.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+        if self.client.connected:
+            await self.client.disconnect()
+            self.stats.connected -= 1
+
+
+async def control_fleet(devices: List[SimulatedDevice], args, stop: asyncio.Event, rng: random.Random):
+    """Trigger bursts and reconnect storms on a share of this process's devices"""
+    next_burst = time.monotonic() + args.burst_every if args.burst_every else None
+    next_storm = time.monotonic() + args.storm_every if args.storm_every else None
+    while not stop.is_set():
+        await asyncio.sleep(0.5)
+        now = time.monotonic()
+        if next_burst is not None and now >= next_burst:
+            for device in rng.sample(devices, int(len(devices) * args.burst_fraction)):
+                device.burst += args.burst_size
+                device.wake.set()
+            next_burst = now + args.burst_every
+        if next_storm is not None and now >= next_storm:
+            for device in rng.sample(devices, int(len(devices) * args.storm_fraction)):
+                device.drop = True
+                device.wake.set()
+            next_storm = now + args.storm_every
+
+
+async def run_process(process: int, first: int, count: int, args, stop_event, reports):
+    # One socket per device; lift the soft descriptor limit as far as allowed
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    rng = random.Random(args.seed * 1000 + process)
+    stats = FleetStats()
+    stop = asyncio.Event()
+    devices = [SimulatedDevice(first + offset, args, stats, rng) for offset in range(count)]
+    tasks = [
+        asyncio.create_task(device.run(stop, args.ramp * offset / max(count, 1)))
+        for offset, device in enumerate(devices)
+    ]
+    controller = asyncio.create_task(control_fleet(devices, args, stop, rng))
+
+    loop = asyncio.get_running_loop()
+    while not stop_event.is_set():
+        reports.put(stats.snapshot(process))
+        await asyncio.sleep(args.report_interval)
+    stop.set()
+    for device in devices:
+        device.wake.set()
+    await asyncio.wait(tasks, timeout=args.connect_timeout + 5)
+    controller.cancel()
+    final = stats.snapshot(process)
+    final["final"] = True
+    await loop.run_in_executor(None, reports.put, final)
+
+
+def process_main(process: int, first: int, count: int, args, stop_event, reports):
+    asyncio.run(run_process(process, first, count, args, stop_event, reports))
+
+
+class LagSampler:
+    """Reads the IoT service's farm snapshots and records lag for readings not seen before"""
+
+    def __init__(self, iot_url: str, farms: int, sample_farms: int):
+        self.iot_url = iot_url.rstrip("/")
+        self.farms = farms
+        self.sample_farms = sample_farms
+        self.seen: Dict[Tuple[str, str], str] = {}
+        self.lags: List[float] = []
+        self.errors = 0
+
+    async def sample(self, client):
+        import httpx
+
+        farm_ids = random.sample(range(1, self.farms + 1), min(self.sample_farms, self.farms))
+        for farm_id in farm_ids:
+            try:
+                response = await client.get(f"{self.iot_url}/api/v1/sensors/snapshot/farm/{farm_id}")
+                response.raise_for_status()
+            except httpx.HTTPError:
+                self.errors += 1
+                continue
+            for device_id, sensors in response.json()["devices"].items():
+                if not device_id.startswith(DEVICE_PREFIX):
+                    continue
+                for sensor_type, reading in sensors.items():
+                    key = (device_id, sensor_type)
+                    if self.seen.get(key) == reading["timestamp"]:
+                        continue
+                    self.seen[key] = reading["timestamp"]
+                    lag = (datetime.fromisoformat(reading["ingested_at"])
+                           - datetime.fromisoformat(reading["timestamp"])).total_seconds()
+                    self.lags.append(lag)
+
+    async def run(self, interval: float, stop: asyncio.Event):
+        import httpx
+
+        async with httpx.AsyncClient(timeout=5) as client:
+            while not stop.is_set():
+                await self.sample(client)
+                try:
+                    await asyncio.wait_for(stop.wait(), interval)
+                except asyncio.TimeoutError:
+                    pass
+
+
+def totals(latest: Dict[int, dict]) -> dict:
+    keys = ["data", "messages", "bytes", "connects", "connect_failures", "drops", "connected"]
+    combined = {key: sum(report[key] for report in latest.values()) for key in keys}
+    combined["connect_seconds"] = [s for report in latest.values() for s in report["connect_seconds"]]
+    return combined
+
+
+async def main(args) -> int:
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+    reports = context.Queue()
+    share, extra = divmod(args.devices, args.processes)
+    processes, first = [], 0
+    for index in range(args.processes):
+        count = share + (1 if index < extra else 0)
+        processes.append(context.Process(
+            target=process_main, args=(index, first, count, args, stop_event, reports), daemon=True))
+        first += count
+    for process in processes:
+        process.start()
+
+    lag_stop = asyncio.Event()
+    sampler: Optional[LagSampler] = None
+    sampler_task = None
+    if args.iot_url:
+        sampler = LagSampler(args.iot_url, args.farms, args.lag_farms)
+        sampler_task = asyncio.create_task(sampler.run(args.lag_interval, lag_stop))
+
+    target = args.devices * args.rate
+    print(f"simulating {args.devices} devices in {args.processes} processes against {args.host}:{args.port}, "
+          f"target {target:,.0f} data msg/s")
+    loop = asyncio.get_running_loop()
+    latest: Dict[int, dict] = {}
+    started = time.monotonic()
+    last_print, last_data, last_messages = started, 0, 0
+    while time.monotonic() - started < args.duration:
+        try:
+            report = await loop.run_in_executor(None, reports.get, True, 1.0)
+            latest[report["process"]] = report
+        except Exception:
+            pass
+        now = time.monotonic()
+        if now - last_print >= args.print_interval and latest:
+            current = totals(latest)
+            elapsed = now - last_print
+            print(f"[{now - started:6.0f}s] connected {current['connected']:>6}  "
+                  f"data {(current['data'] - last_data) / elapsed:>9,.0f}/s  "
+                  f"all {(current['messages'] - last_messages) / elapsed:>9,.0f}/s  "
+                  f"failures {current['connect_failures']}  drops {current['drops']}"
+                  + (f"  lag p95 {percentiles(sampler.lags)['p95']}s" if sampler and sampler.lags else ""))
+            last_print, last_data, last_messages = now, current["data"], current["messages"]
+
+    stop_event.set()
+    finals = 0
+    while finals < len(processes):
+        report = await loop.run_in_executor(None, reports.get)
+        latest[report["process"]] = report
+        finals += bool(report.get("final"))
+    elapsed = time.monotonic() - started
+    for process in processes:
+        process.join(timeout=10)
+    lag_stop.set()
+    if sampler_task is not None:
+        await sampler_task
+
+    combined = totals(latest)
+    summary = {
+        "devices": args.devices,
+        "processes": args.processes,
+        "duration_s": round(elapsed, 1),
+        "target_data_rate": target,
+        "achieved_data_rate": round(combined["data"] / elapsed, 1),
+        "achieved_message_rate": round(combined["messages"] / elapsed, 1),
+        "megabytes_sent": round(combined["bytes"] / 1e6, 1),
+        "connects": combined["connects"],
+        "connect_failures": combined["connect_failures"],
+        "storm_drops": combined["drops"],
+        "connect_seconds": percentiles(combined["connect_seconds"]),
+        "ingestion_lag_seconds": percentiles(sampler.lags) if sampler else None,
+        "lag_samples": len(sampler.lags) if sampler else 0,
+    }
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="localhost", help="MQTT broker host")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--processes", type=int, default=max(1, min(8, multiprocessing.cpu_count())))
+    parser.add_argument("--farms", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=0.2, help="sensor data messages per device per second")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative jitter on every interval")
+    parser.add_argument("--status-interval", type=float, default=300.0)
+    parser.add_argument("--heartbeat-interval", type=float, default=30.0)
+    parser.add_argument("--keepalive", type=int, default=60)
+    parser.add_argument("--ramp", type=float, default=30.0, help="seconds over which devices first connect")
+    parser.add_argument("--connect-timeout", type=float, default=10.0)
+    parser.add_argument("--burst-every", type=float, default=60.0, help="seconds between bursts, 0 = none")
+    parser.add_argument("--burst-fraction", type=float, default=0.05)
+    parser.add_argument("--burst-size", type=int, default=20, help="buffered readings flushed per device")
+    parser.add_argument("--storm-every", type=float, default=0.0, help="seconds between reconnect storms, 0 = none")
+    parser.add_argument("--storm-fraction", type=float, default=0.3)
+    parser.add_argument("--storm-spread", type=float, default=2.0, help="seconds over which storm reconnects land")
+    parser.add_argument("--duration", type=float, default=120.0)
+    parser.add_argument("--iot-url", default="http://localhost:8001",
+                        help="IoT service to sample ingestion lag from, empty to skip")
+    parser.add_argument("--lag-interval", type=float, default=2.0)
+    parser.add_argument("--lag-farms", type=int, default=20, help="farms sampled per lag interval")
+    parser.add_argument("--report-interval", type=float, default=1.0)
+    parser.add_argument("--print-interval", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the summary as JSON")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,111 @@
+"""Minimal asyncio MQTT 3.1.1 publisher for load generation
+
+Implements only what a simulated device needs: CONNECT/CONNACK, QoS 0
+PUBLISH, PINGREQ and DISCONNECT. paho-mqtt runs a network thread per
+client, which does not scale to tens of thousands of connections in one
+process; this keeps each device down to one socket and one task.
+"""
+import asyncio
+import struct
+import time
+from typing import Optional
+
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PINGREQ = b"\xc0\x00"
+DISCONNECT = b"\xe0\x00"
+
+CONNACK_CODES = {
+    1: "unacceptable protocol version",
+    2: "identifier rejected",
+    3: "server unavailable",
+    4: "bad user name or password",
+    5: "not authorized",
+}
+
+
+def _remaining_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def _string(value: str) -> bytes:
+    raw = value.encode()
+    return struct.pack("!H", len(raw)) + raw
+
+
+def connect_packet(client_id: str, keepalive: int, clean_session: bool = True) -> bytes:
+    flags = 0x02 if clean_session else 0x00
+    body = _string("MQTT") + bytes([4, flags]) + struct.pack("!H", keepalive) + _string(client_id)
+    return bytes([CONNECT]) + _remaining_length(len(body)) + body
+
+
+def publish_packet(topic: str, payload: bytes) -> bytes:
+    body = _string(topic) + payload
+    return bytes([PUBLISH]) + _remaining_length(len(body)) + body
+
+
+class MqttPublisher:
+    """One device's connection to the broker"""
+
+    def __init__(self, host: str, port: int, client_id: str, keepalive: int = 60):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.keepalive = keepalive
+        self.last_sent = 0.0
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self, timeout: float = 10.0):
+        """Open the socket and complete the MQTT handshake; raises ConnectionError if refused"""
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), timeout)
+        try:
+            self._writer.write(connect_packet(self.client_id, self.keepalive))
+            connack = await asyncio.wait_for(self._reader.readexactly(4), timeout)
+        except BaseException:
+            self.abort()
+            raise
+        if connack[0] != CONNACK or connack[3] != 0:
+            self.abort()
+            raise ConnectionRefusedError(CONNACK_CODES.get(connack[3], f"CONNACK {connack.hex()}"))
+        self.last_sent = time.monotonic()
+
+    async def publish(self, topic: str, payload: bytes):
+        """QoS 0 publish; waits only if the socket's send buffer is full"""
+        self._writer.write(publish_packet(topic, payload))
+        self.last_sent = time.monotonic()
+        await self._writer.drain()
+
+    async def ping_if_idle(self):
+        """Keep the session alive when the device publishes less often than the keepalive"""
+        if self.keepalive and time.monotonic() - self.last_sent > self.keepalive / 2:
+            self._writer.write(PINGREQ)
+            self.last_sent = time.monotonic()
+            # The 2-byte PINGRESPs are left unread; a run would need tens of thousands to fill the buffer
+            await self._writer.drain()
+
+    async def disconnect(self):
+        if self.connected:
+            self._writer.write(DISCONNECT)
+            try:
+                await self._writer.drain()
+            except ConnectionError:
+                pass
+        self.abort()
+
+    def abort(self):
+        """Drop the connection without DISCONNECT, as a device losing power or network would"""
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None